@@ -9,6 +9,12 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_BUCKET: str = "virtual-tryon"
+    STORAGE_BACKEND: str = "local"  # local / supabase (objects must be migrated first) / memory
+    STORAGE_MAX_CONNECTIONS: int = 20  # Pooled keep-alive connections to the storage API
+    STORAGE_CONCURRENCY: int = 8  # Objects uploaded / deleted at once in a batch
+    STORAGE_CONTENT_ADDRESSED: bool = False  # Name objects by content hash so identical bytes are stored once
+    SIGNED_URL_CACHE_MAX_ENTRIES: int = 10000  # Signed URLs reused across list requests
+    SIGNED_URL_REFRESH_FRACTION: float = 0.2  # Re-sign once a URL has used this much of the requested lifetime
     
     # JWT
     SECRET_KEY: str
@@ -27,11 +33,45 @@ class Settings(BaseSettings):
     
     # File Upload
     MAX_FILE_SIZE_MB: int = 5
+    MAX_UPLOAD_MEGAPIXELS: int = 50  # Frame size checked from the image header before decoding
     ALLOWED_EXTENSIONS: str = "jpg,jpeg,png"
     
     # Try-On Limits
     MAX_TRYON_PER_USER: int = 5
     
+    # Try-On Engine
+    MERCH_CACHE_MAX_MB: int = 256  # Decoded merch template cache budget
+    MERCH_TEMPLATE_MAX_SIDE: int = 1200  # Templates are downscaled to this before caching
+    MERCH_PYRAMID_CACHE_MB: int = 128  # Template mipmap levels (pyrDown halvings)
+    SCALED_MERCH_CACHE_MB: int = 128  # Templates resized to the garment sizes in use
+    DEFORM_MAP_CACHE_MB: int = 64  # Shoulder drape remap tables per garment size
+    POSE_CACHE_MAX_MB: int = 256  # Pose detections cached per uploaded photo
+    RENDER_DEDUP_MAX_ENTRIES: int = 10000  # Stored render results reused for identical photo + design requests
+    POSE_DETECTION_MAX_SIDE: int = 0  # Pose inference resolution (longest side, 0 = full size); per-request override allowed
+    
+    # Render Workers
+    RENDER_USE_PROCESS_POOL: bool = True  # False renders in-process on a single engine
+    RENDER_WORKERS: int = 0  # Worker processes, 0 = one per CPU core
+    RENDER_MAX_TASKS_PER_CHILD: int = 200  # Recycle a worker after N renders, 0 = never
+    RENDER_TIMEOUT_SECONDS: int = 60  # A render taking longer respawns the pool
+    RENDER_HEALTH_CHECK_SECONDS: int = 60
+    
+    # Render Queue
+    RENDER_CONCURRENCY: int = 0  # Renders executing at once, 0 = render pool size
+    RENDER_QUEUE_MAX_PENDING: int = 100  # Queued + running jobs before /generate returns 503
+    ANALYSIS_QUEUE_MAX_PENDING: int = 20  # Upload-time pose analyses, skipped beyond this (never cause 503s)
+    RENDER_JOB_RETENTION_MINUTES: int = 60  # How long finished jobs stay pollable
+    
+    # Render Quality Tiers (high / balanced / fast)
+    QUALITY_TIER: str = "high"  # Best tier, used whenever the server is not under load
+    QUALITY_ADAPTIVE: bool = True  # Step down a tier under load, back up when it clears
+    QUALITY_DEGRADE_QUEUE_DEPTH: int = 8
+    QUALITY_RESTORE_QUEUE_DEPTH: int = 2
+    QUALITY_DEGRADE_P95_MS: int = 4000  # p95 render time per design
+    QUALITY_RESTORE_P95_MS: int = 1500
+    QUALITY_LATENCY_WINDOW: int = 50  # Recent renders used for the p95
+    QUALITY_MIN_SWITCH_SECONDS: int = 10
+    
     # Image Retention
     UPLOADED_IMAGE_RETENTION_HOURS: int = 2
     GENERATED_IMAGE_RETENTION_HOURS: int = 24
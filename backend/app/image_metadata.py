@@ -0,0 +1,153 @@
+"""
+Image Metadata Stripping
+Removes EXIF/XMP/comments from JPEG and PNG files by rewriting the container,
+so pixels are never decoded or re-encoded (except to apply an EXIF rotation)
+"""
+
+import io
+import re
+import struct
+from typing import Iterator, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+JPEG_SOI = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# JPEG APPn segments kept: APP0 JFIF, APP14 Adobe (colour transform) and ICC profiles in APP2.
+# Everything else in APP1-APP15 (EXIF, XMP, IPTC, MPF, maker data) and COM is dropped.
+JPEG_KEPT_APP_MARKERS = {0xE0, 0xEE}
+JPEG_ICC_PREFIX = b'ICC_PROFILE\x00'
+
+# PNG ancillary chunks that affect how pixels render; the rest (tEXt, zTXt, iTXt,
+# eXIf, tIME, ...) is metadata. Critical chunks (uppercase first letter) are always kept.
+PNG_KEPT_ANCILLARY = {b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT', b'pHYs'}
+
+# Next marker inside entropy-coded data (0xFF00 is a stuffed byte, 0xFFD0-D7 are restart markers)
+_JPEG_NEXT_MARKER = re.compile(rb'\xff[^\x00\xd0-\xd7\xff]')
+
+
+def image_format(data: bytes) -> Optional[str]:
+    """'JPEG' / 'PNG' from the file signature, None for anything else"""
+    if data.startswith(JPEG_SOI):
+        return 'JPEG'
+    if data.startswith(PNG_SIGNATURE):
+        return 'PNG'
+    return None
+
+
+def _jpeg_segments(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """(marker, start, end) of every segment up to and including EOI; entropy data belongs to its SOS"""
+    pos = 2
+    size = len(data)
+    while pos < size:
+        if data[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG: expected a marker")
+        while pos + 1 < size and data[pos + 1] == 0xFF:  # fill bytes
+            pos += 1
+        if pos + 1 >= size:
+            break
+        marker = data[pos + 1]
+        if marker == 0xD9:  # EOI - anything after it (e.g. MPF preview images) is dropped
+            yield marker, pos, pos + 2
+            return
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            yield marker, pos, pos + 2
+            pos += 2
+            continue
+        if pos + 4 > size:
+            raise ValueError("Corrupt JPEG: truncated segment")
+        end = pos + 2 + struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xDA:  # SOS: the scan runs until the next real marker
+            match = _JPEG_NEXT_MARKER.search(data, end)
+            end = match.start() if match else size
+        yield marker, pos, end
+        pos = end
+    raise ValueError("Corrupt JPEG: missing EOI")
+
+
+def strip_jpeg(data: bytes) -> bytes:
+    """JPEG without metadata segments - scan data is copied byte for byte"""
+    out = bytearray(JPEG_SOI)
+    for marker, start, end in _jpeg_segments(data):
+        if 0xE1 <= marker <= 0xEF and marker not in JPEG_KEPT_APP_MARKERS:
+            if not (marker == 0xE2 and data.startswith(JPEG_ICC_PREFIX, start + 4)):
+                continue
+        if marker == 0xFE:  # COM
+            continue
+        out += data[start:end]
+    return bytes(out)
+
+
+def _png_chunks(data: bytes) -> Iterator[Tuple[bytes, int, int]]:
+    """(chunk type, start, end) of every chunk up to and including IEND"""
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(data):
+            raise ValueError("Corrupt PNG: truncated chunk")
+        yield chunk_type, pos, end
+        if chunk_type == b'IEND':
+            return
+        pos = end
+    raise ValueError("Corrupt PNG: missing IEND")
+
+
+def strip_png(data: bytes) -> bytes:
+    """PNG with only critical and rendering-related chunks - IDAT is copied as is"""
+    out = bytearray(PNG_SIGNATURE)
+    for chunk_type, start, end in _png_chunks(data):
+        if chunk_type[0] < 0x61 or chunk_type in PNG_KEPT_ANCILLARY:  # uppercase = critical
+            out += data[start:end]
+    return bytes(out)
+
+
+def exif_orientation(data: bytes) -> int:
+    """EXIF orientation tag (1 = upright) read without decoding pixels"""
+    # Pillow decodes a PNG to look for a trailing eXIf chunk, so only ask when there is one
+    if data.startswith(PNG_SIGNATURE) and not any(
+            chunk_type == b'eXIf' for chunk_type, _, _ in _png_chunks(data)):
+        return 1
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.getexif().get(0x0112, 1)
+    except Exception:
+        return 1
+
+
+def _transpose(data: bytes) -> bytes:
+    """Decode, apply the EXIF orientation and re-encode (only for rotated/mirrored photos)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image_format_name = image.format
+        icc_profile = image.info.get('icc_profile')
+        upright = ImageOps.exif_transpose(image)
+    output = io.BytesIO()
+    save_args = {'quality': 95} if image_format_name == 'JPEG' else {}
+    if icc_profile:
+        save_args['icc_profile'] = icc_profile
+    upright.save(output, format=image_format_name, **save_args)
+    return output.getvalue()
+
+
+def strip_metadata(data: bytes) -> bytes:
+    """
+    Remove privacy-sensitive metadata from an encoded JPEG or PNG
+    Upright images are rewritten at the container level (pixel data untouched); images with an
+    EXIF rotation are transposed once so they still display correctly without the tag.
+    Other formats are decoded and re-encoded without metadata.
+    """
+    kind = image_format(data)
+    if kind is not None and exif_orientation(data) not in (0, 1):
+        data = _transpose(data)
+    if kind == 'JPEG':
+        return strip_jpeg(data)
+    if kind == 'PNG':
+        return strip_png(data)
+
+    with Image.open(io.BytesIO(data)) as image:
+        clean = Image.new(image.mode, image.size)
+        clean.paste(image)
+        output = io.BytesIO()
+        clean.save(output, format=image.format or 'JPEG')
+    return output.getvalue()
@@ -13,6 +13,8 @@ from .database import init_db
 from .config import settings
 from .routes import auth, tryon, admin, master
 from .scheduler import start_scheduler
+from .render_pool import render_pool
+from .storage import storage_manager
 
 from fastapi.staticfiles import StaticFiles
 import os
@@ -30,11 +32,17 @@ async def lifespan(app: FastAPI):
     os.makedirs("storage/merch", exist_ok=True)
     os.makedirs("storage/uploads", exist_ok=True)
     
+    # Spawn render workers before traffic arrives so models are warm
+    render_pool.start()
+    
     start_scheduler()
     print("✅ Scheduler started")
     yield
     # Shutdown
     print("👋 Shutting down...")
+    tryon.render_queue.shutdown()
+    render_pool.shutdown()
+    storage_manager.close()
 
 app = FastAPI(
     title="Virtual Merchandise Try-On API",
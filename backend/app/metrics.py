@@ -0,0 +1,79 @@
+"""
+Render Metrics
+Fixed-bucket latency histograms per pipeline stage,
+so a latency spike can be traced to the stage causing it
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence
+
+# Upper bounds (ms) of the histogram buckets; larger values land in +Inf
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (the max for +Inf)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        labels = [f"le_{bound}" for bound in self.buckets] + ["le_inf"]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count, 2) if self.count else None,
+            'max_ms': round(self.max, 2),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class StageMetrics:
+    def __init__(self):
+        # kind ("render", "analysis") -> stage -> histogram
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, timings: Dict[str, float]):
+        """Add one set of stage timings (ms) as returned by the render workers"""
+        with self._lock:
+            stages = self._histograms.setdefault(kind, {})
+            for stage, ms in timings.items():
+                stages.setdefault(stage, Histogram()).observe(ms)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                kind: {stage: histogram.to_dict() for stage, histogram in stages.items()}
+                for kind, stages in self._histograms.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# Global instance
+render_metrics = StageMetrics()
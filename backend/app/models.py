@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum as SQLEnum, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum as SQLEnum, Text, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -66,7 +66,7 @@ class TryOnSession(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    uploaded_image_path = Column(String, nullable=False)
+    uploaded_image_path = Column(String, nullable=True)  # None once the upload has expired and been deleted
     uploaded_image_url = Column(Text, nullable=True)
     merch_type = Column(String, nullable=False)  # tshirt, hoodie, etc.
     merch_design = Column(String, nullable=False)  # design identifier
@@ -87,9 +87,11 @@ class GeneratedImage(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("try_on_sessions.id"), nullable=False)
-    image_path = Column(String, nullable=False)
+    image_path = Column(String, nullable=True)  # None once the image has expired and been deleted
     image_url = Column(Text, nullable=True)
     processing_time_ms = Column(Integer, nullable=True)
+    quality_tier = Column(String(16), nullable=True)  # Render quality tier (high / balanced / fast)
+    stage_timings = Column(JSON, nullable=True)  # Per-stage render timings in ms (decode ... encode, total)
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=False)  # End of day deletion
     
@@ -144,3 +146,13 @@ class Merchandise(Base):
     image_path = Column(String, nullable=False) # storage path
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, unique=True, index=True, nullable=False)  # storage path
+    sha256 = Column(String(64), nullable=True)  # of the stored bytes (unknown for backfilled objects)
+    size_bytes = Column(Integer, nullable=True)
+    ref_count = Column(Integer, default=0, nullable=False)  # DB rows pointing at the object; deleted at zero
+    created_at = Column(DateTime, default=datetime.utcnow)
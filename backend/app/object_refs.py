@@ -0,0 +1,162 @@
+"""
+Stored Object Reference Counts
+How many DB rows point at each storage object, so objects shared by several rows
+(content-addressed duplicates, deduplicated renders) are deleted with the last one
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import StoredObject
+
+
+class ObjectRefs:
+    """
+    Reference counts keyed by storage path; counts map path -> references added/removed
+    Methods are synchronous and called from worker threads by StorageManager, which also
+    serialises operations on the same path.
+    """
+
+    def add(self, counts: Dict[str, int], info: Dict[str, Tuple[str, int]]) -> Dict[str, int]:
+        """
+        Add references, creating entries for new paths (info: path -> (sha256, size))
+        Returns the new count per path; new count == added means the object must be written.
+        """
+        raise NotImplementedError
+
+    def retain(self, counts: Dict[str, int]) -> Set[str]:
+        """Add references to objects that are still alive; returns the paths that were retained"""
+        raise NotImplementedError
+
+    def release(self, counts: Dict[str, int]) -> List[str]:
+        """
+        Drop references; returns paths whose object is no longer referenced and must be deleted
+        (including paths that were never tracked, which are treated as singly referenced)
+        """
+        raise NotImplementedError
+
+    def get(self, path: str) -> Optional[int]:
+        """Current count (None if untracked)"""
+        raise NotImplementedError
+
+
+class DatabaseObjectRefs(ObjectRefs):
+    """Counts in the stored_objects table; increments and decrements are single atomic statements"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def _upsert(self, db: Session, path: str, count: int, sha256: Optional[str], size: Optional[int]) -> int:
+        dialect = db.get_bind().dialect.name
+        insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(dialect)
+        if insert is None:
+            raise NotImplementedError(f"Object reference counting is not implemented for {dialect}")
+
+        table = StoredObject.__table__
+        statement = insert(table).values(path=path, sha256=sha256, size_bytes=size, ref_count=count)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.path],
+            set_={'ref_count': table.c.ref_count + statement.excluded.ref_count}
+        ).returning(table.c.ref_count)
+        return db.execute(statement).scalar_one()
+
+    def add(self, counts: Dict[str, int], info: Dict[str, Tuple[str, int]]) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            totals = {path: self._upsert(db, path, count, *info.get(path, (None, None)))
+                      for path, count in counts.items()}
+            db.commit()
+            return totals
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def retain(self, counts: Dict[str, int]) -> Set[str]:
+        db = self.session_factory()
+        try:
+            retained = set()
+            for path, count in counts.items():
+                row = db.execute(
+                    update(StoredObject)
+                    .where(StoredObject.path == path, StoredObject.ref_count > 0)
+                    .values(ref_count=StoredObject.ref_count + count)
+                    .returning(StoredObject.path)
+                ).first()
+                if row is not None:
+                    retained.add(path)
+            db.commit()
+            return retained
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def release(self, counts: Dict[str, int]) -> List[str]:
+        db = self.session_factory()
+        try:
+            unreferenced = []
+            for path, count in counts.items():
+                remaining = db.execute(
+                    update(StoredObject)
+                    .where(StoredObject.path == path)
+                    .values(ref_count=StoredObject.ref_count - count)
+                    .returning(StoredObject.ref_count)
+                ).scalar_one_or_none()
+                if remaining is None:  # not tracked (e.g. stored before reference counting)
+                    unreferenced.append(path)
+                elif remaining <= 0:
+                    db.execute(delete(StoredObject).where(StoredObject.path == path,
+                                                          StoredObject.ref_count <= 0))
+                    unreferenced.append(path)
+            db.commit()
+            return unreferenced
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get(self, path: str) -> Optional[int]:
+        db = self.session_factory()
+        try:
+            return db.execute(select(StoredObject.ref_count).where(StoredObject.path == path)).scalar_one_or_none()
+        finally:
+            db.close()
+
+
+class MemoryObjectRefs(ObjectRefs):
+    """In-process counts, for MemoryBackend tests and benchmarks"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def add(self, counts: Dict[str, int], info: Dict[str, Tuple[str, int]]) -> Dict[str, int]:
+        for path, count in counts.items():
+            self.counts[path] = self.counts.get(path, 0) + count
+        return {path: self.counts[path] for path in counts}
+
+    def retain(self, counts: Dict[str, int]) -> Set[str]:
+        retained = {path for path in counts if self.counts.get(path, 0) > 0}
+        for path in retained:
+            self.counts[path] += counts[path]
+        return retained
+
+    def release(self, counts: Dict[str, int]) -> List[str]:
+        unreferenced = []
+        for path, count in counts.items():
+            remaining = self.counts.get(path, 0) - count
+            if remaining > 0:
+                self.counts[path] = remaining
+            else:
+                self.counts.pop(path, None)
+                unreferenced.append(path)
+        return unreferenced
+
+    def get(self, path: str) -> Optional[int]:
+        return self.counts.get(path)
@@ -0,0 +1,113 @@
+"""
+Adaptive Render Quality
+Picks the try-on quality tier from render queue depth and recent latency,
+stepping down one tier under load and back up once it clears
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import settings
+from .tryon_engine import QUALITY_TIERS
+
+
+class QualityController:
+    def __init__(self, tiers: List[str], max_tier: str, adaptive: bool = True,
+                 degrade_queue_depth: int = 8, restore_queue_depth: int = 2,
+                 degrade_p95_ms: float = 4000, restore_p95_ms: float = 1500,
+                 window: int = 50, min_samples: int = 5, min_switch_seconds: float = 10):
+        """
+        tiers: tier names, best first
+        max_tier: best tier to use when not under load
+        degrade_*: step down a tier when queue depth or p95 latency reaches these
+        restore_*: step back up once both are at or below these
+        window: recent render latencies kept for the p95 (reset on every switch)
+        min_switch_seconds: minimum time between two tier changes
+        """
+        if max_tier not in tiers:
+            raise ValueError(f"Unknown quality tier '{max_tier}', expected one of {tiers}")
+        self.tiers = tiers
+        self.adaptive = adaptive
+        self.ceiling = tiers.index(max_tier)
+        self.level = self.ceiling
+        self.degrade_queue_depth = degrade_queue_depth
+        self.restore_queue_depth = restore_queue_depth
+        self.degrade_p95_ms = degrade_p95_ms
+        self.restore_p95_ms = restore_p95_ms
+        self.min_samples = min_samples
+        self.min_switch_seconds = min_switch_seconds
+        self.switches = 0
+        self._latencies = deque(maxlen=window)
+        self._last_switch = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def tier(self) -> str:
+        return self.tiers[self.level]
+
+    def record(self, latency_ms: float):
+        """Report the wall time of one render at the current tier"""
+        with self._lock:
+            self._latencies.append(latency_ms)
+
+    def _p95(self) -> Optional[float]:
+        if len(self._latencies) < self.min_samples:
+            return None
+        return float(np.percentile(self._latencies, 95))
+
+    def select(self, queue_depth: int) -> str:
+        """Tier for the next render, adjusting for the current load"""
+        with self._lock:
+            now = time.monotonic()
+            if not self.adaptive or now - self._last_switch < self.min_switch_seconds:
+                return self.tier
+
+            p95 = self._p95()
+            overloaded = (queue_depth >= self.degrade_queue_depth or
+                          (p95 is not None and p95 >= self.degrade_p95_ms))
+            relaxed = (queue_depth <= self.restore_queue_depth and
+                       p95 is not None and p95 <= self.restore_p95_ms)
+
+            reason = f"queue depth {queue_depth}, p95 " + (f"{p95:.0f} ms" if p95 is not None else "n/a")
+            if overloaded and self.level < len(self.tiers) - 1:
+                self._switch(self.level + 1, now, reason)
+            elif relaxed and self.level > self.ceiling:
+                self._switch(self.level - 1, now, reason)
+            return self.tier
+
+    def _switch(self, level: int, now: float, reason: str):
+        direction = "lowered" if level > self.level else "restored"
+        self.level = level
+        self.switches += 1
+        self._last_switch = now
+        self._latencies.clear()  # old samples describe the previous tier
+        print(f"⚠️  Render quality {direction} to '{self.tier}' ({reason})")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'tier': self.tier,
+                'max_tier': self.tiers[self.ceiling],
+                'adaptive': self.adaptive,
+                'switches': self.switches,
+                'p95_ms': self._p95(),
+                'samples': len(self._latencies)
+            }
+
+
+# Global instance
+quality_controller = QualityController(
+    tiers=list(QUALITY_TIERS),
+    max_tier=settings.QUALITY_TIER,
+    adaptive=settings.QUALITY_ADAPTIVE,
+    degrade_queue_depth=settings.QUALITY_DEGRADE_QUEUE_DEPTH,
+    restore_queue_depth=settings.QUALITY_RESTORE_QUEUE_DEPTH,
+    degrade_p95_ms=settings.QUALITY_DEGRADE_P95_MS,
+    restore_p95_ms=settings.QUALITY_RESTORE_P95_MS,
+    window=settings.QUALITY_LATENCY_WINDOW,
+    min_switch_seconds=settings.QUALITY_MIN_SWITCH_SECONDS
+)
@@ -0,0 +1,254 @@
+"""
+Render Worker Pool
+Process pool of warm TryOnEngine instances so renders scale across all cores
+Workers are recycled after a number of tasks and respawned if they crash or hang
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .tryon_engine import DEFAULT_QUALITY_TIER, PersonPose, StageTimer
+
+# Per-process engine: built by the pool initializer in each worker,
+# or in the server process itself when the pool is disabled
+_engine = None
+
+
+def _init_worker(engine_kwargs: Dict):
+    """Pool initializer - load MediaPipe models once per worker process"""
+    global _engine
+    from .tryon_engine import TryOnEngine
+    _engine = TryOnEngine(**engine_kwargs)
+    try:
+        _engine.warm_up()
+    except Exception as e:
+        # A worker without warm models still renders (missing models use the fallback overlay)
+        print(f"⚠️  Render worker warm-up failed: {e}")
+
+
+def get_engine():
+    """The engine owned by the current process"""
+    return _engine
+
+
+def _ping(delay: float) -> Dict:
+    """Health probe executed inside a worker"""
+    time.sleep(delay)
+    return {
+        'pid': os.getpid(),
+        'engine_enabled': _engine is not None and _engine.enabled,
+        'caches': _engine.cache_stats() if _engine is not None else None
+    }
+
+
+def load_merch_template(merch_ref: Dict):
+    """Worker-side: preprocessed template for a resolved merch, from this worker's cache"""
+    from .storage import storage_manager
+
+    def read_merch() -> bytes:
+        if merch_ref['storage_path']:
+            return storage_manager.read_file(merch_ref['storage_path'])
+        with open(merch_ref['asset_path'], 'rb') as f:
+            return f.read()
+
+    return _engine.get_merch_template(merch_ref['key'], merch_ref['version'], read_merch)
+
+
+def analyze_photo(upload_bytes: bytes, detection_max_side: Optional[int] = None,
+                  tier: str = DEFAULT_QUALITY_TIER) -> Tuple[Optional[List[PersonPose]], Dict[str, float]]:
+    """
+    Worker-side pose analysis task - detections to reuse for later renders
+    Returns: (people, stage timings in ms)
+    """
+    timer = StageTimer()
+    with timer.stage("decode"):
+        base_image = _engine.decode_base_image(upload_bytes)
+    people = _engine.analyze(base_image, detection_max_side, tier, timer)
+    return people, timer.as_dict()
+
+
+def render_tryon(upload_bytes: bytes, merch_refs: List[Dict], people: Optional[List[PersonPose]] = None,
+                 detection_max_side: Optional[int] = None,
+                 tier: str = DEFAULT_QUALITY_TIER) -> Tuple[List[Tuple[bytes, int, Dict[str, float]]], Optional[List[PersonPose]]]:
+    """
+    Worker-side render task for one photo and one or more designs
+    The photo is decoded once and poses detected at most once, then each design is composited.
+    people: cached detections for this photo, if any (skips pose inference)
+    detection_max_side: pose inference resolution (None = tier/engine default, 0 = full size)
+    tier: quality tier (see tryon_engine.QUALITY_TIERS)
+    Returns: ([(jpeg_bytes, processing_time_ms, stage timings in ms) per merch_ref], people)
+    Shared work (decode, detect) is timed on the design that did it; processing_time_ms is that design's total.
+    """
+    timer = StageTimer()
+    with timer.stage("decode"):
+        base_image = _engine.decode_base_image(upload_bytes)
+    results = []
+    for merch_ref in merch_refs:
+        with timer.stage("load_merch"):
+            merch_template = load_merch_template(merch_ref)
+        result_image, _, detected = _engine.render(base_image, merch_template, people,
+                                                   detection_max_side, tier, timer,
+                                                   merch_key=(merch_ref['key'], merch_ref['version']))
+        people = people if people is not None else detected
+        with timer.stage("encode"):
+            result_bytes = _engine.encode_image(result_image)
+        timings = timer.as_dict()
+        results.append((result_bytes, int(timings['total']), timings))
+        timer = StageTimer()
+    return results, people
+
+
+class RenderPool:
+    def __init__(self, size: int, max_tasks_per_child: Optional[int] = None,
+                 task_timeout: float = 60, engine_kwargs: Optional[Dict] = None,
+                 use_processes: bool = True):
+        """
+        size: worker processes (each holds its own warm engine)
+        max_tasks_per_child: recycle a worker after this many renders (None = never)
+        task_timeout: seconds before a render is considered hung and the pool respawned
+        use_processes: False runs renders in the calling thread on a single local engine
+        """
+        self.size = max(1, size)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.task_timeout = task_timeout
+        self.engine_kwargs = engine_kwargs or {}
+        self.use_processes = use_processes
+        self.restarts = 0
+        self.last_health: Optional[Dict] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Spawn workers (or build the local engine); safe to call more than once"""
+        with self._lock:
+            if not self.use_processes:
+                if _engine is None:
+                    _init_worker(self.engine_kwargs)
+                return
+            if self._executor is None:
+                self._executor = self._create_executor()
+                print(f"✅ Render pool started with {self.size} workers")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.engine_kwargs,),
+            max_tasks_per_child=self.max_tasks_per_child
+        )
+
+    def _respawn(self, broken: ProcessPoolExecutor, reason: str):
+        """Replace a broken/hung executor unless another thread already did"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            print(f"⚠️  Respawning render pool: {reason}")
+            self._terminate(broken)
+            self._executor = self._create_executor()
+            self.restarts += 1
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        # Hung workers ignore shutdown(), so kill them outright
+        for process in list((executor._processes or {}).values()):
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, func: Callable, *args):
+        """
+        Run func(*args) on a worker and block for the result (call from a render thread)
+        A crashed or hung pool is respawned and the task retried once.
+        """
+        self.start()
+        if not self.use_processes:
+            return func(*args)
+
+        for attempt in range(2):
+            executor = self._executor
+            try:
+                return executor.submit(func, *args).result(timeout=self.task_timeout)
+            except BrokenProcessPool:
+                self._respawn(executor, "worker process died")
+            except FutureTimeoutError:
+                self._respawn(executor, f"render exceeded {self.task_timeout}s")
+                raise TimeoutError("Render timed out")
+        raise RuntimeError("Render pool unavailable")
+
+    @staticmethod
+    def _live_workers(executor: ProcessPoolExecutor) -> int:
+        return sum(1 for process in list((executor._processes or {}).values()) if process.is_alive())
+
+    def check_health(self, timeout: float = 10) -> Dict:
+        """
+        Ping the workers; respawn the pool only if it is broken or its processes are dead
+        Workers that miss the ping while alive are busy (a long render), not hung - they are
+        reported as such and left alone; run() already times out renders that really hang.
+        """
+        self.start()
+        if not self.use_processes:
+            self.last_health = {'healthy': True, 'mode': 'in-process', 'workers': [_ping(0)]}
+            return self.last_health
+
+        executor = self._executor
+        workers = {}
+        healthy = True
+        busy = 0
+        try:
+            # Short sleeps spread the probes across idle workers
+            futures = [executor.submit(_ping, 0.05) for _ in range(self.size)]
+            deadline = time.monotonic() + timeout
+            for future in futures:
+                try:
+                    info = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                    workers[info['pid']] = info
+                except FutureTimeoutError:
+                    future.cancel()  # don't leave probes queued behind renders
+                    busy += 1
+            if busy and self._live_workers(executor) == 0:
+                raise BrokenProcessPool("no live worker processes")
+        except BrokenProcessPool as e:
+            healthy = False
+            busy = 0
+            self._respawn(executor, f"health check failed ({e or type(e).__name__})")
+
+        self.last_health = {
+            'healthy': healthy,
+            'mode': 'process-pool',
+            'size': self.size,
+            'busy': busy,  # pings unanswered within the timeout by live workers
+            'restarts': self.restarts,
+            'workers': list(workers.values()),
+            'checked_at': time.time()
+        }
+        return self.last_health
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._terminate(self._executor)
+                self._executor = None
+
+
+# Global instance
+render_pool = RenderPool(
+    size=settings.RENDER_WORKERS or os.cpu_count() or 1,
+    max_tasks_per_child=settings.RENDER_MAX_TASKS_PER_CHILD or None,
+    task_timeout=settings.RENDER_TIMEOUT_SECONDS,
+    engine_kwargs={
+        'merch_cache_mb': settings.MERCH_CACHE_MAX_MB,
+        'merch_template_max_side': settings.MERCH_TEMPLATE_MAX_SIDE,
+        'merch_pyramid_cache_mb': settings.MERCH_PYRAMID_CACHE_MB,
+        'scaled_merch_cache_mb': settings.SCALED_MERCH_CACHE_MB,
+        'deform_map_cache_mb': settings.DEFORM_MAP_CACHE_MB,
+        'detection_max_side': settings.POSE_DETECTION_MAX_SIDE
+    },
+    use_processes=settings.RENDER_USE_PROCESS_POOL
+)
@@ -0,0 +1,203 @@
+"""
+Render Job Queue
+Runs try-on renders off the event loop with bounded concurrency
+and keeps per-job status for polling
+"""
+
+import asyncio
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when too many render jobs are already waiting"""
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class RenderJob:
+    def __init__(self, user_id: int, kind: str = "render", meta: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = JobStatus.QUEUED
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.done = asyncio.Event()  # for the event loop (long-polling)
+        self.finished = threading.Event()  # for render threads waiting on another job
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    def to_dict(self) -> Dict:
+        """Public job status payload"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            **self.meta
+        }
+
+
+class RenderQueue:
+    def __init__(self, concurrency: int = 2, max_pending: int = 100, retention_minutes: int = 60,
+                 background_kinds=(), max_background: int = 20):
+        """
+        concurrency: renders executing at once (worker threads)
+        max_pending: queued + running jobs accepted before submit() refuses
+        retention_minutes: how long finished jobs stay pollable
+        background_kinds: optional work (e.g. upload-time analysis) - limited by max_background
+            instead of max_pending, left out of depth, and dropped first when the queue fills up
+        """
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.background_kinds = set(background_kinds)
+        self.max_background = max_background
+        self.retention = timedelta(minutes=retention_minutes)
+        self.jobs: Dict[str, RenderJob] = {}
+        # jobs is changed on the event loop but counted from render threads (quality tier selection)
+        self._jobs_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="render")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    def _snapshot(self) -> List[RenderJob]:
+        with self._jobs_lock:
+            return list(self.jobs.values())
+
+    @property
+    def depth(self) -> int:
+        """User-facing jobs queued or running (safe to read from any thread)"""
+        return sum(1 for job in self._snapshot()
+                   if not job.is_finished and job.kind not in self.background_kinds)
+
+    @property
+    def background_depth(self) -> int:
+        """Background jobs queued or running (safe to read from any thread)"""
+        return sum(1 for job in self._snapshot()
+                   if not job.is_finished and job.kind in self.background_kinds)
+
+    def submit(self, func: Callable[..., Dict], *args, user_id: int,
+               kind: str = "render", meta: Optional[Dict] = None) -> RenderJob:
+        """Enqueue func(*args) and return immediately; must be called from the event loop"""
+        self._prune()
+        if kind in self.background_kinds:
+            if self.background_depth >= self.max_background or \
+                    self.depth + self.background_depth >= self.max_pending:
+                raise QueueFullError("Render queue is busy, background job skipped")
+        elif self.depth >= self.max_pending:
+            raise QueueFullError("Render queue is full, please retry shortly")
+        else:
+            self._shed_background(self.depth + self.background_depth + 1 - self.max_pending)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        job = RenderJob(user_id=user_id, kind=kind, meta=meta)
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job, func, args))
+        self._tasks.add(job.task)
+        job.task.add_done_callback(self._tasks.discard)
+        job.task.add_done_callback(lambda task: self._settle(job))
+        return job
+
+    async def _run(self, job: RenderJob, func: Callable[..., Dict], args: tuple):
+        try:
+            async with self._semaphore:
+                job.status = JobStatus.RUNNING
+                job.started_at = datetime.utcnow()
+                loop = asyncio.get_running_loop()
+                job.result = await loop.run_in_executor(self._executor, func, *args)
+                job.status = JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+        except Exception as e:
+            print(f"❌ Render job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+        finally:
+            job.finished_at = datetime.utcnow()
+            job.done.set()
+            job.finished.set()
+
+    @staticmethod
+    def _settle(job: RenderJob):
+        """A task cancelled before it started never reached _run's handlers"""
+        if not job.is_finished:
+            job.status = JobStatus.CANCELLED
+            job.finished_at = datetime.utcnow()
+            job.done.set()
+            job.finished.set()
+
+    def _shed_background(self, count: int):
+        """Cancel up to count background jobs still waiting for a slot, newest first"""
+        if count <= 0:
+            return
+        waiting = [job for job in self._snapshot()
+                   if job.kind in self.background_kinds and job.status == JobStatus.QUEUED]
+        for job in sorted(waiting, key=lambda job: job.created_at, reverse=True)[:count]:
+            job.task.cancel()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job
+        A job already executing on a worker thread runs to completion, but its result is dropped.
+        """
+        job = self.jobs.get(job_id)
+        if not job or job.is_finished or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def cancel_at(self, job_id: str, when: datetime):
+        """Schedule cancel() for a (naive UTC) deadline; must be called from the event loop"""
+        delay = max(0.0, (when - datetime.utcnow()).total_seconds())
+        asyncio.get_running_loop().call_later(delay, self.cancel, job_id)
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        return self.jobs.get(job_id)
+
+    async def wait(self, job: RenderJob, timeout: float) -> RenderJob:
+        """Long-poll helper: wait up to timeout seconds for the job to finish"""
+        if not job.is_finished and timeout > 0:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _prune(self):
+        """Forget finished jobs past the retention window"""
+        cutoff = datetime.utcnow() - self.retention
+        with self._jobs_lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job.is_finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def shutdown(self):
+        """Cancel pending jobs and stop worker threads"""
+        for task in list(self._tasks):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -189,10 +189,13 @@ async def get_pending_approvals(
         TryOnSession.admin_id == current_admin.id
     ).order_by(ImageApproval.created_at.asc()).all()
     
+    preview_urls = await storage_manager.get_signed_urls_async(
+        [image.image_path for _, image, _, _ in pending], expires_in=1800)
+    
     result = []
     for approval, image, session, user in pending:
         if image.image_path:
-            preview_url = storage_manager.get_signed_url(image.image_path, expires_in=1800)
+            preview_url = preview_urls[image.image_path]
             
             result.append({
                 "approval_id": approval.id,
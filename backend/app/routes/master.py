@@ -9,15 +9,18 @@ from sqlalchemy import func
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 import os
-import shutil
-import tempfile
 
 from ..database import get_db
 from ..models import User, Admin, Location, ImageApproval, InteractionCount, UserRole, ApprovalStatus, GeneratedImage, TryOnSession, Merchandise
 from ..storage import storage_manager
 from ..auth import get_password_hash, verify_password, create_access_token
 from .auth import get_current_user
+from ..render_pool import render_pool
+from ..quality import quality_controller
+from ..metrics import render_metrics
+from .tryon import pose_cache, render_cache, render_queue
 
 router = APIRouter()
 
@@ -384,12 +387,14 @@ async def get_all_approvals(
     
     total = query.count()
     approvals = query.offset(offset).limit(limit).all()
+    image_urls = await storage_manager.get_signed_urls_async(
+        [approval.image.image_path for approval in approvals if approval.image], expires_in=3600)
     
     result = []
     for approval in approvals:
         image_url = None
         if approval.image and approval.image.image_path:
-            image_url = storage_manager.get_signed_url(approval.image.image_path, expires_in=3600)
+            image_url = image_urls[approval.image.image_path]
         
         user_email = "Unknown"
         if approval.image and approval.image.session and approval.image.session.user:
@@ -424,40 +429,38 @@ async def create_merch(
 ):
     """Add new merchandise with image"""
     
-    # Save file
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, file.filename)
+    # Upload
+    upload_result = await storage_manager.upload_bytes_async(
+        await file.read(),
+        folder="merch",
+        file_ext=os.path.splitext(file.filename)[1]
+    )
     
+    # Create record
+    merch = Merchandise(
+        name=name,
+        category=category,
+        image_path=upload_result['path'],
+        is_active=True
+    )
+    db.add(merch)
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Upload
-        upload_result = storage_manager.upload_file(temp_path, folder="merch")
-        
-        # Create record
-        merch = Merchandise(
-            name=name,
-            category=category,
-            image_path=upload_result['path'],
-            is_active=True
-        )
-        db.add(merch)
         db.commit()
-        db.refresh(merch)
-        
-        return {
-            "message": "Merchandise added",
-            "merch": {
-                "id": merch.id,
-                "name": merch.name,
-                "category": merch.category,
-                "image_url": storage_manager.get_signed_url(merch.image_path)
-            }
+    except Exception:
+        db.rollback()
+        await storage_manager.delete_files_async([upload_result['path']])
+        raise
+    db.refresh(merch)
+    
+    return {
+        "message": "Merchandise added",
+        "merch": {
+            "id": merch.id,
+            "name": merch.name,
+            "category": merch.category,
+            "image_url": await storage_manager.get_signed_url_async(merch.image_path)
         }
-    finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    }
 
 @router.get("/merch")
 async def list_merch(
@@ -466,6 +469,7 @@ async def list_merch(
 ):
     """List all merchandise"""
     merch_list = db.query(Merchandise).all()
+    image_urls = await storage_manager.get_signed_urls_async([m.image_path for m in merch_list], expires_in=3600)
     
     result = []
     for m in merch_list:
@@ -473,7 +477,7 @@ async def list_merch(
             "id": m.id,
             "name": m.name,
             "category": m.category,
-            "image_url": storage_manager.get_signed_url(m.image_path, expires_in=3600),
+            "image_url": image_urls.get(m.image_path),
             "is_active": m.is_active
         })
     return {"merch": result}
@@ -492,6 +496,33 @@ async def delete_merch(
             detail="Merchandise not found"
         )
     
+    image_path = merch.image_path
     db.delete(merch)
     db.commit()
+    
+    # Release the row's storage reference (the file stays while an identical upload uses it)
+    await storage_manager.delete_files_async([image_path])
     return {"message": "Merchandise deleted"}
+
+@router.get("/engine-stats")
+async def get_engine_stats(
+    current_master: User = Depends(get_current_master)
+):
+    """Render pool health, queue depth, quality tier, pose / render dedup / signed URL cache counters"""
+    return {
+        # Pinging waits on the workers, so keep it off the event loop
+        "render_pool": await asyncio.to_thread(render_pool.check_health),
+        "render_queue": {"depth": render_queue.depth, "max_pending": render_queue.max_pending,
+                         "background_depth": render_queue.background_depth},
+        "quality": quality_controller.stats(),
+        "pose_cache": pose_cache.stats(),
+        "render_cache": render_cache.stats(),
+        "signed_url_cache": storage_manager.signed_url_cache.stats()
+    }
+
+@router.get("/render-timings")
+async def get_render_timings(
+    current_master: User = Depends(get_current_master)
+):
+    """Per-stage latency histograms (ms) for renders and upload-time pose analysis"""
+    return render_metrics.snapshot()
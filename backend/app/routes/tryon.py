@@ -3,80 +3,114 @@ Try-On Routes
 Upload, generate, and download virtual try-on images
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, Depends, HTTPException, Form, Query, Request, status
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
-import tempfile
-import shutil
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..models import User, TryOnSession, GeneratedImage, ImageApproval, ApprovalStatus, Merchandise
-from ..tryon_engine import TryOnEngine
 from ..storage import storage_manager
+from ..render_queue import RenderQueue, RenderJob, QueueFullError
+from ..render_pool import render_pool, render_tryon, analyze_photo
+from ..tryon_engine import ENGINE_VERSION, QUALITY_TIERS, PersonPose
+from ..upload_ingest import UploadIngestor, UploadRejected, read_multipart_upload
+from ..quality import quality_controller
+from ..metrics import render_metrics
+from ..cache import LRUCache
 from ..config import settings
 from .auth import get_current_user
 
 router = APIRouter()
-tryon_engine = TryOnEngine()
+render_queue = RenderQueue(
+    concurrency=settings.RENDER_CONCURRENCY or render_pool.size,
+    max_pending=settings.RENDER_QUEUE_MAX_PENDING,
+    retention_minutes=settings.RENDER_JOB_RETENTION_MINUTES,
+    background_kinds=("analysis",),
+    max_background=settings.ANALYSIS_QUEUE_MAX_PENDING
+)
+# detect_people() results keyed by (upload sha256, ENGINE_VERSION, model complexity, detection side),
+# expiring with the session
+pose_cache = LRUCache(max_bytes=settings.POSE_CACHE_MAX_MB * 1024 * 1024)
+# Stored render results ({'image_path', 'expires_at'}) keyed by render_cache_key(),
+# expiring with the stored image
+render_cache = LRUCache(max_bytes=16 * 1024 * 1024, max_entries=settings.RENDER_DEDUP_MAX_ENTRIES)
+# Renders in progress by render_cache_key() -> Future of the stored result, so concurrent identical
+# requests (double taps) wait for one render instead of each rendering until the cache is filled
+inflight_renders: Dict[tuple, Future] = {}
+inflight_lock = threading.Lock()
+# Speculative pose analysis started at upload, by session id
+analysis_jobs: Dict[int, RenderJob] = {}
 
 # File validation
 ALLOWED_EXTENSIONS = settings.ALLOWED_EXTENSIONS.split(',')
 MAX_FILE_SIZE = settings.MAX_FILE_SIZE_MB * 1024 * 1024  # Convert to bytes
+MAX_UPLOAD_PIXELS = settings.MAX_UPLOAD_MEGAPIXELS * 1000 * 1000
+MAX_JOB_WAIT_SECONDS = 30
 
-def validate_file(file: UploadFile):
-    """Validate uploaded file"""
-    # Check extension
-    file_ext = file.filename.split('.')[-1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Check file size (read first chunk to estimate)
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
-        )
-    
-    return True
+class BatchGenerateRequest(BaseModel):
+    merch_type: str
+    merch_designs: List[str]  # DB ids or bundled asset names, as for /generate
+    detection_resolution: Optional[int] = Field(None, ge=0, le=4096)  # as for /generate
 
 @router.get("/merch")
 async def list_available_merch(db: Session = Depends(get_db)):
     """List available merchandise"""
     merch_list = db.query(Merchandise).filter(Merchandise.is_active == True).all()
+    image_urls = await storage_manager.get_signed_urls_async([m.image_path for m in merch_list], expires_in=3600)
     
     result = []
     for m in merch_list:
         result.append({
             "id": str(m.id),
             "name": m.name,
-            "image_url": storage_manager.get_signed_url(m.image_path, expires_in=3600),
+            "image_url": image_urls.get(m.image_path),
             "category": m.category
         })
     return {"merch": result}
 
-@router.post("/upload")
+# The body is streamed through UploadIngestor rather than declared as File/Form parameters
+# (which would spool it to a temp file first), so describe the form for the API docs here
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "admin_id": {"type": "integer"},
+                "location_id": {"type": "integer"}
+            }
+        }}}
+    }
+}
+
+def optional_int_field(fields: Dict[str, str], name: str) -> Optional[int]:
+    value = fields.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise UploadRejected(f"{name} must be an integer")
+
+@router.post("/upload", openapi_extra=UPLOAD_FORM_SCHEMA)
 async def upload_photo(
-    file: UploadFile = File(...),
-    admin_id: Optional[int] = Form(None),
-    location_id: Optional[int] = Form(None),
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Upload user photo for try-on"""
     
-    # Validate file
-    validate_file(file)
-    
-    # Check try-on limit
+    # Check try-on limit (before reading the body)
     session_count = db.query(TryOnSession).filter(
         TryOnSession.user_id == current_user.id
     ).count()
@@ -87,16 +121,27 @@ async def upload_photo(
             detail=f"Maximum {settings.MAX_TRYON_PER_USER} try-ons allowed per user"
         )
     
-    # Save file temporarily
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, file.filename)
+    # Validate while the body streams in: size, type and frame dimensions are checked as
+    # soon as the bytes that decide them arrive, then metadata is stripped and hashed once
+    ingestor = UploadIngestor(MAX_FILE_SIZE, MAX_UPLOAD_PIXELS, ALLOWED_EXTENSIONS)
+    try:
+        fields = await read_multipart_upload(request, ingestor)
+        admin_id = optional_int_field(fields, "admin_id")
+        location_id = optional_int_field(fields, "location_id")
+        upload = await asyncio.to_thread(ingestor.finish)
+    except UploadRejected as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
+    stored_path = None
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Upload to Supabase
-        upload_result = storage_manager.upload_file(temp_path, folder="uploads")
+        upload_result = await storage_manager.upload_bytes_async(
+            upload['data'],
+            folder="uploads",
+            file_ext=upload['file_ext'],
+            strip_metadata=False,  # already stripped by the ingestor
+            sha256=upload['sha256']  # ...and hashed, so the bytes are not hashed again
+        )
+        stored_path = upload_result['path']
         
         # Create session
         session = TryOnSession(
@@ -110,40 +155,358 @@ async def upload_photo(
         )
         db.add(session)
         db.commit()
+        stored_path = None  # the session row owns the reference now
         db.refresh(session)
         
+        analysis_job = start_pose_analysis(session, current_user.id, upload['data'], upload['sha256'])
+        
         return {
             "session_id": session.id,
+            "analysis_job_id": analysis_job.id if analysis_job else None,
             "message": "Photo uploaded successfully",
             "expires_at": session.expires_at.isoformat()
         }
         
     except Exception as e:
+        db.rollback()
+        if stored_path:
+            await storage_manager.delete_files_async([stored_path])
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Upload failed: {str(e)}"
         )
-    finally:
-        # Cleanup temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
 
-@router.post("/generate/{session_id}")
-async def generate_tryon(
-    session_id: int,
-    merch_type: str = Form(...),
-    merch_design: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Generate virtual try-on image"""
+def resolve_merch(db: Session, merch_design: str) -> Dict:
+    """
+    Resolve a merch design (DB id or bundled asset name) to a cacheable reference
+    Returns: {'key': str, 'version': str, 'storage_path': str|None, 'asset_path': str|None}
+    """
+    merch_record = None
+    
+    # Check if it's a DB ID
+    if merch_design.isdigit():
+        merch_record = db.query(Merchandise).filter(Merchandise.id == int(merch_design)).first()
+    
+    if merch_record:
+        # Storage paths are unique per upload, so the path doubles as the content version
+        return {
+            'key': str(merch_record.id),
+            'version': merch_record.image_path,
+            'storage_path': merch_record.image_path,
+            'asset_path': None
+        }
+    
+    # Fallback to local assets
+    merch_path = os.path.join("assets", "merch", f"{merch_design}.png")
+    if not os.path.exists(merch_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Merch design not found"
+        )
+    stat = os.stat(merch_path)
+    return {
+        'key': f"asset:{merch_design}",
+        'version': f"{stat.st_mtime_ns}:{stat.st_size}",
+        'storage_path': None,
+        'asset_path': merch_path
+    }
+
+def end_of_day_expiry() -> datetime:
+    """Generated images expire at the end of the current day"""
+    now = datetime.utcnow()
+    end_of_day = datetime(now.year, now.month, now.day, 23, 59, 59)
+    if now.hour >= 23:
+        end_of_day += timedelta(days=1)
+    return end_of_day
+
+def pose_cache_key(upload_digest: str, tier: str, detection_side: int) -> tuple:
+    """Pose detections are reusable for identical pixels on the same engine version, pose model and resolution"""
+    return (upload_digest, ENGINE_VERSION, QUALITY_TIERS[tier]["model_complexity"], detection_side)
+
+def render_cache_key(upload_digest: str, merch_ref: Dict, tier: str, detection_side: int) -> tuple:
+    """Renders are byte-identical for the same photo, design version, engine version, tier and pose resolution"""
+    return (upload_digest, merch_ref['key'], merch_ref['version'], ENGINE_VERSION, tier, detection_side)
+
+def resolve_detection_side(detection_resolution: Optional[int], tier: str) -> int:
+    """Per-request pose inference resolution, falling back to the tier's and then the global setting"""
+    if detection_resolution is not None:
+        return detection_resolution
+    tier_side = QUALITY_TIERS[tier]["detection_max_side"]
+    return tier_side if tier_side is not None else settings.POSE_DETECTION_MAX_SIDE
+
+def remember_people(key: tuple, people: Optional[List[PersonPose]], session_expires_at: datetime):
+    """Cache detections until the session's upload expires"""
+    if people is not None:
+        ttl = (session_expires_at - datetime.utcnow()).total_seconds()
+        pose_cache.put(key, people, ttl=ttl)
+
+def run_analysis_job(session_id: int, upload_bytes: bytes, upload_digest: str, session_expires_at: datetime,
+                     tier: str, detection_side: int) -> Dict:
+    """
+    Speculative pose analysis right after upload (runs on a render queue thread)
+    Works on the stored bytes still in memory from ingestion, so nothing is read back from storage.
+    Fills the pose cache so /generate only has to composite, and records num_people_detected.
+    """
+    pose_key = pose_cache_key(upload_digest, tier, detection_side)
+    
+    people, timings = render_pool.run(analyze_photo, upload_bytes, detection_side, tier)
+    render_metrics.record("analysis", timings)
+    
+    # The session may have expired (and the job been cancelled) while the worker was busy
+    if datetime.utcnow() >= session_expires_at:
+        return {"num_people_detected": None, "expired": True}
+    
+    remember_people(pose_key, people, session_expires_at)
+    
+    if people is not None:
+        db = SessionLocal()
+        try:
+            session = db.query(TryOnSession).filter(TryOnSession.id == session_id).first()
+            if session:
+                session.num_people_detected = len(people)
+                db.commit()
+        finally:
+            db.close()
+    
+    return {"num_people_detected": len(people) if people is not None else None}
+
+def start_pose_analysis(session: TryOnSession, user_id: int, upload_bytes: bytes,
+                        upload_digest: str) -> Optional[RenderJob]:
+    """Queue upload-time pose analysis without blocking the response; cancelled when the session expires"""
+    for session_id, job in list(analysis_jobs.items()):
+        if job.is_finished:
+            del analysis_jobs[session_id]
+    
+    # Analyse at the tier renders are currently getting, so they can reuse the detections
+    tier = quality_controller.select(render_queue.depth)
+    detection_side = resolve_detection_side(None, tier)
+    try:
+        job = render_queue.submit(
+            run_analysis_job, session.id, upload_bytes, upload_digest, session.expires_at,
+            tier, detection_side,
+            user_id=user_id,
+            kind="analysis",
+            meta={"session_id": session.id, "quality_tier": tier, "detection_side": detection_side}
+        )
+    except QueueFullError:
+        # Purely an optimisation - /generate will detect poses itself (also if it is shed later)
+        return None
+    
+    analysis_jobs[session.id] = job
+    render_queue.cancel_at(job.id, session.expires_at)
+    return job
+
+def wait_for_analysis(session_id: int, pose_key: tuple, tier: str, detection_side: int) -> Optional[List[PersonPose]]:
+    """If upload-time analysis for this session is still running, wait for it instead of detecting twice"""
+    job = analysis_jobs.get(session_id)
+    if job is None or (job.meta["quality_tier"], job.meta["detection_side"]) != (tier, detection_side):
+        return None
+    job.finished.wait(timeout=settings.RENDER_TIMEOUT_SECONDS)
+    return pose_cache.get(pose_key)
+
+def claim_renders(render_keys: List[tuple]) -> List[tuple]:
+    """
+    (future, owner) per key: the owner renders and resolves the future; others wait on it
+    A key listed twice is owned by its first occurrence.
+    """
+    claims = []
+    with inflight_lock:
+        for key in render_keys:
+            future = inflight_renders.get(key)
+            if future is None:
+                future = inflight_renders[key] = Future()
+                claims.append((future, True))
+            else:
+                claims.append((future, False))
+    return claims
+
+def finish_claims(render_keys: List[tuple], claims: List[tuple]):
+    """Stop advertising this job's renders; waiters on ones it never resolved render themselves"""
+    with inflight_lock:
+        for key, (future, owner) in zip(render_keys, claims):
+            if owner:
+                if not future.done():
+                    future.set_exception(RuntimeError("Render failed"))
+                if inflight_renders.get(key) is future:
+                    del inflight_renders[key]
+
+def render_designs(session_id: int, upload_bytes: bytes, upload_digest: str, session_expires_at: datetime,
+                   merch_refs: List[Dict], tier: str, detection_side: int) -> List[tuple]:
+    """
+    Render designs onto the photo in a worker and upload the results
+    Returns: [((jpeg_bytes, processing_time_ms, timings), upload_result)] in merch_refs order
+    """
+    if not merch_refs:
+        return []
+    
+    # Reuse detections from upload-time analysis or an earlier render of this photo
+    pose_key = pose_cache_key(upload_digest, tier, detection_side)
+    people = pose_cache.get(pose_key)
+    if people is None:
+        people = wait_for_analysis(session_id, pose_key, tier, detection_side)
+    
+    # Generate try-ons (decode + detect once, composite every design)
+    render_start = time.monotonic()
+    renders, people = render_pool.run(render_tryon, upload_bytes, merch_refs, people, detection_side, tier)
+    quality_controller.record((time.monotonic() - render_start) * 1000 / len(merch_refs))
+    remember_people(pose_key, people, session_expires_at)
+    
+    # Upload all results concurrently (encoded by the engine, so there is no EXIF to strip)
+    upload_results = storage_manager.upload_many([result_bytes for result_bytes, _, _ in renders],
+                                                 folder="generated", strip_metadata=False)
+    return list(zip(renders, upload_results))
+
+def render_and_store(session_id: int, uploaded_image_path: str, session_expires_at: datetime,
+                     merch_refs: List[Dict], detection_resolution: Optional[int] = None) -> List[Dict]:
+    """
+    Render one or more designs onto a session photo and persist them
+    (runs on a render queue thread, off the event loop; the render itself happens in a warm worker)
+    The quality tier is picked from the current load when the job starts.
+    Creates a GeneratedImage + pending ImageApproval row per design, committed together.
+    Designs already rendered identically (retries, double taps) are linked to the stored
+    result instead of being rendered and uploaded again - including renders another job
+    is still working on, which are waited for.
+    Every row holds a storage reference; if the job fails, the references it took are released.
+    """
+    db = SessionLocal()
+    claimed_paths = []
+    missing_keys = []
+    claims = []
     
-    # Get session
+    try:
+        upload_bytes = storage_manager.read_file(uploaded_image_path)
+        upload_digest = hashlib.sha256(upload_bytes).hexdigest()
+        tier = quality_controller.select(render_queue.depth)
+        detection_side = resolve_detection_side(detection_resolution, tier)
+        
+        render_keys = [render_cache_key(upload_digest, merch_ref, tier, detection_side) for merch_ref in merch_refs]
+        stored_results = [render_cache.get(key) for key in render_keys]
+        
+        # Render what no other job is rendering; publish each result as soon as it is uploaded
+        # (before waiting on anyone else, so jobs waiting on each other cannot deadlock)
+        missing = [i for i, stored in enumerate(stored_results) if stored is None]
+        missing_keys = [render_keys[i] for i in missing]
+        claims = claim_renders(missing_keys)
+        owned = [i for i, (_, owner) in zip(missing, claims) if owner]
+        expires_at = end_of_day_expiry()
+        new_renders = dict(zip(owned, render_designs(
+            session_id, upload_bytes, upload_digest, session_expires_at,
+            [merch_refs[i] for i in owned], tier, detection_side)))
+        claimed_paths.extend(upload_result['path'] for _, upload_result in new_renders.values())
+        for i, (future, owner) in zip(missing, claims):
+            if owner:
+                future.set_result({'image_path': new_renders[i][1]['path'], 'expires_at': expires_at})
+        
+        # Identical renders another job had in flight; if it failed, render them here
+        for i, (future, owner) in zip(missing, claims):
+            if not owner:
+                try:
+                    stored_results[i] = future.result(timeout=settings.RENDER_TIMEOUT_SECONDS * 2)
+                except Exception:
+                    pass
+        
+        # Reference the stored renders; one the scheduler just released is rendered again
+        hit_paths = [stored_results[i]['image_path'] for i in range(len(merch_refs))
+                     if i not in new_renders and stored_results[i] is not None]
+        retained = storage_manager.retain(hit_paths) if hit_paths else set()
+        claimed_paths.extend(path for path in hit_paths if path in retained)
+        retry = [i for i in range(len(merch_refs)) if i not in new_renders and
+                 (stored_results[i] is None or stored_results[i]['image_path'] not in retained)]
+        new_renders.update(zip(retry, render_designs(
+            session_id, upload_bytes, upload_digest, session_expires_at,
+            [merch_refs[i] for i in retry], tier, detection_side)))
+        claimed_paths.extend(new_renders[i][1]['path'] for i in retry)
+        
+        generated_images = []
+        new_results = []
+        for i, render_key in enumerate(render_keys):
+            if i in new_renders:
+                (_, processing_time, timings), upload_result = new_renders[i]
+                render_metrics.record("render", timings)
+                
+                # Create generated image record
+                generated = GeneratedImage(
+                    session_id=session_id,
+                    image_path=upload_result['path'],
+                    processing_time_ms=processing_time,
+                    quality_tier=tier,
+                    stage_timings=timings,
+                    expires_at=expires_at
+                )
+                new_results.append((render_key, {'image_path': generated.image_path,
+                                                 'expires_at': generated.expires_at}))
+            else:
+                # Same stored image; expires with it
+                generated = GeneratedImage(
+                    session_id=session_id,
+                    image_path=stored_results[i]['image_path'],
+                    processing_time_ms=0,
+                    quality_tier=tier,
+                    expires_at=stored_results[i]['expires_at']
+                )
+            db.add(generated)
+            db.flush()  # Generate ID for approval record
+            
+            # Create approval record
+            approval = ImageApproval(
+                image_id=generated.id,
+                status=ApprovalStatus.PENDING
+            )
+            db.add(approval)
+            generated_images.append((generated, i not in new_renders))
+        
+        db.commit()
+        claimed_paths.clear()  # the rows own the references now
+        
+        for render_key, stored in new_results:
+            render_cache.put(render_key, stored, ttl=(stored['expires_at'] - datetime.utcnow()).total_seconds())
+        
+        preview_urls = storage_manager.get_signed_urls(
+            [generated.image_path for generated, _ in generated_images], expires_in=3600)
+        return [
+            {
+                "image_id": generated.id,
+                "preview_url": preview_urls[generated.image_path],
+                "processing_time_ms": generated.processing_time_ms,
+                "quality_tier": generated.quality_tier,
+                "stage_timings": generated.stage_timings,
+                "deduplicated": deduplicated,
+                "status": "pending_approval"
+            }
+            for generated, deduplicated in generated_images
+        ]
+    except Exception:
+        db.rollback()
+        storage_manager.delete_files_batch(claimed_paths)
+        raise
+    finally:
+        finish_claims(missing_keys, claims)
+        db.close()
+
+def run_tryon_job(session_id: int, uploaded_image_path: str, session_expires_at: datetime,
+                  merch_ref: Dict, detection_resolution: Optional[int] = None) -> Dict:
+    """Render job for a single design"""
+    image = render_and_store(session_id, uploaded_image_path, session_expires_at, [merch_ref],
+                             detection_resolution)[0]
+    image["message"] = "Try-on generated! Waiting for admin approval."
+    return image
+
+def run_tryon_batch_job(session_id: int, uploaded_image_path: str, session_expires_at: datetime,
+                        merch_refs: List[Dict], detection_resolution: Optional[int] = None) -> Dict:
+    """Render job for several designs on the same photo"""
+    images = render_and_store(session_id, uploaded_image_path, session_expires_at, merch_refs,
+                              detection_resolution)
+    return {
+        "images": images,
+        "image_ids": [image["image_id"] for image in images],
+        "message": f"{len(images)} try-ons generated! Waiting for admin approval."
+    }
+
+def get_own_session(db: Session, session_id: int, user: User) -> TryOnSession:
+    """Fetch a try-on session owned by the user with a still-available upload"""
     session = db.query(TryOnSession).filter(
         TryOnSession.id == session_id,
-        TryOnSession.user_id == current_user.id
+        TryOnSession.user_id == user.id
     ).first()
     
     if not session:
@@ -158,136 +521,112 @@ async def generate_tryon(
             detail="Session image has expired"
         )
     
+    return session
+
+def enqueue_job(func, *args, user_id: int, kind: str = "render", meta: Optional[Dict] = None) -> RenderJob:
+    """Submit to the render queue, mapping a full queue to 503"""
+    try:
+        return render_queue.submit(func, *args, user_id=user_id, kind=kind, meta=meta)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+@router.post("/generate/{session_id}", status_code=status.HTTP_202_ACCEPTED)
+async def generate_tryon(
+    session_id: int,
+    merch_type: str = Form(...),
+    merch_design: str = Form(...),
+    detection_resolution: Optional[int] = Form(None, ge=0, le=4096, description="Pose inference longest side (0 = full size)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a virtual try-on render; poll /jobs/{job_id} for the result"""
+    
+    session = get_own_session(db, session_id, current_user)
+    merch_ref = resolve_merch(db, merch_design)
+    
     # Update session with merch info
     session.merch_type = merch_type
     session.merch_design = merch_design
+    db.commit()
     
-    # Download images to temp files
-    temp_dir = tempfile.mkdtemp()
+    job = enqueue_job(
+        run_tryon_job, session.id, session.uploaded_image_path, session.expires_at, merch_ref,
+        detection_resolution,
+        user_id=current_user.id,
+        meta={"session_id": session.id}
+    )
     
-    try:
-        # Get uploaded image
-        uploaded_url = storage_manager.get_signed_url(session.uploaded_image_path)
-        uploaded_temp = os.path.join(temp_dir, "uploaded.jpg")
-        
-        # Download or copy uploaded image
-        if uploaded_url.startswith("/"):
-            # Local file handling
-            local_path = uploaded_url.lstrip("/")
-            # Handle potential leading slash if lstrip behaves differently or if url is absolute path?
-            # get_signed_url returns f"/storage/{file_path}"
-            if local_path.startswith("/"): local_path = local_path[1:]
-            
-            if not os.path.exists(local_path):
-                 raise HTTPException(status_code=404, detail=f"Source image file missing: {local_path}")
-            shutil.copy(local_path, uploaded_temp)
-        else:
-            # Remote URL handling
-            import requests
-            response = requests.get(uploaded_url)
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to retrieve source image")
-            with open(uploaded_temp, 'wb') as f:
-                f.write(response.content)
-        
-        # Get merch template
-        merch_path = ""
-        merch_record = None
-        
-        # Check if it's a DB ID
-        if merch_design.isdigit():
-            merch_record = db.query(Merchandise).filter(Merchandise.id == int(merch_design)).first()
-            
-        if merch_record:
-            # Download from storage
-            merch_url = storage_manager.get_signed_url(merch_record.image_path)
-            temp_merch = os.path.join(temp_dir, f"merch_{merch_record.id}.png")
-            
-            if merch_url.startswith("/"):
-                # Local file handling
-                local_merch_path = merch_url.lstrip("/")
-                if local_merch_path.startswith("/"): local_merch_path = local_merch_path[1:]
-                
-                if not os.path.exists(local_merch_path):
-                     raise HTTPException(status_code=404, detail=f"Merchandise image file missing: {local_merch_path}")
-                shutil.copy(local_merch_path, temp_merch)
-                merch_path = temp_merch
-            else:
-                import requests
-                resp = requests.get(merch_url)
-                if resp.status_code == 200:
-                    with open(temp_merch, 'wb') as f:
-                        f.write(resp.content)
-                    merch_path = temp_merch
-                else:
-                     raise HTTPException(status_code=400, detail="Failed to download merch image")
-        else:
-            # Fallback to local assets
-            merch_path = os.path.join("assets", "merch", f"{merch_design}.png")
-            if not os.path.exists(merch_path):
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Merch design not found"
-                )
-        
-        # Generate try-on
-        result_image, processing_time = tryon_engine.apply_tryon(uploaded_temp, merch_path)
-        
-        # Save result
-        result_temp = os.path.join(temp_dir, "result.jpg")
-        import cv2
-        cv2.imwrite(result_temp, result_image)
-        
-        # Upload result to storage
-        upload_result = storage_manager.upload_file(result_temp, folder="generated")
-        
-        # Calculate end of day for expiration
-        now = datetime.utcnow()
-        end_of_day = datetime(now.year, now.month, now.day, 23, 59, 59)
-        if now.hour >= 23:
-            end_of_day += timedelta(days=1)
-        
-        # Create generated image record
-        generated = GeneratedImage(
-            session_id=session.id,
-            image_path=upload_result['path'],
-            processing_time_ms=processing_time,
-            expires_at=end_of_day
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/tryon/jobs/{job.id}",
+        "message": "Try-on queued"
+    }
+
+@router.post("/generate-batch/{session_id}", status_code=status.HTTP_202_ACCEPTED)
+async def generate_tryon_batch(
+    session_id: int,
+    request: BatchGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue one render of the session photo in several designs; the job result lists every image id"""
+    
+    # Duplicates would just render the same image twice
+    merch_designs = list(dict.fromkeys(request.merch_designs))
+    if not merch_designs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No merch designs given"
         )
-        db.add(generated)
-        db.flush()  # Generate ID for approval record
-        
-        # Create approval record
-        approval = ImageApproval(
-            image_id=generated.id,
-            status=ApprovalStatus.PENDING
+    if len(merch_designs) > settings.MAX_TRYON_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {settings.MAX_TRYON_PER_USER} designs per batch"
         )
-        db.add(approval)
-        
-        db.commit()
-        db.refresh(generated)
-        
-        # Get preview URL
-        preview_url = storage_manager.get_signed_url(generated.image_path, expires_in=3600)
-        
-        return {
-            "image_id": generated.id,
-            "preview_url": preview_url,
-            "processing_time_ms": processing_time,
-            "status": "pending_approval",
-            "message": "Try-on generated! Waiting for admin approval."
-        }
-        
-    except Exception as e:
-        db.rollback()
+    
+    session = get_own_session(db, session_id, current_user)
+    merch_refs = [resolve_merch(db, merch_design) for merch_design in merch_designs]
+    
+    # Update session with merch info
+    session.merch_type = request.merch_type
+    session.merch_design = ",".join(merch_designs)
+    db.commit()
+    
+    job = enqueue_job(
+        run_tryon_batch_job, session.id, session.uploaded_image_path, session.expires_at, merch_refs,
+        request.detection_resolution,
+        user_id=current_user.id,
+        kind="batch",
+        meta={"session_id": session.id, "merch_designs": merch_designs}
+    )
+    
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/tryon/jobs/{job.id}",
+        "message": f"{len(merch_designs)} try-ons queued"
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=MAX_JOB_WAIT_SECONDS, description="Long-poll: seconds to wait for completion"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get render job status (optionally long-polling until it finishes)"""
+    job = render_queue.get(job_id)
+    if not job or job.user_id != current_user.id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Generation failed: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
-    finally:
-        # Cleanup temp files
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    
+    await render_queue.wait(job, wait)
+    return job.to_dict()
 
 @router.get("/my-sessions")
 async def get_my_sessions(
@@ -300,6 +639,12 @@ async def get_my_sessions(
         TryOnSession.user_id == current_user.id
     ).order_by(TryOnSession.created_at.desc()).all()
     
+    # Sign every URL in the listing up front (two batch calls instead of one per image)
+    upload_urls = await storage_manager.get_signed_urls_async(
+        [session.uploaded_image_path for session in sessions], expires_in=3600)
+    preview_urls = await storage_manager.get_signed_urls_async(
+        [image.image_path for session in sessions for image in session.generated_images], expires_in=1800)
+    
     result = []
     for session in sessions:
         session_data = {
@@ -307,7 +652,7 @@ async def get_my_sessions(
             "merch_type": session.merch_type,
             "merch_design": session.merch_design,
             "created_at": session.created_at.isoformat(),
-            "uploaded_image_url": storage_manager.get_signed_url(session.uploaded_image_path, expires_in=3600) if session.uploaded_image_path else None,
+            "uploaded_image_url": upload_urls.get(session.uploaded_image_path),
             "images": []
         }
         
@@ -322,7 +667,7 @@ async def get_my_sessions(
             
             # Add preview URL if image still exists
             if image.image_path:
-                image_data["preview_url"] = storage_manager.get_signed_url(image.image_path, expires_in=1800)
+                image_data["preview_url"] = preview_urls[image.image_path]
             
             session_data["images"].append(image_data)
         
@@ -368,7 +713,7 @@ async def download_image(
         )
     
     # Generate download URL (valid for 1 hour)
-    download_url = storage_manager.get_signed_url(image.image_path, expires_in=3600)
+    download_url = await storage_manager.get_signed_url_async(image.image_path, expires_in=3600)
     
     return {
         "download_url": download_url,
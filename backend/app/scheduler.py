@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from .database import SessionLocal
 from .models import TryOnSession, GeneratedImage
 from .storage import storage_manager
+from .render_pool import render_pool
+from .config import settings
 
 scheduler = BackgroundScheduler()
 
@@ -18,21 +20,24 @@ def cleanup_expired_uploads():
     try:
         now = datetime.utcnow()
         expired_sessions = db.query(TryOnSession).filter(
-            TryOnSession.expires_at <= now
+            TryOnSession.expires_at <= now,
+            TryOnSession.uploaded_image_path.isnot(None)
         ).all()
         
+        expired_paths = []
         deleted_count = 0
         for session in expired_sessions:
-            # Delete from storage
-            if session.uploaded_image_path:
-                storage_manager.delete_file(session.uploaded_image_path)
-            
             # Update database (keep metadata, remove path)
+            expired_paths.append(session.uploaded_image_path)
             session.uploaded_image_path = None
             session.uploaded_image_url = None
             deleted_count += 1
         
         db.commit()
+        
+        # Release each session's reference in one batch (after the commit, so a path is never
+        # released twice); files no other row uses are deleted from storage
+        storage_manager.delete_files_batch(expired_paths)
         print(f"✅ Cleaned up {deleted_count} expired uploaded images")
         
     except Exception as e:
@@ -47,21 +52,24 @@ def cleanup_expired_generated():
     try:
         now = datetime.utcnow()
         expired_images = db.query(GeneratedImage).filter(
-            GeneratedImage.expires_at <= now
+            GeneratedImage.expires_at <= now,
+            GeneratedImage.image_path.isnot(None)
         ).all()
         
+        expired_paths = []
         deleted_count = 0
         for image in expired_images:
-            # Delete from storage
-            if image.image_path:
-                storage_manager.delete_file(image.image_path)
-            
             # Update database (keep metadata, remove path)
+            expired_paths.append(image.image_path)
             image.image_path = None
             image.image_url = None
             deleted_count += 1
         
         db.commit()
+        
+        # Release each image's reference in one batch; a file a deduplicated render or an
+        # identical image still links to stays until its last row expires
+        storage_manager.delete_files_batch(expired_paths)
         print(f"✅ Cleaned up {deleted_count} expired generated images")
         
     except Exception as e:
@@ -70,12 +78,23 @@ def cleanup_expired_generated():
     finally:
         db.close()
 
+def check_render_pool():
+    """Ping render workers and respawn the pool if it stopped responding"""
+    try:
+        health = render_pool.check_health()
+        if not health['healthy']:
+            print("⚠️  Render pool was unhealthy and has been respawned")
+    except Exception as e:
+        print(f"❌ Render pool health check error: {str(e)}")
+
 def start_scheduler():
     """Start the background scheduler"""
     # Run cleanup every hour
     scheduler.add_job(cleanup_expired_uploads, 'interval', hours=1, id='cleanup_uploads')
     scheduler.add_job(cleanup_expired_generated, 'interval', hours=1, id='cleanup_generated')
     
+    scheduler.add_job(check_render_pool, 'interval', seconds=settings.RENDER_HEALTH_CHECK_SECONDS, id='render_pool_health')
+    
     # Run cleanup at midnight daily
     scheduler.add_job(cleanup_expired_generated, 'cron', hour=0, minute=0, id='daily_cleanup')
     
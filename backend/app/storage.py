@@ -1,169 +1,323 @@
 """
-Supabase Storage Manager
-Handles file uploads, signed URLs, and auto-deletion
-Falls back to local storage if Supabase is not configured
+Storage Manager
+Handles file uploads, signed URLs, and auto-deletion on top of a pluggable
+async backend (Supabase, local directory or in-memory - see storage_backends).
+Objects are reference counted (see object_refs) and can be content-addressed,
+so identical bytes are stored once and deleted with their last reference.
 """
 
+import asyncio
+import hashlib
 import os
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    print("⚠️  Supabase not installed - using local storage")
-from PIL import Image
-import io
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Coroutine, Dict, Iterable, List, Optional, Set, Tuple
+
+from .image_metadata import strip_metadata
+from .cache import LRUCache
 from .config import settings
+from .object_refs import ObjectRefs
+from .storage_backends import StorageBackend, create_backend
 
 class StorageManager:
-    def __init__(self):
-        self.supabase = None
-        self.bucket_name = None
-        self.enabled = False
-        
-        if SUPABASE_AVAILABLE and hasattr(settings, 'SUPABASE_URL'):
-            try:
-                self.supabase: Client = create_client(
-                    settings.SUPABASE_URL,
-                    settings.SUPABASE_KEY
-                )
-                self.bucket_name = settings.SUPABASE_BUCKET
-                self.enabled = True
-                print("✅ Supabase storage enabled")
-            except Exception as e:
-                print(f"⚠️  Supabase init failed: {e} - using local storage")
-                self.enabled = False
+    CONTENT_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+    
+    def __init__(self, backend: Optional[StorageBackend] = None, refs: Optional[ObjectRefs] = None,
+                 content_addressed: Optional[bool] = None):
+        """
+        refs: reference count store (default: the stored_objects table)
+        content_addressed: name objects <folder>/<ab>/<cd>/<sha256><ext> instead of a random uuid
+        (default: settings.STORAGE_CONTENT_ADDRESSED)
+        """
+        self.backend = backend or create_backend()
+        self.enabled = not self.backend.local  # objects live outside the /storage mount
+        self.content_addressed = (settings.STORAGE_CONTENT_ADDRESSED if content_addressed is None
+                                  else content_addressed)
+        self._refs = refs
+    
+        # Signed URLs by storage path -> (url, unix expiry); a cached URL is handed out again only
+        # while it has at least (1 - SIGNED_URL_REFRESH_FRACTION) of the requested lifetime left
+        self.signed_url_cache = LRUCache(max_bytes=16 * 1024 * 1024,
+                                         max_entries=settings.SIGNED_URL_CACHE_MAX_ENTRIES)
+    
+        # Backend calls run on one private event loop thread, so a single pooled HTTP client
+        # serves async routes, render threads, the scheduler and worker processes alike
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Per-path locks (only used on the storage loop) so counting and writing/deleting the
+        # object it decides on happen together: path -> [asyncio.Lock, holders + waiters]
+        self._path_locks: Dict[str, list] = {}
+    
+    @property
+    def refs(self) -> ObjectRefs:
+        if self._refs is None:
+            from .database import SessionLocal
+            from .object_refs import DatabaseObjectRefs
+            self._refs = DatabaseObjectRefs(SessionLocal)
+        return self._refs
+    
+    def _submit(self, coro: Coroutine) -> Future:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="storage-io", daemon=True).start()
+                self._loop = loop
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    
+    def _run(self, coro: Coroutine):
+        """Run a backend coroutine from synchronous code (blocks until done)"""
+        return self._submit(coro).result()
+    
+    async def _arun(self, coro: Coroutine):
+        """Await a backend coroutine from any other event loop"""
+        return await asyncio.wrap_future(self._submit(coro))
+    
+    def close(self):
+        """Close backend connections and stop the storage loop"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.backend.aclose(), loop).result(timeout=10)
+            loop.call_soon_threadsafe(loop.stop)
+    
+    def strip_exif(self, image_data: bytes) -> bytes:
+        """Remove EXIF/XMP data from an encoded image for privacy (see image_metadata.strip_metadata)"""
+        return strip_metadata(image_data)
+    
+    def _prepare_upload(self, data: bytes, folder: str, file_ext: str,
+                        strip: bool, sha256: Optional[str] = None) -> Tuple[str, bytes, str, str]:
+        """
+        (storage path, bytes to store, content type, sha256) for a new object
+        sha256: digest of data the caller already computed (ignored when stripping changes the bytes)
+        """
+        file_ext = file_ext.lower()
+        file_bytes = self.strip_exif(data) if strip else data
+        digest = sha256 if sha256 and not strip else hashlib.sha256(file_bytes).hexdigest()
+        if self.content_addressed:
+            storage_path = f"{folder}/{digest[:2]}/{digest[2:4]}/{digest}{file_ext}"
         else:
-            print("⚠️  Supabase not configured - using local storage fallback")
-    
-    def strip_exif(self, image_path: str) -> bytes:
-        """Remove EXIF data from image for privacy"""
-        image = Image.open(image_path)
-        
-        # Remove EXIF data
-        data = list(image.getdata())
-        image_without_exif = Image.new(image.mode, image.size)
-        image_without_exif.putdata(data)
-        
-        # Convert to bytes
-        img_byte_arr = io.BytesIO()
-        image_without_exif.save(img_byte_arr, format=image.format or 'JPEG')
-        img_byte_arr.seek(0)
-        
-        return img_byte_arr.getvalue()
+            storage_path = f"{folder}/{uuid.uuid4()}{file_ext}"
+        return storage_path, file_bytes, self.CONTENT_TYPES.get(file_ext, "image/jpeg"), digest
+    
+    def _upload_result(self, storage_path: str, deduplicated: bool) -> dict:
+        return {
+            'path': storage_path,
+            'url': f"/storage/{storage_path}" if self.backend.local else None,  # else use signed URLs
+            'local': self.backend.local,
+            'deduplicated': deduplicated  # identical bytes were already stored under this path
+        }
+    
+    @asynccontextmanager
+    async def _locked(self, paths: Iterable[str]):
+        """Hold the locks of several paths (taken in sorted order, so batches cannot deadlock)"""
+        entries = []
+        for path in sorted(set(paths)):
+            entry = self._path_locks.setdefault(path, [asyncio.Lock(), 0])
+            entry[1] += 1
+            entries.append((path, entry))
+        acquired = []
+        try:
+            for _, entry in entries:
+                await entry[0].acquire()
+                acquired.append(entry[0])
+            yield
+        finally:
+            for lock in acquired:
+                lock.release()
+            for path, entry in entries:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._path_locks[path]
+    
+    async def _store(self, prepared: List[Tuple[str, bytes, str, str]]) -> Set[str]:
+        """Add a reference per item and write the objects that did not exist yet; returns written paths"""
+        counts = Counter(path for path, _, _, _ in prepared)
+        info = {path: (digest, len(data)) for path, data, _, digest in prepared}
+        async with self._locked(counts):
+            totals = await asyncio.to_thread(self.refs.add, dict(counts), info)
+            new_objects = {}
+            for path, data, content_type, _ in prepared:
+                if totals[path] == counts[path]:
+                    new_objects.setdefault(path, (path, data, content_type))
+            try:
+                await self.backend.put_many(list(new_objects.values()))
+            except Exception:
+                # Undo the references; objects nobody else holds may be half written
+                unreferenced = await asyncio.to_thread(self.refs.release, dict(counts))
+                try:
+                    await self.backend.delete_many(unreferenced)
+                except Exception:
+                    pass
+                raise
+        return set(new_objects)
+    
+    async def _retain(self, paths: List[str]) -> Set[str]:
+        counts = Counter(path for path in paths if path)
+        if not counts:
+            return set()
+        async with self._locked(counts):
+            return await asyncio.to_thread(self.refs.retain, dict(counts))
+    
+    async def _release(self, paths: List[str]):
+        """Drop a reference per path occurrence; objects left unreferenced are deleted"""
+        counts = Counter(path for path in paths if path)
+        if not counts:
+            return
+        async with self._locked(counts):
+            unreferenced = await asyncio.to_thread(self.refs.release, dict(counts))
+            for file_path in unreferenced:
+                self.signed_url_cache.invalidate(file_path)
+            if unreferenced:
+                await self.backend.delete_many(unreferenced)
     
     def upload_file(self, file_path: str, folder: str = "uploads") -> dict:
         """
-        Upload file to Supabase storage or local storage
+        Upload a file from disk to the storage backend
         Returns: {'path': str, 'url': str, 'local': bool}
         """
-        # Generate unique filename
-        file_ext = os.path.splitext(file_path)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        storage_path = f"{folder}/{unique_filename}"
-        
-        # Strip EXIF data
-        file_bytes = self.strip_exif(file_path)
-        
-        # If Supabase is not enabled, use local storage
-        if not self.enabled:
-            # Create local storage directory
-            local_storage_dir = os.path.join("storage", folder)
-            os.makedirs(local_storage_dir, exist_ok=True)
-            
-            # Save file locally
-            local_path = os.path.join(local_storage_dir, unique_filename)
-            with open(local_path, 'wb') as f:
-                f.write(file_bytes)
-            
-            print(f"📁 File saved locally: {local_path}")
-            return {
-                'path': storage_path,
-                'url': f"/storage/{folder}/{unique_filename}",
-                'local': True
-            }
-        
-        # Upload to Supabase
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return self.upload_bytes(data, folder=folder, file_ext=os.path.splitext(file_path)[1])
+    
+    def upload_bytes(self, data: bytes, folder: str = "uploads", file_ext: str = ".jpg",
+                     strip_metadata: bool = True) -> dict:
+        """
+        Upload an in-memory encoded image to the storage backend
+        strip_metadata=False skips EXIF removal for images we encoded ourselves (e.g. renders)
+        The caller owns one reference to the returned path; give it back with delete_file().
+        Returns: {'path': str, 'url': str, 'local': bool, 'deduplicated': bool}
+        """
+        return self.upload_many([data], folder, file_ext, strip_metadata)[0]
+    
+    def upload_many(self, items: List[bytes], folder: str = "uploads", file_ext: str = ".jpg",
+                    strip_metadata: bool = True) -> List[dict]:
+        """Upload several images concurrently; results are in input order"""
+        if not items:
+            return []
+        prepared = [self._prepare_upload(data, folder, file_ext, strip_metadata) for data in items]
         try:
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                storage_path,
-                file_bytes,
-                file_options={"content-type": "image/jpeg"}
-            )
-            
-            print(f"☁️  File uploaded to Supabase: {storage_path}")
-            return {
-                'path': storage_path,
-                'url': None,  # Will use signed URLs for access
-                'local': False
-            }
+            written = self._run(self._store(prepared))
         except Exception as e:
             raise Exception(f"Upload failed: {str(e)}")
+        return [self._upload_result(path, path not in written) for path, _, _, _ in prepared]
+    
+    async def upload_bytes_async(self, data: bytes, folder: str = "uploads", file_ext: str = ".jpg",
+                                 strip_metadata: bool = True, sha256: Optional[str] = None) -> dict:
+        """
+        upload_bytes for async routes (metadata stripping runs off the event loop)
+        sha256: digest of data if the caller already has it (e.g. from the upload ingestor)
+        """
+        prepared = await asyncio.to_thread(self._prepare_upload, data, folder, file_ext, strip_metadata, sha256)
+        try:
+            written = await self._arun(self._store([prepared]))
+        except Exception as e:
+            raise Exception(f"Upload failed: {str(e)}")
+        return self._upload_result(prepared[0], prepared[0] not in written)
+    
+    def retain(self, file_paths: List[str]) -> Set[str]:
+        """
+        Take an extra reference on objects that are still stored (e.g. a new row linking an
+        existing render). Returns the paths retained; the others are gone or about to be.
+        """
+        return self._run(self._retain(list(file_paths)))
+    
+    def _split_cached_urls(self, file_paths: Iterable[str], expires_in: int) -> Tuple[Dict[str, str], List[str]]:
+        """(still-fresh cached URLs, paths that need signing)"""
+        now = time.time()
+        min_remaining = expires_in * (1 - settings.SIGNED_URL_REFRESH_FRACTION)
+        urls = {}
+        to_sign = []
+        for file_path in dict.fromkeys(path for path in file_paths if path):
+            cached = self.signed_url_cache.get(file_path)
+            if cached is not None and cached[1] - now >= min_remaining:
+                urls[file_path] = cached[0]
+            else:
+                to_sign.append(file_path)
+        return urls, to_sign
+    
+    def _remember_urls(self, signed: Dict[str, str], expires_in: int, signed_at: float):
+        for file_path, url in signed.items():
+            self.signed_url_cache.put(file_path, (url, signed_at + expires_in), ttl=expires_in)
     
     def get_signed_url(self, file_path: str, expires_in: int = 1800) -> str:
         """
         Get signed URL for private file access
         expires_in: seconds (default 30 minutes)
         """
-        if not self.enabled:
-            # For local storage, return local path
-            return f"/storage/{file_path}"
-        
+        return self.get_signed_urls([file_path], expires_in)[file_path]
+    
+    def get_signed_urls(self, file_paths: Iterable[str], expires_in: int = 1800) -> Dict[str, str]:
+        """
+        Signed URLs for many files: cached ones are reused, the rest signed in a single call
+        Empty paths are skipped. Returns: {file_path: url}
+        """
+        urls, to_sign = self._split_cached_urls(file_paths, expires_in)
+        if to_sign:
+            signed_at = time.time()
+            try:
+                signed = self._run(self.backend.sign_urls(to_sign, expires_in))
+            except Exception as e:
+                raise Exception(f"Failed to generate signed URL: {str(e)}")
+            self._remember_urls(signed, expires_in, signed_at)
+            urls.update(signed)
+        return urls
+    
+    async def get_signed_urls_async(self, file_paths: Iterable[str], expires_in: int = 1800) -> Dict[str, str]:
+        """get_signed_urls for async routes"""
+        urls, to_sign = self._split_cached_urls(file_paths, expires_in)
+        if to_sign:
+            signed_at = time.time()
+            try:
+                signed = await self._arun(self.backend.sign_urls(to_sign, expires_in))
+            except Exception as e:
+                raise Exception(f"Failed to generate signed URL: {str(e)}")
+            self._remember_urls(signed, expires_in, signed_at)
+            urls.update(signed)
+        return urls
+    
+    async def get_signed_url_async(self, file_path: str, expires_in: int = 1800) -> str:
+        return (await self.get_signed_urls_async([file_path], expires_in))[file_path]
+    
+    def read_file(self, file_path: str) -> bytes:
+        """Read a stored object's bytes"""
         try:
-            response = self.supabase.storage.from_(self.bucket_name).create_signed_url(
-                file_path,
-                expires_in
-            )
-            return response['signedURL']
+            return self._run(self.backend.get(file_path))
+        except FileNotFoundError:
+            raise
         except Exception as e:
-            raise Exception(f"Failed to generate signed URL: {str(e)}")
+            raise Exception(f"Download failed: {str(e)}")
     
     def delete_file(self, file_path: str) -> bool:
-        """Delete file from storage"""
-        if not self.enabled:
-            # Delete from local storage
-            try:
-                local_path = os.path.join("storage", file_path)
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                    print(f"🗑️  Deleted local file: {local_path}")
-                return True
-            except Exception as e:
-                print(f"Delete failed: {str(e)}")
-                return False
-        
+        """Release one reference to a file; it is deleted from storage with its last reference"""
+        return self.delete_files_batch([file_path])
+    
+    def delete_files_batch(self, file_paths: list) -> bool:
+        """
+        Release one reference per path (a path listed twice releases two); files left
+        unreferenced are deleted concurrently / in one request, depending on the backend
+        """
+        if not file_paths:
+            return True
         try:
-            self.supabase.storage.from_(self.bucket_name).remove([file_path])
-            print(f"🗑️  Deleted from Supabase: {file_path}")
+            self._run(self._release(list(file_paths)))
             return True
         except Exception as e:
             print(f"Delete failed: {str(e)}")
             return False
     
-    def delete_files_batch(self, file_paths: list) -> bool:
-        """Delete multiple files"""
-        if not self.enabled:
-            # Delete from local storage
-            try:
-                for file_path in file_paths:
-                    local_path = os.path.join("storage", file_path)
-                    if os.path.exists(local_path):
-                        os.remove(local_path)
-                print(f"🗑️  Deleted {len(file_paths)} local files")
-                return True
-            except Exception as e:
-                print(f"Batch delete failed: {str(e)}")
-                return False
-        
+    async def delete_files_async(self, file_paths: list) -> bool:
+        """delete_files_batch for async routes"""
+        if not file_paths:
+            return True
         try:
-            self.supabase.storage.from_(self.bucket_name).remove(file_paths)
-            print(f"🗑️  Deleted {len(file_paths)} files from Supabase")
+            await self._arun(self._release(list(file_paths)))
             return True
         except Exception as e:
-            print(f"Batch delete failed: {str(e)}")
+            print(f"Delete failed: {str(e)}")
             return False
 
 # Global instance
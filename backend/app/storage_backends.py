@@ -0,0 +1,274 @@
+"""
+Storage Backends
+Async object stores behind StorageManager: a local directory, Supabase Storage over a
+pooled keep-alive HTTP client, and an in-memory fake for tests and benchmarks
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+import httpx
+
+from .config import settings
+
+
+class LocalURLSigner:
+    """
+    Offline stand-in for a remote URL signer: URLs carrying an expiry and an HMAC signature
+    Signs a batch per call and counts calls, like the Supabase API.
+    (The /storage static mount serves local files without checking the signature.)
+    """
+
+    def __init__(self, secret: str, base_url: str = "/storage"):
+        self.secret = secret.encode()
+        self.base_url = base_url
+
+    def signature(self, path: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{path}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def sign(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        expires = int(time.time()) + expires_in
+        return {
+            path: f"{self.base_url}/{quote(path)}?expires={expires}&signature={self.signature(path, expires)}"
+            for path in paths
+        }
+
+    def verify(self, path: str, expires: int, signature: str) -> bool:
+        return expires > time.time() and hmac.compare_digest(self.signature(path, expires), signature)
+
+
+class StorageBackend:
+    """
+    Async object store; paths are bucket-relative keys such as 'uploads/<uuid>.jpg'
+    Subclasses implement put/get/delete_many/sign_urls; put_many runs puts concurrently.
+    """
+
+    name = "base"
+    local = False  # True when objects are files served by the /storage mount
+
+    def __init__(self, concurrency: int = 8):
+        """concurrency: objects transferred at once by put_many / delete_many"""
+        self.concurrency = max(1, concurrency)
+        self.sign_calls = 0  # remote signing round trips, for cache accounting
+
+    async def put(self, path: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    async def get(self, path: str) -> bytes:
+        """Object bytes; raises FileNotFoundError if there is no such object"""
+        raise NotImplementedError
+
+    async def delete_many(self, paths: List[str]):
+        """Delete objects (missing ones are ignored)"""
+        raise NotImplementedError
+
+    async def sign_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        """Time-limited URLs for private objects, {path: url}"""
+        raise NotImplementedError
+
+    async def put_many(self, items: List[Tuple[str, bytes, str]]):
+        """Upload (path, data, content_type) items, at most `concurrency` in flight"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def put_one(path: str, data: bytes, content_type: str):
+            async with semaphore:
+                await self.put(path, data, content_type)
+
+        await asyncio.gather(*(put_one(*item) for item in items))
+
+    async def aclose(self):
+        """Release connections"""
+
+
+class LocalBackend(StorageBackend):
+    """Files under a local directory (served at /storage by the app)"""
+
+    name = "local"
+    local = True
+
+    def __init__(self, root: str = "storage", secret: str = "", concurrency: int = 8):
+        super().__init__(concurrency)
+        self.root = root
+        self.signer = LocalURLSigner(secret)
+
+    def _local_path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    async def put(self, path: str, data: bytes, content_type: str):
+        local_path = self._local_path(path)
+        await aiofiles.os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        async with aiofiles.open(local_path, 'wb') as f:
+            await f.write(data)
+        print(f"📁 File saved locally: {local_path}")
+
+    async def get(self, path: str) -> bytes:
+        local_path = self._local_path(path)
+        if not await aiofiles.os.path.exists(local_path):
+            raise FileNotFoundError(f"Stored file missing: {local_path}")
+        async with aiofiles.open(local_path, 'rb') as f:
+            return await f.read()
+
+    async def delete_many(self, paths: List[str]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def delete_one(path: str):
+            async with semaphore:
+                try:
+                    await aiofiles.os.remove(self._local_path(path))
+                except FileNotFoundError:
+                    pass
+
+        await asyncio.gather(*(delete_one(path) for path in paths))
+        print(f"🗑️  Deleted {len(paths)} local files")
+
+    async def sign_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        self.sign_calls += 1
+        return self.signer.sign(paths, expires_in)
+
+
+class SupabaseBackend(StorageBackend):
+    """
+    Supabase Storage REST API (S3-style object keys in a bucket) over one pooled httpx client
+    Connections are kept alive and shared by every request made from the storage event loop.
+    """
+
+    name = "supabase"
+    DELETE_BATCH = 1000  # prefixes per delete request
+
+    def __init__(self, url: str, key: str, bucket: str, max_connections: int = 20,
+                 concurrency: int = 8, timeout: float = 30):
+        super().__init__(concurrency)
+        self.base_url = f"{url.rstrip('/')}/storage/v1"
+        self.bucket = bucket
+        self.headers = {'Authorization': f"Bearer {key}", 'apikey': key}
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Built on first use so it belongs to the event loop that runs the requests
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers,
+                                             limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    @staticmethod
+    def _check(response: httpx.Response, action: str):
+        if response.status_code >= 400:
+            raise Exception(f"{action} failed ({response.status_code}): {response.text[:200]}")
+
+    async def put(self, path: str, data: bytes, content_type: str):
+        # Upsert: a content-addressed object can be written again after a delete that failed
+        response = await self.client.post(f"/object/{self.bucket}/{quote(path)}", content=data,
+                                          headers={'Content-Type': content_type, 'x-upsert': 'true'})
+        self._check(response, "Upload")
+        print(f"☁️  File uploaded to Supabase: {path}")
+
+    async def get(self, path: str) -> bytes:
+        response = await self.client.get(f"/object/{self.bucket}/{quote(path)}")
+        if response.status_code in (400, 404) and "not found" in response.text.lower():
+            raise FileNotFoundError(f"Stored file missing: {path}")
+        self._check(response, "Download")
+        return response.content
+
+    async def delete_many(self, paths: List[str]):
+        batches = [paths[i:i + self.DELETE_BATCH] for i in range(0, len(paths), self.DELETE_BATCH)]
+        responses = await asyncio.gather(*(
+            self.client.request("DELETE", f"/object/{self.bucket}", json={'prefixes': batch})
+            for batch in batches
+        ))
+        for response in responses:
+            self._check(response, "Delete")
+        print(f"🗑️  Deleted {len(paths)} files from Supabase")
+
+    async def sign_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        self.sign_calls += 1
+        response = await self.client.post(f"/object/sign/{self.bucket}",
+                                          json={'expiresIn': expires_in, 'paths': paths})
+        self._check(response, "Signing")
+        urls = {}
+        for item in response.json():
+            signed = item.get('signedURL') or item.get('signedUrl')
+            if item.get('error') or not signed:
+                raise Exception(f"{item.get('path')}: {item.get('error') or 'no URL returned'}")
+            urls[item['path']] = f"{self.base_url}{signed}"
+        return urls
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class MemoryBackend(StorageBackend):
+    """
+    In-process fake object store for tests and benchmarks
+    latency: seconds added to every request, to stand in for a network round trip.
+    """
+
+    name = "memory"
+
+    def __init__(self, latency: float = 0.0, secret: str = "memory", concurrency: int = 8):
+        super().__init__(concurrency)
+        self.latency = latency
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+        self.signer = LocalURLSigner(secret, base_url="memory://")
+        self.requests = 0
+
+    async def _round_trip(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def put(self, path: str, data: bytes, content_type: str):
+        await self._round_trip()
+        self.objects[path] = (bytes(data), content_type)
+
+    async def get(self, path: str) -> bytes:
+        await self._round_trip()
+        if path not in self.objects:
+            raise FileNotFoundError(f"Stored file missing: {path}")
+        return self.objects[path][0]
+
+    async def delete_many(self, paths: List[str]):
+        await self._round_trip()
+        for path in paths:
+            self.objects.pop(path, None)
+
+    async def sign_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        await self._round_trip()
+        self.sign_calls += 1
+        return self.signer.sign(paths, expires_in)
+
+
+def create_backend(kind: Optional[str] = None) -> StorageBackend:
+    """
+    Backend from settings.STORAGE_BACKEND: 'local', 'supabase' or 'memory'
+    Supabase is only used when selected explicitly - rows written under local storage
+    keep local paths, so switching needs the objects copied to the bucket first.
+    """
+    kind = (kind or settings.STORAGE_BACKEND).lower()
+    if kind == "auto":  # earlier name for the default
+        kind = "local"
+
+    if kind == "supabase":
+        print("✅ Supabase storage enabled")
+        return SupabaseBackend(settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.SUPABASE_BUCKET,
+                               max_connections=settings.STORAGE_MAX_CONNECTIONS,
+                               concurrency=settings.STORAGE_CONCURRENCY)
+    if kind == "memory":
+        print("⚠️  Using in-memory storage (nothing is persisted)")
+        return MemoryBackend(secret=settings.SECRET_KEY, concurrency=settings.STORAGE_CONCURRENCY)
+    if kind != "local":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{kind}'")
+    print("⚠️  Supabase not configured - using local storage fallback")
+    return LocalBackend("storage", settings.SECRET_KEY, concurrency=settings.STORAGE_CONCURRENCY)
@@ -19,18 +19,205 @@ except ImportError as e:
     MP_AVAILABLE = False
     print(f"⚠️  MediaPipe import failed: {e}")
 
-from typing import List, Tuple, Optional, Dict
+from typing import Callable, Hashable, List, Tuple, Optional, Dict
+from contextlib import contextmanager
 from PIL import Image
 import io
+import threading
+import time
 
-class TryOnEngine:
+from .cache import LRUCache
+
+# Bump whenever detect_people() output changes so cached detections are not reused
+ENGINE_VERSION = "5"
+
+# Quality tiers, best first. detection_max_side None = engine default;
+# interpolation is used when scaling merch to the person
+QUALITY_TIERS = {
+    "high": {"model_complexity": 2, "detection_max_side": None, "interpolation": "lanczos"},
+    "balanced": {"model_complexity": 1, "detection_max_side": 960, "interpolation": "linear"},
+    "fast": {"model_complexity": 0, "detection_max_side": 640, "interpolation": "linear"},
+}
+DEFAULT_QUALITY_TIER = "high"
+
+# Uploaded photos are rendered at no more than this width
+BASE_IMAGE_MAX_WIDTH = 1920
+
+# JPEG decode-time downscale factors (DCT scaling), largest first
+JPEG_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                      (2, cv2.IMREAD_REDUCED_COLOR_2)) if CV2_AVAILABLE else ()
+
+
+def probe_image(fp) -> Tuple[str, int, int]:
+    """
+    (format, width, height) of an encoded image from its header alone - nothing is decoded
+    width/height are after EXIF orientation, i.e. as the decoded photo will be.
+    Raises if the data is not a readable image.
+    """
+    with Image.open(fp) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):  # rotated by 90 or 270 degrees
+            width, height = height, width
+        return image.format, width, height
+
+
+# MediaPipe PoseLandmark indices used for measurements
+NOSE, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 0, 11, 12, 23, 24
+
+
+class LightingStats:
+    """
+    Lighting around one person: frame mean luma, mean luma over the torso box and
+    per-channel (B, G, R) colour cast of the frame relative to grey
+    """
+    
+    __slots__ = ('mean_luma', 'torso_luma', 'color_gains')
+    
+    def __init__(self, mean_luma: float, torso_luma: float, color_gains: Tuple[float, float, float]):
+        self.mean_luma = mean_luma
+        self.torso_luma = torso_luma
+        self.color_gains = color_gains
+    
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class PersonPose:
+    """
+    One detected person: (33, 4) float32 landmarks (x, y normalised, z, visibility),
+    measurements in full-resolution pixels derived once, an optional cropped uint8 mask and
+    the lighting around the person (measured once per frame)
+    Slotted and array-backed so it pickles small across worker processes and caches cheaply.
+    """
+    
+    __slots__ = ('landmarks', 'shoulder_width', 'torso_height', 'shoulder_center',
+                 'rotation_angle', 'nose_position', 'segmentation_mask', 'mask_bbox', 'lighting')
+    
+    def __init__(self, landmarks: np.ndarray, image_size: Tuple[int, int],
+                 segmentation_mask: Optional[np.ndarray] = None,
+                 mask_bbox: Optional[Tuple[int, int, int, int]] = None):
+        """
+        image_size: (width, height) of the frame the measurements are for
+        mask_bbox: (x, y, w, h) of segmentation_mask within that frame
+        """
+        self.landmarks = np.ascontiguousarray(landmarks, dtype=np.float32)
+        self.segmentation_mask = segmentation_mask
+        self.mask_bbox = mask_bbox
+        self.lighting: Optional[LightingStats] = None  # set by TryOnEngine.measure_lighting
+        
+        w, h = image_size
+        left_shoulder, right_shoulder = self.landmarks[LEFT_SHOULDER], self.landmarks[RIGHT_SHOULDER]
+        left_hip, right_hip = self.landmarks[LEFT_HIP], self.landmarks[RIGHT_HIP]
+        nose = self.landmarks[NOSE]
+        
+        # Measurements in pixels
+        self.shoulder_width = int(abs(left_shoulder[0] - right_shoulder[0]) * w)
+        self.torso_height = int(abs((left_shoulder[1] + right_shoulder[1]) / 2 -
+                                    (left_hip[1] + right_hip[1]) / 2) * h)
+        
+        # Center and rotation
+        self.shoulder_center = (int((left_shoulder[0] + right_shoulder[0]) / 2 * w),
+                                int((left_shoulder[1] + right_shoulder[1]) / 2 * h))
+        self.rotation_angle = float(np.degrees(np.arctan2(
+            (right_shoulder[1] - left_shoulder[1]) * h,
+            (right_shoulder[0] - left_shoulder[0]) * w
+        )))
+        self.nose_position = (int(nose[0] * w), int(nose[1] * h))
+    
+    @property
+    def nbytes(self) -> int:
+        """Array payload size (used by the pose cache's byte budget)"""
+        mask_bytes = self.segmentation_mask.nbytes if self.segmentation_mask is not None else 0
+        return self.landmarks.nbytes + mask_bytes + 256
+    
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class StageTimer:
+    """Wall time per pipeline stage in ms (stages entered more than once accumulate)"""
+    
     def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+    
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+    
+    def total_ms(self) -> float:
+        """Time since the timer was created"""
+        return (time.perf_counter() - self._start) * 1000
+    
+    def as_dict(self) -> Dict[str, float]:
+        timings = {name: round(ms, 2) for name, ms in self.stages.items()}
+        timings['total'] = round(self.total_ms(), 2)
+        return timings
+
+class TryOnEngine:
+    def __init__(self, merch_cache_mb: int = 256, merch_template_max_side: int = 1200,
+                 size_quantum: int = 8, alpha_mask_cache_mb: int = 32,
+                 detection_max_side: int = 0, face_detect_max_side: int = 640,
+                 drape_curve: float = 0.05, deform_map_cache_mb: int = 64,
+                 merch_pyramid_cache_mb: int = 128, scaled_merch_cache_mb: int = 128,
+                 lighting_max_side: int = 256, shadow_strength: float = 0.3):
         """Initialize try-on engine - deferred initialization for dependencies"""
         self.enabled = False
         self.mp_pose = None
         self.mp_selfie_segmentation = None
-        self.pose = None
+        self.pose = None  # default tier's pose graph, once built
+        self.poses: Dict[int, object] = {}  # pose graphs by model_complexity, built by warm_up / on first use
+        self.pose_errors: Dict[int, str] = {}  # complexities whose model could not be built (not retried)
         self.segmentation = None
+        # MediaPipe graphs are not thread-safe; render threads share one engine
+        self._inference_lock = threading.Lock()
+        
+        # Decoded, background-removed BGRA merch templates keyed by (merch_id, version)
+        self.merch_cache = LRUCache(max_bytes=merch_cache_mb * 1024 * 1024)
+        self.merch_template_max_side = merch_template_max_side
+        
+        # Scaled merch sizes are rounded to this many pixels; feather masks are cached per size
+        self.size_quantum = size_quantum
+        self.alpha_mask_cache = LRUCache(max_bytes=alpha_mask_cache_mb * 1024 * 1024)
+        
+        # Per-template mipmap levels (pyrDown halvings) and scaled results keyed by
+        # (template key, quantized size, interpolation)
+        self.merch_pyramid_cache = LRUCache(max_bytes=merch_pyramid_cache_mb * 1024 * 1024)
+        self.scaled_merch_cache = LRUCache(max_bytes=scaled_merch_cache_mb * 1024 * 1024)
+        
+        # Shoulder drape: sag at the outer shoulders as a fraction of merch width (0 = off);
+        # fixed-point remap tables are cached per size
+        self.drape_curve = drape_curve
+        self.deform_map_cache = LRUCache(max_bytes=deform_map_cache_mb * 1024 * 1024)
+        
+        # Pose detection runs on a copy downscaled to this longest side (0 = full resolution)
+        self.detection_max_side = detection_max_side
+        
+        # Lighting is measured once per frame on a copy this small; the collar shadow
+        # (darkest at the top edge, fading out) is applied from per-height LUTs
+        self.lighting_max_side = lighting_max_side
+        self.shadow_strength = shadow_strength
+        self.shadow_lut_cache = LRUCache(max_bytes=4 * 1024 * 1024)
+        
+        # Haar face detector for the fallback overlay - loaded once, run on a downscaled copy
+        self.face_detect_max_side = face_detect_max_side
+        self._face_detector = None
+        self._face_detector_lock = threading.Lock()
         
         # Don't initialize mediapipe here - do it lazily when needed
         if CV2_AVAILABLE and MP_AVAILABLE:
@@ -53,80 +240,184 @@ class TryOnEngine:
             return
             # raise RuntimeError("TryOnEngine is not enabled - missing dependencies")
         
-        if self.pose is None:
-            # Initialize MediaPipe
+        if self.mp_pose is None:
+            # Initialize MediaPipe (pose graphs are built per complexity by _get_pose; the pose
+            # segmentation output is reused, so the standalone segmenter is only loaded if
+            # get_segmentation_mask needs it)
             self.mp_pose = mp.solutions.pose
             self.mp_selfie_segmentation = mp.solutions.selfie_segmentation
-            
-            # Initialize pose detector
-            self.pose = self.mp_pose.Pose(
-                static_image_mode=True,
-                model_complexity=2,
-                enable_segmentation=True,
-                min_detection_confidence=0.5
-            )
-            
-            # Initialize segmentation
-            self.segmentation = self.mp_selfie_segmentation.SelfieSegmentation(
-                model_selection=1  # General model
-            )
     
-    def detect_people(self, image: np.ndarray) -> List[Dict]:
+    def _get_pose(self, model_complexity: int):
+        """
+        Pose graph for a model complexity (call with the inference lock held)
+        Raises RuntimeError if the model cannot be built (e.g. it has to be downloaded and we are
+        offline); the failure is remembered so later renders go straight to the fallback overlay.
+        """
+        pose = self.poses.get(model_complexity)
+        if pose is None:
+            if model_complexity in self.pose_errors:
+                raise RuntimeError(f"Pose model {model_complexity} unavailable: {self.pose_errors[model_complexity]}")
+            try:
+                pose = self.mp_pose.Pose(
+                    static_image_mode=True,
+                    model_complexity=model_complexity,
+                    enable_segmentation=True,
+                    min_detection_confidence=0.5
+                )
+            except Exception as e:
+                self.pose_errors[model_complexity] = str(e)
+                raise RuntimeError(f"Pose model {model_complexity} unavailable: {e}")
+            self.poses[model_complexity] = pose
+            if model_complexity == QUALITY_TIERS[DEFAULT_QUALITY_TIER]["model_complexity"]:
+                self.pose = pose
+        return pose
+    
+    def cache_stats(self) -> Dict:
+        """Counters for every engine-level cache"""
+        return {
+            'merch_cache': self.merch_cache.stats(),
+            'alpha_mask_cache': self.alpha_mask_cache.stats(),
+            'merch_pyramid_cache': self.merch_pyramid_cache.stats(),
+            'scaled_merch_cache': self.scaled_merch_cache.stats(),
+            'deform_map_cache': self.deform_map_cache.stats(),
+            'shadow_lut_cache': self.shadow_lut_cache.stats()
+        }
+    
+    def warm_up(self):
+        """
+        Build every quality tier's pose model and run one inference ahead of the first real request,
+        so a tier change under load never builds (or downloads) a graph while holding the inference lock
+        Failures are logged, not raised: renders needing a missing model use the fallback overlay.
+        """
+        if self.enabled:
+            blank = np.zeros((256, 256, 3), dtype=np.uint8)
+            for model_complexity in sorted({tier["model_complexity"] for tier in QUALITY_TIERS.values()}):
+                try:
+                    self.detect_people(blank, model_complexity=model_complexity)
+                except Exception as e:
+                    print(f"⚠️  Pose model {model_complexity} warm-up failed: {e}")
+        if CV2_AVAILABLE:
+            try:
+                self.detect_faces(np.zeros((64, 64, 3), dtype=np.uint8))
+            except Exception as e:
+                print(f"⚠️  Face detector warm-up failed: {e}")
+    
+    def detect_people(self, image: np.ndarray, max_side: Optional[int] = None,
+                      model_complexity: Optional[int] = None) -> List[PersonPose]:
         """
         Detect people in the image and extract body measurements
-        Returns list of person data with landmarks and measurements
+        max_side: run inference on a copy downscaled to this longest side (None = engine default, 0 = full size);
+        measurements are always in full-resolution pixels
+        model_complexity: MediaPipe pose model 0/1/2 (None = default tier's)
+        Returns list of PersonPose (landmarks and measurements)
         """
-        self._ensure_initialized()
-        
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(rgb_image)
+        if max_side is None:
+            max_side = self.detection_max_side
+        h, w = image.shape[:2]
+        detect_image = image
+        if max_side and max(h, w) > max_side:
+            scale = max_side / max(h, w)
+            detect_image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                      interpolation=cv2.INTER_AREA)
+        
+        rgb_image = cv2.cvtColor(detect_image, cv2.COLOR_BGR2RGB)
+        with self._inference_lock:
+            self._ensure_initialized()
+            if model_complexity is None:
+                model_complexity = QUALITY_TIERS[DEFAULT_QUALITY_TIER]["model_complexity"]
+            pose = self._get_pose(model_complexity)
+            results = pose.process(rgb_image)
         
         people = []
         
         if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
-            h, w = image.shape[:2]
-            
-            # Extract key points
-            left_shoulder = landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
-            right_shoulder = landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
-            left_hip = landmarks[self.mp_pose.PoseLandmark.LEFT_HIP]
-            right_hip = landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP]
-            nose = landmarks[self.mp_pose.PoseLandmark.NOSE]
-            
-            # Calculate measurements in pixels
-            shoulder_width = int(abs(left_shoulder.x - right_shoulder.x) * w)
-            torso_height = int(abs((left_shoulder.y + right_shoulder.y) / 2 - 
-                                   (left_hip.y + right_hip.y) / 2) * h)
-            
-            # Calculate center and rotation
-            shoulder_center_x = int((left_shoulder.x + right_shoulder.x) / 2 * w)
-            shoulder_center_y = int((left_shoulder.y + right_shoulder.y) / 2 * h)
-            
-            # Calculate shoulder angle
-            angle = np.arctan2(
-                (right_shoulder.y - left_shoulder.y) * h,
-                (right_shoulder.x - left_shoulder.x) * w
-            )
-            
-            person_data = {
-                'landmarks': landmarks,
-                'shoulder_width': shoulder_width,
-                'torso_height': torso_height,
-                'shoulder_center': (shoulder_center_x, shoulder_center_y),
-                'rotation_angle': np.degrees(angle),
-                'nose_position': (int(nose.x * w), int(nose.y * h)),
-                'segmentation_mask': results.segmentation_mask if hasattr(results, 'segmentation_mask') else None
-            }
+            # Landmarks are normalised to the detection image, so measuring with the
+            # full-resolution size maps them straight back
+            landmarks = np.array([[lm.x, lm.y, lm.z, lm.visibility]
+                                  for lm in results.pose_landmarks.landmark], dtype=np.float32)
+            segmentation_mask, mask_bbox = self._compact_mask(getattr(results, 'segmentation_mask', None), w, h)
             
-            people.append(person_data)
+            people.append(PersonPose(landmarks, (w, h), segmentation_mask, mask_bbox))
         
+        self.measure_lighting(detect_image, people)
         return people
     
-    def get_segmentation_mask(self, image: np.ndarray) -> np.ndarray:
-        """Get foreground segmentation mask"""
+    def detect_faces(self, image: np.ndarray) -> np.ndarray:
+        """
+        Haar face boxes (x, y, w, h) in full-resolution pixels, largest first
+        Runs on a downscaled grey copy, ignoring faces under a tenth of the short side.
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        scale = 1.0
+        if max(h, w) > self.face_detect_max_side:
+            scale = self.face_detect_max_side / max(h, w)
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        
+        with self._face_detector_lock:
+            if self._face_detector is None:
+                detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+                if detector.empty():
+                    raise RuntimeError("Haar face cascade could not be loaded")
+                self._face_detector = detector
+            min_face = max(24, min(gray.shape) // 10)
+            faces = self._face_detector.detectMultiScale(gray, 1.1, 4, minSize=(min_face, min_face))
+        
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        faces = np.asarray(faces)
+        faces = faces[np.argsort(-(faces[:, 2] * faces[:, 3]), kind="stable")]
+        return np.round(faces / scale).astype(np.int32)
+    
+    @staticmethod
+    def _compact_mask(mask: Optional[np.ndarray], w: int, h: int,
+                      threshold: int = 8) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int, int, int]]]:
+        """
+        Pose segmentation output (float32 0-1, detection resolution) -> uint8 crop around the person
+        in full-resolution pixels, plus its (x, y, w, h) box; (None, None) if the mask is empty
+        """
+        if mask is None:
+            return None, None
+        mask_u8 = cv2.convertScaleAbs(mask, alpha=255)
+        x, y, bw, bh = cv2.boundingRect((mask_u8 >= threshold).astype(np.uint8))
+        if bw == 0 or bh == 0:
+            return None, None
+        
+        crop = mask_u8[y:y + bh, x:x + bw]
+        mask_h, mask_w = mask_u8.shape
+        if (mask_w, mask_h) != (w, h):
+            scale_x, scale_y = w / mask_w, h / mask_h
+            x1, y1 = int(x * scale_x), int(y * scale_y)
+            x2 = min(w, int(np.ceil((x + bw) * scale_x)))
+            y2 = min(h, int(np.ceil((y + bh) * scale_y)))
+            crop = cv2.resize(crop, (x2 - x1, y2 - y1), interpolation=cv2.INTER_LINEAR)
+            x, y, bw, bh = x1, y1, x2 - x1, y2 - y1
+        return np.ascontiguousarray(crop), (x, y, bw, bh)
+    
+    def get_segmentation_mask(self, image: np.ndarray, people: Optional[List[PersonPose]] = None) -> np.ndarray:
+        """
+        Get foreground segmentation mask (float32 0-1, full frame)
+        people: detect_people() output for this frame - its masks are reused instead of running
+        the standalone segmenter, which is only loaded on first use
+        """
+        with_masks = [person for person in people or [] if person.segmentation_mask is not None]
+        if with_masks:
+            mask = np.zeros(image.shape[:2], dtype=np.uint8)
+            for person in with_masks:
+                x, y, bw, bh = person.mask_bbox
+                region = mask[y:y + bh, x:x + bw]
+                np.maximum(region, person.segmentation_mask, out=region)
+            return mask.astype(np.float32) / 255.0
+        
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.segmentation.process(rgb_image)
+        with self._inference_lock:
+            self._ensure_initialized()
+            if self.segmentation is None:
+                self.segmentation = self.mp_selfie_segmentation.SelfieSegmentation(
+                    model_selection=1  # General model
+                )
+            results = self.segmentation.process(rgb_image)
         
         if results.segmentation_mask is not None:
             return results.segmentation_mask
@@ -158,290 +449,513 @@ class TryOnEngine:
         
         return image
 
-    def scale_merch(self, merch_image: np.ndarray, target_width: int, target_height: int) -> np.ndarray:
-        """Scale merchandise to fit person's body proportions"""
+    def prepare_merch_template(self, merch_image: np.ndarray) -> np.ndarray:
+        """Turn a decoded merch image into a read-only, background-free BGRA template"""
+        h, w = merch_image.shape[:2]
+        longest = max(h, w)
+        if longest > self.merch_template_max_side:
+            scale = self.merch_template_max_side / longest
+            merch_image = cv2.resize(merch_image, (int(w * scale), int(h * scale)),
+                                     interpolation=cv2.INTER_AREA)
+        
+        # Keep real transparency from PNGs; otherwise knock out the white background
+        has_alpha = merch_image.ndim == 3 and merch_image.shape[2] == 4
+        if has_alpha and merch_image[:, :, 3].min() < 255:
+            template = np.ascontiguousarray(merch_image)
+        else:
+            template = self._remove_background(merch_image)
+        
+        template.setflags(write=False)
+        return template
+
+    def get_merch_template(self, merch_id: str, version: str,
+                           loader: Callable[[], bytes]) -> np.ndarray:
+        """
+        Return the preprocessed template for a merch design, decoding it only on a cache miss
+        version must change whenever the underlying image bytes change (e.g. storage path).
+        loader() is only called on a miss and must return the encoded image bytes.
+        The cache key (merch_id, version) is what render()/scale_merch() take as merch_key.
+        """
+        key = (merch_id, version)
+        template = self.merch_cache.get(key)
+        if template is None:
+            merch_image = self.decode_image(loader(), cv2.IMREAD_UNCHANGED)
+            template = self.prepare_merch_template(merch_image)
+            self.merch_cache.put(key, template)
+        return template
+
+    def _quantize(self, size: float) -> int:
+        """Round a merch dimension to the size bucket so per-size caches (masks etc.) get reused"""
+        q = self.size_quantum
+        return max(q, int(round(size / q)) * q)
+    
+    def merch_pyramid(self, merch_key: Hashable, template: np.ndarray) -> List[np.ndarray]:
+        """Mipmap levels of a template, full size first, each half the previous (built once per key)"""
+        levels = self.merch_pyramid_cache.get(merch_key)
+        if levels is None:
+            levels = []
+            level = template
+            while min(level.shape[:2]) >= 64:
+                level = cv2.pyrDown(level)
+                level.setflags(write=False)
+                levels.append(level)
+            self.merch_pyramid_cache.put(merch_key, levels)
+        return [template] + levels
+    
+    def scale_merch(self, merch_image: np.ndarray, target_width: int, target_height: int,
+                    interpolation: Optional[int] = None,
+                    merch_key: Optional[Hashable] = None) -> np.ndarray:
+        """
+        Scale merchandise to fit person's body proportions (LANCZOS unless interpolation is given)
+        merch_key: template cache key - resizes then start from the nearest larger pyramid level
+        and the (read-only) result is cached per quantized size
+        """
         # Add some padding for realistic fit
         scale_factor = 1.1  # 10% larger for natural drape
-        target_width = int(target_width * scale_factor)
-        target_height = int(target_height * scale_factor)
-        
-        return cv2.resize(merch_image, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4)
+        target_width = self._quantize(target_width * scale_factor)
+        target_height = self._quantize(target_height * scale_factor)
+        
+        if interpolation is None:
+            interpolation = cv2.INTER_LANCZOS4
+        if merch_key is None:
+            return cv2.resize(merch_image, (target_width, target_height), interpolation=interpolation)
+        
+        key = (merch_key, target_width, target_height, interpolation)
+        scaled = self.scaled_merch_cache.get(key)
+        if scaled is None:
+            source = merch_image
+            for level in self.merch_pyramid(merch_key, merch_image):
+                if level.shape[1] < target_width or level.shape[0] < target_height:
+                    break
+                source = level
+            scaled = cv2.resize(source, (target_width, target_height), interpolation=interpolation)
+            scaled.setflags(write=False)
+            self.scaled_merch_cache.put(key, scaled)
+        return scaled
     
-    def apply_fabric_deformation(self, merch: np.ndarray, person_data: Dict) -> np.ndarray:
-        """Apply realistic fabric deformation based on body shape"""
-        h, w = merch.shape[:2]
-        
-        # Create subtle curvature at shoulders
-        # This simulates fabric draping over shoulders
-        mesh_points_src = np.float32([
-            [0, 0], [w//2, 0], [w, 0],
-            [0, h//3], [w//2, h//3], [w, h//3],
-            [0, h], [w//2, h], [w, h]
-        ])
-        
-        # Add slight curve
-        curve_amount = w * 0.05  # 5% curve
-        mesh_points_dst = np.float32([
-            [0, 0], [w//2, -curve_amount], [w, 0],
-            [0, h//3], [w//2, h//3], [w, h//3],
-            [0, h], [w//2, h], [w, h]
-        ])
-        
-        # Apply perspective transform for shoulder drape
-        # For simplicity, we'll use affine transform on top portion
-        return merch  # Simplified - can enhance with mesh warping
-    
-    def add_shadows_and_lighting(self, merch: np.ndarray, base_image: np.ndarray, 
-                                  person_data: Dict) -> np.ndarray:
-        """Add realistic shadows and match lighting to base image"""
-        # Analyze base image lighting
-        gray_base = cv2.cvtColor(base_image, cv2.COLOR_BGR2GRAY)
-        avg_brightness = np.mean(gray_base)
-        
-        # Adjust merch brightness to match
-        merch_gray = cv2.cvtColor(merch, cv2.COLOR_BGR2GRAY)
-        merch_brightness = np.mean(merch_gray)
-        
-        if merch_brightness > 0:
-            brightness_factor = avg_brightness / merch_brightness
-            merch = cv2.convertScaleAbs(merch, alpha=brightness_factor, beta=0)
-        
-        # Add shadow under chin
+    def drape_maps(self, h: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fixed-point (CV_16SC2) remap tables for the shoulder drape of an (h, w) merch, memoized by size
+        The outer shoulders sag by drape_curve * w, the collar not at all, and the
+        displacement fades out over the top third so the body and hem are untouched.
+        """
+        key = (h, w, self.drape_curve)
+        maps = self.deform_map_cache.get(key)
+        if maps is None:
+            xs = np.arange(w, dtype=np.float32)
+            ys = np.arange(h, dtype=np.float32)
+            sag = self.drape_curve * w * ((2 * xs - w) / w) ** 2
+            falloff = np.clip(1 - ys / max(1.0, h / 3), 0, 1)
+            map_x = np.ascontiguousarray(np.broadcast_to(xs, (h, w)))
+            map_y = (ys[:, None] - falloff[:, None] * sag[None, :]).astype(np.float32)
+            maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+            for table in maps:
+                table.setflags(write=False)
+            self.deform_map_cache.put(key, maps)
+        return maps
+    
+    def apply_fabric_deformation(self, merch: np.ndarray, person: PersonPose) -> np.ndarray:
+        """Apply fabric drape over the shoulders (cv2.remap with cached tables, see drape_maps)"""
+        if self.drape_curve <= 0:
+            return merch
         h, w = merch.shape[:2]
-        shadow_overlay = np.zeros_like(merch, dtype=np.uint8)
-        
-        # Create gradient shadow at top (under chin area)
-        for i in range(min(h//4, 50)):
-            alpha = (50 - i) / 50 * 0.3  # Fade from 30% to 0%
-            shadow_overlay[i, :] = [0, 0, 0]
+        map_xy, map_frac = self.drape_maps(h, w)
+        return cv2.remap(merch, map_xy, map_frac, cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    
+    def measure_lighting(self, image: np.ndarray, people: List[PersonPose]):
+        """
+        Set each person's LightingStats from one pass over a subsampled copy of the frame
+        The stats travel with the detections, so every design rendered onto the photo reuses them.
+        """
+        # Means only need a sample of the pixels, so subsample instead of resizing
+        step = max(1, max(image.shape[:2]) // self.lighting_max_side)
+        image = np.ascontiguousarray(image[::step, ::step])
+        h, w = image.shape[:2]
+        luma = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        mean_luma = float(luma.mean())
+        channel_means = np.array(cv2.mean(image)[:3])
+        color_gains = tuple(float(g) for g in np.clip(channel_means / max(channel_means.mean(), 1.0), 0.85, 1.15))
+        
+        for person in people:
+            # Box spanned by the shoulders and hips
+            torso = person.landmarks[[LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP], :2]
+            x1, y1 = np.clip(np.floor(torso.min(axis=0) * (w, h)).astype(int), 0, (w, h))
+            x2, y2 = np.clip(np.ceil(torso.max(axis=0) * (w, h)).astype(int), 0, (w, h))
+            region = luma[y1:y2, x1:x2]
+            torso_luma = float(region.mean()) if region.size else mean_luma
+            person.lighting = LightingStats(mean_luma, torso_luma, color_gains)
+    
+    def shadow_lut(self, rows: int) -> np.ndarray:
+        """
+        Read-only (rows, 256) uint8 table: row i of the merch maps value v to table[i, v],
+        darkening by shadow_strength at the top edge and fading linearly to none
+        """
+        key = (rows, self.shadow_strength)
+        lut = self.shadow_lut_cache.get(key)
+        if lut is None:
+            shade = 1.0 - self.shadow_strength * (rows - np.arange(rows, dtype=np.float32)) / rows
+            lut = np.clip(shade[:, None] * np.arange(256, dtype=np.float32) + 0.5, 0, 255).astype(np.uint8)
+            lut.flags.writeable = False
+            self.shadow_lut_cache.put(key, lut)
+        return lut
+    
+    def add_shadows_and_lighting(self, merch: np.ndarray, base_image: np.ndarray,
+                                  person: PersonPose, alpha: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Match the merch to the light on the person and add a shadow under the chin
+        Brightness follows the mean of frame and torso luma, tinted by half the frame's colour cast.
+        base_image is only measured if the person has no lighting stats yet.
+        alpha: merch alpha, so transparent pixels don't count towards the merch brightness
+        """
+        if getattr(person, 'lighting', None) is None:
+            self.measure_lighting(base_image, [person])
+        lighting = person.lighting
+        
+        # Brightness and colour in one per-channel LUT pass
+        b, g, r = cv2.mean(merch, mask=alpha)[:3]
+        merch_luma = 0.114 * b + 0.587 * g + 0.299 * r
+        if merch_luma > 0:
+            target_luma = (lighting.mean_luma + lighting.torso_luma) / 2
+            gains = (target_luma / merch_luma) * np.sqrt(lighting.color_gains)
+            lut = np.clip(np.arange(256, dtype=np.float32)[:, None] * gains.astype(np.float32) + 0.5, 0, 255)
+            merch = cv2.LUT(merch, lut.astype(np.uint8).reshape(256, 1, 3))
+        else:
+            merch = merch.copy()
         
-        # Blend shadow
-        shadow_mask = cv2.GaussianBlur(shadow_overlay, (21, 21), 0)
-        merch = cv2.addWeighted(merch, 1.0, shadow_mask, 0.3, 0)
+        # Gradient shadow under the chin (top rows of the merch)
+        rows = min(merch.shape[0] // 4, 50)
+        if rows > 0 and self.shadow_strength > 0:
+            shadow = self.shadow_lut(rows)
+            merch[:rows] = shadow[np.arange(rows)[:, None, None], merch[:rows]]
         
         return merch
     
+    @staticmethod
+    def _feather_profile(n: int, feather: int) -> np.ndarray:
+        """1-D edge ramp: 0 at both ends rising linearly to 1 over `feather` pixels"""
+        idx = np.arange(n, dtype=np.float32)
+        return np.minimum(idx / feather, 1.0) * np.minimum(idx[::-1] / feather, 1.0)
+    
+    def feather_mask(self, h: int, w: int, feather: int = 15) -> np.ndarray:
+        """
+        Read-only feathered alpha mask for an (h, w) merch, memoized by size
+        Both the edge ramps and the Gaussian blur are separable, so the mask is the
+        outer product of two blurred 1-D profiles instead of a full 2-D pass.
+        """
+        key = (h, w, feather)
+        alpha = self.alpha_mask_cache.get(key)
+        if alpha is None:
+            # Apply Gaussian blur for smoother transition (15px kernel, per axis)
+            rows = cv2.GaussianBlur(self._feather_profile(h, feather).reshape(-1, 1), (1, 15), 0)
+            cols = cv2.GaussianBlur(self._feather_profile(w, feather).reshape(1, -1), (15, 1), 0)
+            alpha = np.outer(rows.ravel(), cols.ravel()).astype(np.float32)
+            alpha.setflags(write=False)
+            self.alpha_mask_cache.put(key, alpha)
+        return alpha
+    
     def blend_edges(self, merch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """Create feathered edges for natural blending"""
         h, w = merch.shape[:2]
-        
-        # Create alpha mask with feathered edges
-        alpha = np.ones((h, w), dtype=np.float32)
-        
-        # Feather amount (pixels)
-        feather = 15
-        
-        # Top edge
-        for i in range(feather):
-            alpha[i, :] *= i / feather
-        
-        # Bottom edge
-        for i in range(feather):
-            alpha[h-1-i, :] *= i / feather
-        
-        # Left edge
-        for i in range(feather):
-            alpha[:, i] *= i / feather
-        
-        # Right edge
-        for i in range(feather):
-            alpha[:, w-1-i] *= i / feather
-        
-        # Apply Gaussian blur for smoother transition
-        alpha = cv2.GaussianBlur(alpha, (15, 15), 0)
-        
-        return merch, alpha
+        return merch, self.feather_mask(h, w, feather=15)
     
     def composite_merch(self, base_image: np.ndarray, merch: np.ndarray, 
-                        person_data: Dict, alpha_mask: np.ndarray) -> np.ndarray:
-        """Composite merchandise onto base image with proper layering"""
-        result = base_image.copy()
+                        person: PersonPose, alpha_mask: np.ndarray) -> np.ndarray:
+        """
+        Composite merchandise onto base image in place, touching only the destination ROI
+        merch is BGR; alpha_mask is uint8 (0-255) or float (0-1) with the same size.
+        Colour is premultiplied, warped together with alpha as one 4-channel image,
+        then blended with 8-bit fixed-point math: dst = src_pm + dst * (255 - a) / 255
+        """
+        if alpha_mask.dtype != np.uint8:
+            alpha_mask = np.clip(alpha_mask * 255.0 + 0.5, 0, 255).astype(np.uint8)
         
         # Get position
-        center_x, center_y = person_data['shoulder_center']
-        angle = person_data['rotation_angle']
+        center_x, center_y = person.shoulder_center
+        angle = person.rotation_angle
         
         h, w = merch.shape[:2]
         
-        # Rotate merch to match shoulder angle
-        rotation_matrix = cv2.getRotationMatrix2D((w//2, h//2), angle, 1.0)
-        merch_rotated = cv2.warpAffine(merch, rotation_matrix, (w, h), 
-                                       flags=cv2.INTER_LINEAR,
-                                       borderMode=cv2.BORDER_CONSTANT,
-                                       borderValue=(0, 0, 0))
-        
-        # Rotate alpha mask
-        alpha_rotated = cv2.warpAffine(alpha_mask, rotation_matrix, (w, h),
-                                       flags=cv2.INTER_LINEAR,
-                                       borderMode=cv2.BORDER_CONSTANT,
-                                       borderValue=0)
-        
         # Calculate placement position (top-left corner)
         x1 = center_x - w // 2
         y1 = center_y - h // 4  # Offset upward to align with shoulders
-        x2 = x1 + w
-        y2 = y1 + h
         
-        # Ensure within bounds
+        # Visible part of the merch box
         img_h, img_w = base_image.shape[:2]
-        
-        # Calculate overlap region
-        src_x1 = max(0, -x1)
-        src_y1 = max(0, -y1)
-        src_x2 = w - max(0, x2 - img_w)
-        src_y2 = h - max(0, y2 - img_h)
-        
         dst_x1 = max(0, x1)
         dst_y1 = max(0, y1)
-        dst_x2 = min(img_w, x2)
-        dst_y2 = min(img_h, y2)
-        
-        if src_x2 > src_x1 and src_y2 > src_y1:
-            # Extract regions
-            merch_region = merch_rotated[src_y1:src_y2, src_x1:src_x2]
-            alpha_region = alpha_rotated[src_y1:src_y2, src_x1:src_x2]
-            base_region = result[dst_y1:dst_y2, dst_x1:dst_x2]
+        dst_x2 = min(img_w, x1 + w)
+        dst_y2 = min(img_h, y1 + h)
+        if dst_x2 <= dst_x1 or dst_y2 <= dst_y1:
+            return base_image
+        
+        # Premultiply colour by alpha and pack BGR + A into one image
+        alpha_3ch = cv2.cvtColor(alpha_mask, cv2.COLOR_GRAY2BGR)
+        premultiplied = cv2.multiply(merch, alpha_3ch, scale=1 / 255)
+        bgra = cv2.merge([*cv2.split(premultiplied), alpha_mask])
+        
+        # Rotate to match shoulder angle, warping straight into the visible ROI
+        rotation_matrix = cv2.getRotationMatrix2D((w//2, h//2), angle, 1.0)
+        rotation_matrix[0, 2] -= dst_x1 - x1
+        rotation_matrix[1, 2] -= dst_y1 - y1
+        warped = cv2.warpAffine(bgra, rotation_matrix, (dst_x2 - dst_x1, dst_y2 - dst_y1),
+                                flags=cv2.INTER_LINEAR,
+                                borderMode=cv2.BORDER_CONSTANT,
+                                borderValue=(0, 0, 0, 0))
+        
+        # Blend
+        roi = base_image[dst_y1:dst_y2, dst_x1:dst_x2]
+        inv_alpha_3ch = cv2.cvtColor(255 - cv2.extractChannel(warped, 3), cv2.COLOR_GRAY2BGR)
+        background = cv2.multiply(roi, inv_alpha_3ch, scale=1 / 255)
+        foreground = cv2.cvtColor(warped, cv2.COLOR_BGRA2BGR)
+        base_image[dst_y1:dst_y2, dst_x1:dst_x2] = cv2.add(foreground, background)
+        
+        return base_image
+    
+    @staticmethod
+    def overlay(base_image: np.ndarray, merch: np.ndarray, x: int, y: int) -> np.ndarray:
+        """Alpha-blend a BGRA (or paste a BGR) image at (x, y) in place, clipped to the frame"""
+        img_h, img_w = base_image.shape[:2]
+        h, w = merch.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(img_w, x + w), min(img_h, y + h)
+        if x2 <= x1 or y2 <= y1:
+            return base_image
+        
+        merch = merch[y1 - y:y2 - y, x1 - x:x2 - x]
+        if merch.shape[2] < 4:
+            base_image[y1:y2, x1:x2] = merch[:, :, :3]
+            return base_image
+        
+        alpha_3ch = cv2.cvtColor(cv2.extractChannel(merch, 3), cv2.COLOR_GRAY2BGR)
+        foreground = cv2.multiply(cv2.cvtColor(merch, cv2.COLOR_BGRA2BGR), alpha_3ch, scale=1 / 255)
+        background = cv2.multiply(base_image[y1:y2, x1:x2], 255 - alpha_3ch, scale=1 / 255)
+        base_image[y1:y2, x1:x2] = cv2.add(foreground, background)
+        return base_image
+    
+    def fallback_overlay(self, base_image: np.ndarray, merch_template: np.ndarray) -> np.ndarray:
+        """
+        Simple overlay used when pose detection is unavailable or finds nobody:
+        the shirt goes below the first Haar-detected face, or centred. Draws onto base_image in place.
+        """
+        try:
+            h, w = base_image.shape[:2]
+            mh, mw = merch_template.shape[:2]
             
-            # Expand alpha to 3 channels
-            alpha_3ch = cv2.merge([alpha_region, alpha_region, alpha_region])
+            faces = self.detect_faces(base_image)
             
-            # Blend
-            blended = (merch_region * alpha_3ch + base_region * (1 - alpha_3ch)).astype(np.uint8)
-            result[dst_y1:dst_y2, dst_x1:dst_x2] = blended
-        
-        return result
+            # Default scale and position
+            target_w = int(w * 0.5)
+            y_offset = h // 3
+            
+            if len(faces) > 0:
+                # Found a face! Use the largest to position the shirt below it
+                fx, fy, fw, fh = faces[0]
+                # Scale shirt to 3.5x face width (typical torso proportion)
+                target_w = int(fw * 3.5)
+                # Position below face
+                y_offset = fy + int(fh * 1.5)
+                # Center relative to face
+                x_offset = fx + (fw // 2) - (target_w // 2)
+                print(f"🔍 Face detected! Aligning shirt to face at {fx},{fy}")
+            else:
+                # Standard center positioning
+                x_offset = (w - target_w) // 2
+                print("🔍 No face detected, using standard centering.")
+            
+            # Rescale
+            new_mw = max(1, target_w)
+            new_mh = max(1, int(mh * new_mw / mw))
+            merch_resized = cv2.resize(merch_template, (new_mw, new_mh))
+            
+            # Keep the shirt inside the frame where it fits, otherwise it is clipped
+            x_offset = min(max(0, x_offset), max(0, w - new_mw))
+            y_offset = min(max(0, y_offset), max(0, h - new_mh))
+            
+            return self.overlay(base_image, merch_resized, x_offset, y_offset)
+        except Exception as fallback_error:
+            print(f"❌ Intelligent fallback failed: {fallback_error}")
+            # Ultimate fallback - just return something
+            return base_image
     
-    def apply_tryon(self, base_image_path: str, merch_image_path: str) -> Tuple[np.ndarray, int]:
+    @staticmethod
+    def decode_image(data: bytes, flags: int = None) -> np.ndarray:
+        """Decode an in-memory encoded image (defaults to 3-channel BGR)"""
+        flags = cv2.IMREAD_COLOR if flags is None else flags
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if image is None:
+            raise ValueError("Failed to decode image")
+        return image
+    
+    def decode_base_image(self, data: bytes) -> np.ndarray:
+        """
+        Decode an uploaded photo as close to its working width as possible
+        JPEGs are DCT-scaled by 1/2, 1/4 or 1/8 while decoding (never below BASE_IMAGE_MAX_WIDTH),
+        so a large photo is never held at full resolution; other formats decode normally.
+        """
+        flags = cv2.IMREAD_COLOR
+        try:
+            image_format, width, _ = probe_image(io.BytesIO(data))
+        except Exception:
+            image_format, width = None, 0
+        if image_format == "JPEG":
+            for factor, reduced_flags in JPEG_REDUCED_FLAGS:
+                if width // factor >= BASE_IMAGE_MAX_WIDTH:
+                    flags = reduced_flags
+                    break
+        return self.decode_image(data, flags)
+    
+    @staticmethod
+    def encode_image(image: np.ndarray, ext: str = ".jpg", quality: int = 95) -> bytes:
+        """Encode an image to in-memory bytes (JPEG by default)"""
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in (".jpg", ".jpeg") else []
+        ok, encoded = cv2.imencode(ext, image, params)
+        if not ok:
+            raise ValueError("Failed to encode image")
+        return encoded.tobytes()
+    
+    def apply_tryon(self, base_image_path: str, merch_image_path: Optional[str] = None,
+                    merch_template: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
         """
         Main try-on function
+        Pass either merch_image_path or a preprocessed merch_template (see get_merch_template)
         Returns: (result_image, processing_time_ms)
         """
-        import time
-        start_time = time.time()
-        
         # Load images
-        base_image = cv2.imread(base_image_path)
-        merch_template = cv2.imread(merch_image_path, cv2.IMREAD_UNCHANGED)
+        with open(base_image_path, 'rb') as f:
+            base_image = self.decode_base_image(f.read())
+        if merch_template is None and merch_image_path is not None:
+            merch_image = cv2.imread(merch_image_path, cv2.IMREAD_UNCHANGED)
+            if merch_image is not None:
+                merch_template = self.prepare_merch_template(merch_image)
         
         if base_image is None or merch_template is None:
             raise ValueError("Failed to load images")
         
-        # Resize base image if too large (for performance)
-        max_width = 1920
+        result, processing_time, _ = self.render(base_image, merch_template)
+        return result, processing_time
+    
+    def prepare_base_image(self, base_image: np.ndarray) -> np.ndarray:
+        """Resize base image if too large (for performance)"""
+        max_width = BASE_IMAGE_MAX_WIDTH
         h, w = base_image.shape[:2]
         if w > max_width:
             scale = max_width / w
             new_w = max_width
             new_h = int(h * scale)
             base_image = cv2.resize(base_image, (new_w, new_h))
+        return base_image
+    
+    @staticmethod
+    def tier_settings(tier: str, detection_max_side: Optional[int] = None) -> Tuple[int, Optional[int], int]:
+        """
+        (model_complexity, detection_max_side, interpolation) for a quality tier
+        An explicit detection_max_side overrides the tier's own.
+        """
+        config = QUALITY_TIERS[tier]
+        if detection_max_side is None:
+            detection_max_side = config["detection_max_side"]
+        interpolation = cv2.INTER_LANCZOS4 if config["interpolation"] == "lanczos" else cv2.INTER_LINEAR
+        return config["model_complexity"], detection_max_side, interpolation
+    
+    def analyze(self, base_image: np.ndarray, detection_max_side: Optional[int] = None,
+                tier: str = DEFAULT_QUALITY_TIER, timer: Optional[StageTimer] = None) -> Optional[List[PersonPose]]:
+        """
+        Pose analysis only (same resize as render, so detections can be passed back to render)
+        Returns None when detection is unavailable or errored.
+        """
+        if not self.enabled:
+            return None
+        timer = timer or StageTimer()
+        try:
+            model_complexity, detection_max_side, _ = self.tier_settings(tier, detection_max_side)
+            with timer.stage("resize"):
+                base_image = self.prepare_base_image(base_image)
+            with timer.stage("detect"):
+                return self.detect_people(base_image, detection_max_side, model_complexity)
+        except Exception as e:
+            print(f"⚠️  Pose analysis failed: {e}")
+            return None
+    
+    def render(self, base_image: np.ndarray, merch_template: np.ndarray,
+               people: Optional[List[PersonPose]] = None,
+               detection_max_side: Optional[int] = None,
+               tier: str = DEFAULT_QUALITY_TIER,
+               timer: Optional[StageTimer] = None,
+               merch_key: Optional[Hashable] = None) -> Tuple[np.ndarray, int, Optional[List[PersonPose]]]:
+        """
+        Render a preprocessed merch template onto a decoded BGR photo
+        people: detect_people() output from an earlier render of the same photo - skips pose inference
+        detection_max_side: pose inference resolution (see detect_people); compositing stays at output size
+        tier: QUALITY_TIERS name - pose model, detection resolution and merch resampling
+        timer: collects per-stage timings (resize, detect, scale, deform, lighting, feather, composite / fallback)
+        merch_key: get_merch_template key of merch_template, enabling the pyramid / scaled-merch caches
+        Returns: (result_image, processing_time_ms, people) - people is None if detection did not run cleanly
+        """
+        start_time = time.perf_counter()
+        timer = timer or StageTimer()
+        
+        with timer.stage("resize"):
+            base_image = self.prepare_base_image(base_image)
+        model_complexity, detection_max_side, interpolation = self.tier_settings(tier, detection_max_side)
         
         # Detect people
         try:
             if not self.enabled:
                 raise RuntimeError("Using fallback")
-            people = self.detect_people(base_image)
+            if people is None:
+                with timer.stage("detect"):
+                    people = self.detect_people(base_image, detection_max_side, model_complexity)
             if not people:
                 raise ValueError("No person detected in image")
         except (RuntimeError, ValueError, Exception) as e:
             print(f"⚠️  Detection failed or engine disabled: {e}. Using intelligent fallback.")
-            # Fallback: Background removal + Simple alignment
-            try:
-                h, w = base_image.shape[:2]
-                
-                # 1. Clean up merchandise background
-                clean_merch = self._remove_background(merch_template)
-                mh, mw = clean_merch.shape[:2]
-                
-                # 2. Try to find a person's upper body or face for better alignment
-                # Use OpenCV's built-in cascades if available
-                detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                gray = cv2.cvtColor(base_image, cv2.COLOR_BGR2GRAY)
-                faces = detector.detectMultiScale(gray, 1.1, 4)
-                
-                # Default scale and position
-                target_w = int(w * 0.5)
-                y_offset = h // 3
-                
-                if len(faces) > 0:
-                    # Found a face! Use it to position the shirt below it
-                    fx, fy, fw, fh = faces[0]
-                    # Scale shirt to 2.5x face width (typical torso proportion)
-                    target_w = int(fw * 3.5)
-                    # Position below face
-                    y_offset = fy + int(fh * 1.5)
-                    # Center relative to face
-                    x_center = fx + (fw // 2)
-                    x_offset = x_center - (target_w // 2)
-                    print(f"🔍 Face detected! Aligning shirt to face at {fx},{fy}")
-                else:
-                    # Standard center positioning
-                    x_offset = (w - target_w) // 2
-                    print("🔍 No face detected, using standard centering.")
-
-                # 3. Rescale and overlay
-                scale = target_w / mw
-                new_mw = target_w
-                new_mh = int(mh * scale)
-                
-                merch_resized = cv2.resize(clean_merch, (new_mw, new_mh))
-                
-                # Re-calculate bounds and check
-                y1, y2 = y_offset, y_offset + new_mh
-                x1, x2 = x_offset, x_offset + new_mw
-                
-                # Final safety: Ensure within image bounds, otherwise reposition
-                if x1 < 0: x1, x2 = 0, new_mw
-                if x2 > w: x1, x2 = w - new_mw, w
-                if y1 < 0: y1, y2 = 0, new_mh
-                if y2 > h: y1, y2 = h - new_mh, h
-
-                # Apply with alpha blending
-                if merch_resized.shape[2] == 4:
-                    alpha_s = merch_resized[:, :, 3] / 255.0
-                    alpha_l = 1.0 - alpha_s
-                    
-                    for c in range(0, 3):
-                        base_image[y1:y2, x1:x2, c] = (alpha_s * merch_resized[:, :, c] +
-                                                    alpha_l * base_image[y1:y2, x1:x2, c])
-                else:
-                    base_image[y1:y2, x1:x2] = merch_resized[:, :, :3]
-
-                return base_image, 100
-            except Exception as fallback_error:
-                print(f"❌ Intelligent fallback failed: {fallback_error}")
-                # Ultimate fallback - just return something
-                return base_image, 50
+            # Work on a copy - callers may render several designs onto the same decoded photo
+            with timer.stage("fallback"):
+                result = self.fallback_overlay(base_image.copy(), merch_template)
+            return result, int((time.perf_counter() - start_time) * 1000), people
 
         # Apply try-on for each detected person
-        result = base_image.copy()
+        with timer.stage("composite"):
+            result = base_image.copy()
         
-        for person_data in people:
+        for person in people:
             # Scale merch to person's proportions
-            scaled_merch = self.scale_merch(
-                merch_template,
-                person_data['shoulder_width'],
-                person_data['torso_height']
-            )
+            with timer.stage("scale"):
+                scaled_merch = self.scale_merch(
+                    merch_template,
+                    person.shoulder_width,
+                    person.torso_height,
+                    interpolation,
+                    merch_key
+                )
             
             # Apply fabric deformation
-            deformed_merch = self.apply_fabric_deformation(scaled_merch, person_data)
+            with timer.stage("deform"):
+                deformed_merch = self.apply_fabric_deformation(scaled_merch, person)
+                merch_bgr = np.ascontiguousarray(deformed_merch[:, :, :3])
+                merch_alpha = deformed_merch[:, :, 3]
             
             # Add lighting and shadows
-            lit_merch = self.add_shadows_and_lighting(deformed_merch, base_image, person_data)
+            with timer.stage("lighting"):
+                lit_merch = self.add_shadows_and_lighting(merch_bgr, base_image, person, merch_alpha)
             
-            # Create feathered edges
-            final_merch, alpha_mask = self.blend_edges(lit_merch)
+            # Create feathered edges, restricted to the template's own alpha
+            with timer.stage("feather"):
+                final_merch, alpha_mask = self.blend_edges(lit_merch)
+                alpha_mask = (alpha_mask * merch_alpha + 0.5).astype(np.uint8)
             
             # Composite onto base image
-            result = self.composite_merch(result, final_merch, person_data, alpha_mask)
+            with timer.stage("composite"):
+                result = self.composite_merch(result, final_merch, person, alpha_mask)
         
-        processing_time = int((time.time() - start_time) * 1000)
+        processing_time = int((time.perf_counter() - start_time) * 1000)
         
-        return result, processing_time
+        return result, processing_time, people
     
     def __del__(self):
         """Cleanup"""
-        if hasattr(self, 'pose') and self.pose is not None:
-            self.pose.close()
+        for pose in getattr(self, 'poses', {}).values():
+            pose.close()
         if hasattr(self, 'segmentation') and self.segmentation is not None:
             self.segmentation.close()
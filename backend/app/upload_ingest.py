@@ -0,0 +1,191 @@
+"""
+Upload Ingestion
+Streams a multipart photo upload through one pass: size limit, magic-byte and
+dimension sniffing as the header arrives, metadata stripping and content hashing,
+without spooling the request body to a temp file
+"""
+
+import hashlib
+import io
+from typing import Dict, Optional
+
+from fastapi import Request
+from PIL import Image
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from .image_metadata import image_format, strip_metadata
+
+FORMAT_EXTENSIONS = {'JPEG': ('jpg', 'jpeg'), 'PNG': ('png',)}
+STORED_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+SNIFF_BYTES = 8  # enough for the JPEG / PNG signatures
+FIRST_PROBE_BYTES = 2048  # header probes retry at doubling sizes until the frame size is found
+MAX_FIELD_BYTES = 1024  # plain form fields (ids)
+
+
+class UploadRejected(ValueError):
+    """The upload is not acceptable; the message is safe to show to the client"""
+
+
+class UploadIngestor:
+    """
+    Incremental validation of one uploaded image, fed chunk by chunk as the body arrives
+    Oversized, non-image and too-many-megapixel uploads are rejected as soon as the bytes
+    that prove it have been read, so the rest of the body is never buffered.
+    """
+
+    def __init__(self, max_bytes: int, max_pixels: int, allowed_extensions):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_megapixels = max_pixels / 1e6
+        self.allowed_extensions = {ext.strip().lower() for ext in allowed_extensions}
+        self.filename: Optional[str] = None
+        self.buffer = bytearray()
+        self.format: Optional[str] = None
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self._next_probe = FIRST_PROBE_BYTES
+
+    @property
+    def started(self) -> bool:
+        return self.filename is not None
+
+    def start(self, filename: str):
+        """Begin the file part; the extension is checked before any data is read"""
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if extension not in self.allowed_extensions:
+            raise UploadRejected(f"File type not allowed. Allowed: {', '.join(sorted(self.allowed_extensions))}")
+        self.filename = filename
+
+    def feed(self, chunk: bytes):
+        if len(self.buffer) + len(chunk) > self.max_bytes:
+            raise UploadRejected(f"File too large. Maximum size: {self.max_bytes // (1024 * 1024)}MB")
+        self.buffer += chunk
+
+        if self.format is None and len(self.buffer) >= SNIFF_BYTES:
+            self._sniff()
+        if self.format is not None and self.width is None and len(self.buffer) >= self._next_probe:
+            self._probe(final=False)
+
+    def _sniff(self):
+        self.format = image_format(bytes(self.buffer[:SNIFF_BYTES]))
+        extension = self.filename.rsplit('.', 1)[-1].lower()
+        if self.format is None or extension not in FORMAT_EXTENSIONS[self.format]:
+            raise UploadRejected("File is not a readable image")
+
+    def _probe(self, final: bool):
+        """Frame size from the header; before the whole file is in, a failure just means 'read more'"""
+        try:
+            with Image.open(io.BytesIO(self.buffer)) as image:
+                self.width, self.height = image.size
+        except Image.DecompressionBombError:
+            raise UploadRejected(f"Image too large. Maximum: {self.max_megapixels:g} megapixels")
+        except Exception:
+            if final:
+                raise UploadRejected("File is not a readable image")
+            self._next_probe = len(self.buffer) * 2
+            return
+        if self.width * self.height > self.max_pixels:
+            raise UploadRejected(f"Image too large ({self.width}x{self.height}). "
+                                 f"Maximum: {self.max_megapixels:g} megapixels")
+
+    def finish(self) -> Dict:
+        """
+        Validate the complete file and produce what gets stored (CPU-bound - run off the event loop)
+        Returns: {'data': bytes, 'sha256': str, 'file_ext': str, 'width': int, 'height': int}
+        sha256 is of the stored (metadata-free) bytes, the same digest the pose/render caches key on.
+        """
+        if not self.started or not self.buffer:
+            raise UploadRejected("No file uploaded")
+        if self.format is None:
+            self._sniff()
+        if self.width is None:
+            self._probe(final=True)
+
+        try:
+            data = strip_metadata(bytes(self.buffer))
+        except Exception:
+            raise UploadRejected("File is not a readable image")
+        self.buffer = bytearray()
+        return {
+            'data': data,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'file_ext': STORED_EXTENSIONS[self.format],
+            'width': self.width,
+            'height': self.height
+        }
+
+
+async def read_multipart_upload(request: Request, ingestor: UploadIngestor,
+                                file_field: str = "file") -> Dict[str, str]:
+    """
+    Stream a multipart/form-data request body, feeding the `file_field` part to `ingestor`
+    Returns the plain form fields. Raises UploadRejected as soon as the body is unacceptable.
+    """
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in params:
+        raise UploadRejected("Expected a multipart/form-data upload")
+
+    fields: Dict[str, str] = {}
+    part = {}
+    header = {'field': b'', 'value': b''}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, name=None, is_file=False, data=bytearray())
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header['field'] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header['value'] += data[start:end]
+
+    def on_header_end():
+        part['headers'][header['field'].lower()] = header['value']
+        header['field'] = header['value'] = b''
+
+    def on_headers_finished():
+        _, options = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        part['name'] = options.get(b'name', b'').decode('utf-8', 'replace')
+        if b'filename' in options:
+            if part['name'] != file_field or ingestor.started:
+                raise UploadRejected(f"Only one file is accepted, in the '{file_field}' field")
+            part['is_file'] = True
+            ingestor.start(options[b'filename'].decode('utf-8', 'replace'))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part['is_file']:
+            ingestor.feed(data[start:end])
+            return
+        part['data'] += data[start:end]
+        if len(part['data']) > MAX_FIELD_BYTES:
+            raise UploadRejected(f"Form field '{part['name']}' is too long")
+
+    def on_part_end():
+        if not part['is_file']:
+            fields[part['name']] = part['data'].decode('utf-8', 'replace')
+
+    parser = MultipartParser(params[b'boundary'], {
+        'on_part_begin': on_part_begin,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except UploadRejected:
+        raise
+    except Exception as e:
+        raise UploadRejected(f"Malformed upload: {str(e)}")
+
+    if not ingestor.started:
+        raise UploadRejected("No file uploaded")
+    return fields
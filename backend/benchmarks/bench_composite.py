@@ -0,0 +1,96 @@
+"""
+Compositor Benchmark
+Per-person cost of TryOnEngine.composite_merch against the previous
+full-frame float implementation, at 1080p and at the 1920px working width.
+
+Run from the backend directory:
+    python benchmarks/bench_composite.py
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.tryon_engine import TryOnEngine  # noqa: E402
+
+RUNS = 30
+
+# (label, frame width, frame height, merch width, merch height)
+CASES = [
+    ("1080p landscape", 1920, 1080, 520, 680),
+    ("1920px portrait", 1920, 2560, 1000, 1300),
+]
+
+
+def legacy_composite(base_image, merch, person, alpha_mask):
+    """Previous implementation: full-frame copy, two warps, float64 blend"""
+    result = base_image.copy()
+    center_x, center_y = person.shoulder_center
+    angle = person.rotation_angle
+    h, w = merch.shape[:2]
+    rotation_matrix = cv2.getRotationMatrix2D((w//2, h//2), angle, 1.0)
+    merch_rotated = cv2.warpAffine(merch, rotation_matrix, (w, h), flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+    alpha_rotated = cv2.warpAffine(alpha_mask, rotation_matrix, (w, h), flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    x1 = center_x - w // 2
+    y1 = center_y - h // 4
+    x2 = x1 + w
+    y2 = y1 + h
+    img_h, img_w = base_image.shape[:2]
+    src_x1, src_y1 = max(0, -x1), max(0, -y1)
+    src_x2, src_y2 = w - max(0, x2 - img_w), h - max(0, y2 - img_h)
+    dst_x1, dst_y1 = max(0, x1), max(0, y1)
+    dst_x2, dst_y2 = min(img_w, x2), min(img_h, y2)
+    if src_x2 > src_x1 and src_y2 > src_y1:
+        merch_region = merch_rotated[src_y1:src_y2, src_x1:src_x2]
+        alpha_region = alpha_rotated[src_y1:src_y2, src_x1:src_x2]
+        base_region = result[dst_y1:dst_y2, dst_x1:dst_x2]
+        alpha_3ch = cv2.merge([alpha_region, alpha_region, alpha_region])
+        blended = (merch_region * alpha_3ch + base_region * (1 - alpha_3ch)).astype(np.uint8)
+        result[dst_y1:dst_y2, dst_x1:dst_x2] = blended
+    return result
+
+
+def median_ms(func, runs=RUNS):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    engine = TryOnEngine()
+    rng = np.random.default_rng(0)
+
+    for label, frame_w, frame_h, merch_w, merch_h in CASES:
+        base = rng.integers(0, 256, (frame_h, frame_w, 3), dtype=np.uint8)
+        merch = rng.integers(0, 256, (merch_h, merch_w, 3), dtype=np.uint8)
+        _, feather = engine.blend_edges(merch)
+        alpha_u8 = (feather * 255 + 0.5).astype(np.uint8)
+        # composite_merch only reads these two PersonPose attributes
+        person = SimpleNamespace(shoulder_center=(frame_w // 2, frame_h // 3), rotation_angle=4.0)
+
+        legacy = median_ms(lambda: legacy_composite(base, merch, person, feather))
+        frame = base.copy()
+        current = median_ms(lambda: engine.composite_merch(frame, merch, person, alpha_u8))
+
+        expected = legacy_composite(base, merch, person, feather)
+        actual = engine.composite_merch(base.copy(), merch, person, alpha_u8)
+        max_diff = int(np.abs(expected.astype(np.int16) - actual.astype(np.int16)).max())
+
+        print(f"{label:16s} {frame_w}x{frame_h}, merch {merch_w}x{merch_h}: "
+              f"legacy {legacy:7.2f} ms/person | current {current:7.2f} ms/person | "
+              f"speedup {legacy / current:5.1f}x | max pixel diff {max_diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Decode Memory Benchmark
+Peak RSS added by one render of a large JPEG upload, decoding it at full
+resolution (previous path) versus TryOnEngine.decode_base_image's reduced decode.
+Each case runs in a fresh process so its peak is not hidden by an earlier one.
+
+Run from the backend directory (photo defaults to the first storage/uploads/*.jpg):
+    python benchmarks/bench_decode_memory.py [photo]
+"""
+
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Upload sizes to test, (width, height)
+FRAMES = [(4000, 3000), (6000, 4000), (8160, 6120)]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def render_once(photo_path: str, jpeg: bytes, reduced: bool):
+    """
+    Child process: warm the engine with a render at working size (so model buffers are
+    already allocated), then decode + render the upload once and report the added peak
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from app.tryon_engine import TryOnEngine
+
+    engine = TryOnEngine()
+    template = engine.prepare_merch_template(
+        cv2.imread(os.path.join(BACKEND_DIR, "assets", "merch", "design1.png"), cv2.IMREAD_UNCHANGED))
+    engine.render(cv2.imread(photo_path), template)
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    image = engine.decode_base_image(jpeg) if reduced else engine.decode_image(jpeg)
+    decoded_shape = image.shape[:2]
+    decode_ms = (time.perf_counter() - start) * 1000
+    engine.render(image, template)
+    total_ms = (time.perf_counter() - start) * 1000
+    return decoded_shape, peak_rss_mb() - baseline, decode_ms, total_ms
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(BACKEND_DIR, "storage", "uploads", "*.jpg")))
+    photo = cv2.imread(paths[0])
+    context = multiprocessing.get_context("spawn")
+
+    print(f"source photo {os.path.basename(paths[0])}, upscaled to each frame size")
+    print(f"{'frame':>11} | {'jpeg MB':>7} | {'decode':>8} | {'decoded':>11} | "
+          f"{'peak RSS +MB':>12} | {'decode ms':>9} | {'total ms':>9}")
+    for width, height in FRAMES:
+        frame = cv2.resize(photo, (width, height), interpolation=cv2.INTER_CUBIC)
+        jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+        del frame
+        for reduced in (False, True):
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                shape, peak_mb, decode_ms, total_ms = pool.submit(render_once, paths[0], jpeg, reduced).result()
+            print(f"{width:>5}x{height:<5} | {len(jpeg) / 1e6:7.1f} | {'reduced' if reduced else 'full':>8} | "
+                  f"{shape[1]:>5}x{shape[0]:<5} | {peak_mb:12.0f} | {decode_ms:9.0f} | {total_ms:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
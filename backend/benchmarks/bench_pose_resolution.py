@@ -0,0 +1,77 @@
+"""
+Pose Resolution Benchmark
+Latency of TryOnEngine.detect_people at several detection resolutions and the
+shoulder-width error each one introduces, relative to full-resolution inference.
+
+Run from the backend directory (photos default to storage/uploads/*.jpg):
+    python benchmarks/bench_pose_resolution.py [photo ...]
+"""
+
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.tryon_engine import TryOnEngine  # noqa: E402
+
+RUNS = 5
+SIDES = [0, 1280, 960, 640, 480, 320]  # 0 = full resolution (reference)
+
+
+def median_ms(func, runs=RUNS):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob("storage/uploads/*.jpg"))
+    engine = TryOnEngine()
+    if not engine.enabled:
+        print("MediaPipe unavailable - nothing to benchmark")
+        return
+    engine.warm_up()
+
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append((os.path.basename(path), engine.prepare_base_image(image)))
+
+    latency = {side: [] for side in SIDES}
+    errors = {side: [] for side in SIDES}
+    for name, image in images:
+        reference = engine.detect_people(image, max_side=0)
+        if not reference:
+            print(f"{name}: no person detected at full resolution, skipped")
+            continue
+        reference_width = reference[0].shoulder_width
+
+        for side in SIDES:
+            latency[side].append(median_ms(lambda: engine.detect_people(image, max_side=side)))
+            people = engine.detect_people(image, max_side=side)
+            if people:
+                errors[side].append(abs(people[0].shoulder_width - reference_width) / reference_width * 100)
+
+    print(f"{len(images)} photos, median of {RUNS} runs each")
+    print(f"{'side':>6} | {'latency ms':>10} | {'shoulder err % (mean / max)':>28} | detected")
+    for side in SIDES:
+        if not latency[side]:
+            continue
+        label = "full" if side == 0 else str(side)
+        err = errors[side]
+        err_text = f"{np.mean(err):6.2f} / {np.max(err):6.2f}" if err else "n/a"
+        print(f"{label:>6} | {np.mean(latency[side]):10.1f} | {err_text:>28} | "
+              f"{len(err)}/{len(latency[side])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Storage Benchmark
+One-object-per-call storage access (previous pattern) against StorageManager's batch
+upload / signing / delete, on the in-memory backend with a simulated network round trip,
+and the objects / bytes kept for duplicate uploads with and without content addressing.
+
+Run from the backend directory:
+    python benchmarks/bench_storage.py [round_trip_ms]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.object_refs import MemoryObjectRefs  # noqa: E402
+from app.storage import StorageManager  # noqa: E402
+from app.storage_backends import MemoryBackend  # noqa: E402
+
+OBJECTS = 20  # e.g. a listing page or a batch of renders
+DUPLICATES = 5  # copies of each distinct upload (re-uploaded photos, identical renders)
+PAYLOAD = b"\xff\xd8" + os.urandom(200 * 1024) + b"\xff\xd9"
+
+
+def timed_ms(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    round_trip_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    backend = MemoryBackend(latency=round_trip_ms / 1000)
+    storage = StorageManager(backend, refs=MemoryObjectRefs())
+
+    one_by_one = {}
+    batched = {}
+    results = []
+    one_by_one["upload"] = timed_ms(lambda: results.extend(
+        storage.upload_bytes(PAYLOAD, folder="generated", strip_metadata=False) for _ in range(OBJECTS)))
+    batched["upload"] = timed_ms(lambda: results.extend(
+        storage.upload_many([PAYLOAD] * OBJECTS, folder="generated", strip_metadata=False)))
+
+    paths = [result['path'] for result in results]
+    first, second = paths[:OBJECTS], paths[OBJECTS:]
+
+    one_by_one["sign"] = timed_ms(lambda: [storage.get_signed_url(path) for path in first])
+    batched["sign"] = timed_ms(lambda: storage.get_signed_urls(second))
+    batched["sign (cached)"] = timed_ms(lambda: storage.get_signed_urls(paths))
+
+    one_by_one["delete"] = timed_ms(lambda: [storage.delete_file(path) for path in first])
+    batched["delete"] = timed_ms(lambda: storage.delete_files_batch(second))
+    storage.close()
+
+    print(f"{OBJECTS} objects of {len(PAYLOAD) // 1024} KB, {round_trip_ms:.0f} ms simulated round trip")
+    print(f"{'operation':>14} | {'one by one ms':>13} | {'batched ms':>10}")
+    for operation, ms in batched.items():
+        previous = one_by_one.get(operation)
+        previous_text = f"{previous:13.0f}" if previous is not None else f"{'-':>13}"
+        print(f"{operation:>14} | {previous_text} | {ms:10.0f}")
+
+    distinct = [b"\xff\xd8" + os.urandom(200 * 1024) + b"\xff\xd9" for _ in range(OBJECTS // DUPLICATES)]
+    uploads = distinct * DUPLICATES
+    print(f"\n{len(uploads)} uploads of {len(distinct)} distinct images")
+    print(f"{'layout':>17} | {'objects':>7} | {'stored MB':>9} | {'upload ms':>9} | objects after deleting half")
+    for content_addressed in (False, True):
+        backend = MemoryBackend(latency=round_trip_ms / 1000)
+        storage = StorageManager(backend, refs=MemoryObjectRefs(), content_addressed=content_addressed)
+        results = []
+        ms = timed_ms(lambda: results.extend(storage.upload_many(uploads, folder="generated",
+                                                                 strip_metadata=False)))
+        stored_mb = sum(len(data) for data, _ in backend.objects.values()) / 1e6
+        objects = len(backend.objects)
+        storage.delete_files_batch([result['path'] for result in results[::2]])
+        layout = "content-addressed" if content_addressed else "uuid"
+        print(f"{layout:>17} | {objects:7d} | {stored_mb:9.1f} | {ms:9.0f} | {len(backend.objects)}")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Metadata Stripping Benchmark
+StorageManager.strip_exif's container rewrite (image_metadata.strip_metadata)
+against the previous getdata/putdata re-encode, on phone-sized uploads.
+
+Run from the backend directory (photo defaults to the first storage/uploads/*.jpg):
+    python benchmarks/bench_strip_metadata.py [photo]
+"""
+
+import glob
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.image_metadata import strip_metadata  # noqa: E402
+
+SIZE = (4032, 3024)  # 12 MP phone photo
+RUNS = 3
+
+
+def legacy_strip_exif(image_data: bytes) -> bytes:
+    """Previous implementation: per-pixel Python tuples, then a full re-encode"""
+    image = Image.open(io.BytesIO(image_data))
+    data = list(image.getdata())
+    image_without_exif = Image.new(image.mode, image.size)
+    image_without_exif.putdata(data)
+    img_byte_arr = io.BytesIO()
+    image_without_exif.save(img_byte_arr, format=image.format or 'JPEG')
+    return img_byte_arr.getvalue()
+
+
+def measure(func, data: bytes):
+    """(median ms, peak traced MB of one call, output)"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        output = func(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return float(np.median(timings)), peak, output
+
+
+def pixels(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"), dtype=np.int16)
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob("storage/uploads/*.jpg"))
+    photo = Image.open(paths[0]).convert("RGB").resize(SIZE, Image.BICUBIC)
+
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    exif[0x0110] = "Phone model"
+    rotated_exif = Image.Exif()
+    rotated_exif[0x0112] = 6  # rotate 90 CW on display
+
+    cases = []
+    for label, save_args in (("jpeg + exif", {"exif": exif, "quality": 92}),
+                             ("jpeg rotated", {"exif": rotated_exif, "quality": 92}),
+                             ("png", {"format": "PNG"})):
+        buffer = io.BytesIO()
+        save_args = dict(save_args)
+        photo.save(buffer, format=save_args.pop("format", "JPEG"), **save_args)
+        cases.append((label, buffer.getvalue()))
+
+    print(f"{SIZE[0]}x{SIZE[1]} photo, median of {RUNS} runs")
+    print(f"{'case':>13} | {'method':>8} | {'ms':>8} | {'peak MB':>8} | {'bytes':>9} | mean pixel diff")
+    for label, data in cases:
+        reference = pixels(data)
+        rotated = label == "jpeg rotated"
+        for method, func in (("legacy", legacy_strip_exif), ("current", strip_metadata)):
+            ms, peak, output = measure(func, data)
+            result = pixels(output)
+            if rotated and result.shape != reference.shape:
+                diff = "n/a (rotated)"
+            else:
+                diff = f"{np.abs(result - reference).mean():.3f}"
+            print(f"{label:>13} | {method:>8} | {ms:8.1f} | {peak:8.1f} | {len(output):9d} | {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Upload Ingestion Benchmark
+Streaming multipart ingestion (upload_ingest) against the previous path: Starlette's
+form parser spooling the file, then seek/read, header probe and metadata strip.
+Reports time, traced peak memory and how much of the body was read before a decision.
+
+Run from the backend directory (photo defaults to the first storage/uploads/*.jpg):
+    python benchmarks/bench_upload_ingest.py [photo]
+"""
+
+import asyncio
+import glob
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+from PIL import Image
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.image_metadata import strip_metadata  # noqa: E402
+from app.upload_ingest import UploadIngestor, UploadRejected, read_multipart_upload  # noqa: E402
+
+BOUNDARY = "benchboundary"
+CHUNK = 64 * 1024  # ASGI servers hand the body over in chunks of about this size
+MAX_BYTES = 5 * 1024 * 1024
+MAX_PIXELS = 50 * 1000 * 1000
+RUNS = 5
+
+
+def multipart_body(filename: str, data: bytes) -> bytes:
+    return (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"admin_id\"\r\n\r\n1\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, counter: dict) -> Request:
+    position = 0
+
+    async def receive():
+        nonlocal position
+        chunk = body[position:position + CHUNK]
+        position += len(chunk)
+        counter['read'] += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": position < len(body)}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"",
+             "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]}
+    return Request(scope, receive)
+
+
+async def legacy_ingest(request: Request):
+    """Previous upload_photo: parse the form (file spooled), measure via seek, probe, read, strip"""
+    form = await request.form()
+    file = form["file"]
+    file.file.seek(0, 2)
+    if file.file.tell() > MAX_BYTES:
+        raise UploadRejected("too large")
+    file.file.seek(0)
+    with Image.open(file.file) as image:
+        width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise UploadRejected("too many pixels")
+    file.file.seek(0)
+    return strip_metadata(file.file.read())
+
+
+async def streaming_ingest(request: Request):
+    ingestor = UploadIngestor(MAX_BYTES, MAX_PIXELS, ["jpg", "jpeg", "png"])
+    await read_multipart_upload(request, ingestor)
+    return ingestor.finish()['data']
+
+
+def measure(func, body: bytes):
+    """(median ms, peak traced MB, body bytes read, outcome)"""
+    timings = []
+    for _ in range(RUNS):
+        counter = {'read': 0}
+        start = time.perf_counter()
+        try:
+            asyncio.run(func(make_request(body, counter)))
+            outcome = "stored"
+        except UploadRejected:
+            outcome = "rejected"
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        asyncio.run(func(make_request(body, {'read': 0})))
+    except UploadRejected:
+        pass
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    timings.sort()
+    return timings[len(timings) // 2], peak, counter['read'], outcome
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob("storage/uploads/*.jpg"))
+    photo = Image.open(paths[0]).convert("RGB")
+
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    buffer = io.BytesIO()
+    photo.resize((4032, 3024), Image.BICUBIC).save(buffer, format="JPEG", quality=95, exif=exif)
+    phone_photo = buffer.getvalue()
+
+    huge = io.BytesIO()
+    Image.new("RGB", (10000, 8000)).save(huge, format="JPEG", quality=50)
+
+    cases = [
+        ("phone photo", multipart_body("me.jpg", phone_photo)),
+        ("40 MB body", multipart_body("me.jpg", phone_photo[:-2] + os.urandom(40 * 1024 * 1024))),
+        ("80 MP jpeg", multipart_body("me.jpg", huge.getvalue())),
+    ]
+
+    print(f"median of {RUNS} runs, {CHUNK // 1024} KB body chunks")
+    print(f"{'case':>12} | {'method':>9} | {'ms':>7} | {'peak MB':>8} | {'read MB':>8} | outcome")
+    for label, body in cases:
+        for method, func in (("legacy", legacy_ingest), ("streaming", streaming_ingest)):
+            ms, peak, read, outcome = measure(func, body)
+            print(f"{label:>12} | {method:>9} | {ms:7.1f} | {peak:8.1f} | {read / 1e6:8.1f} | {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Cache TTL Tests
+Per-entry expiry (pose detections live as long as their session), on a fake clock
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app import cache as cache_module
+from app.cache import LRUCache
+
+pytestmark = pytest.mark.backlog(request_id="user-004")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_entry_expires_after_its_ttl(clock):
+    cache = LRUCache(max_bytes=1024)
+    cache.put("pose", b"x" * 10, ttl=60)
+
+    clock.value += 59
+    assert cache.get("pose") == b"x" * 10
+
+    clock.value += 1
+    assert cache.get("pose") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert stats["entries"] == 0 and stats["bytes"] == 0
+
+
+def test_entries_without_ttl_never_expire(clock):
+    cache = LRUCache(max_bytes=1024)
+    cache.put("merch", b"x")
+    clock.value += 365 * 24 * 3600
+    assert cache.get("merch") == b"x"
+
+
+def test_already_expired_ttl_is_not_stored(clock):
+    cache = LRUCache(max_bytes=1024)
+    cache.put("render", b"x", ttl=10)
+    cache.put("render", b"y", ttl=0)
+    assert "render" not in cache and cache.current_bytes == 0
+
+
+def test_replacing_an_entry_resets_its_ttl(clock):
+    cache = LRUCache(max_bytes=1024)
+    cache.put("pose", b"old", ttl=10)
+    clock.value += 9
+    cache.put("pose", b"new", ttl=10)
+    clock.value += 9
+    assert cache.get("pose") == b"new"
@@ -0,0 +1,152 @@
+"""
+Metadata Stripping Tests
+Container-level JPEG / PNG rewriting must drop metadata without touching image data
+"""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image, PngImagePlugin
+
+from app.image_metadata import (JPEG_SOI, PNG_SIGNATURE, _jpeg_segments, _png_chunks,
+                                image_format, strip_metadata)
+
+pytestmark = pytest.mark.backlog(request_id="user-021")
+
+
+def photo(size=(96, 64)) -> Image.Image:
+    """Smooth gradient with some detail, so the scan data is not trivial"""
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    y = np.linspace(0, 255, height, dtype=np.uint8)
+    rgb = np.stack([np.tile(x, (height, 1)), np.tile(y[:, None], (1, width)),
+                    np.full((height, width), 90, dtype=np.uint8)], axis=2)
+    rgb[::7, ::5] = 255
+    return Image.fromarray(rgb)
+
+
+def encode_jpeg(image: Image.Image, **save_args) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, **save_args)
+    return buffer.getvalue()
+
+
+def jpeg_segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    return (struct.pack(">I", len(payload)) + chunk_type + payload +
+            struct.pack(">I", zlib.crc32(chunk_type + payload)))
+
+
+EXIF_SEGMENT = jpeg_segment(0xE1, b"Exif\x00\x00" + Image.Exif().tobytes() + b"GPS 12.97N 79.15E")
+XMP_SEGMENT = jpeg_segment(0xE1, b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta>Phone model</x:xmpmeta>")
+COMMENT_SEGMENT = jpeg_segment(0xFE, b"taken at the fest booth")
+
+
+def with_jpeg_metadata(clean: bytes) -> bytes:
+    """Insert EXIF, XMP and a comment right after the JFIF header"""
+    app0_end = 4 + struct.unpack(">H", clean[4:6])[0]
+    return clean[:app0_end] + EXIF_SEGMENT + XMP_SEGMENT + COMMENT_SEGMENT + clean[app0_end:]
+
+
+def scan_data(data: bytes) -> bytes:
+    """Everything from the first SOS marker on (scans, tables between scans, EOI)"""
+    return data[data.index(b"\xff\xda"):]
+
+
+def markers(data: bytes) -> list:
+    return [marker for marker, _, _ in _jpeg_segments(data)]
+
+
+def chunk_types(data: bytes) -> list:
+    return [chunk_type for chunk_type, _, _ in _png_chunks(data)]
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_jpeg_metadata_segments_removed_and_scans_untouched(progressive):
+    clean = encode_jpeg(photo(), progressive=progressive)
+    tagged = with_jpeg_metadata(clean)
+    assert {0xE1, 0xFE} <= set(markers(tagged))
+
+    stripped = strip_metadata(tagged)
+
+    assert stripped == clean
+    assert scan_data(stripped) == scan_data(tagged)
+    assert not {0xE1, 0xFE} & set(markers(stripped))
+
+
+def test_progressive_jpeg_keeps_every_scan():
+    tagged = with_jpeg_metadata(encode_jpeg(photo(), progressive=True))
+    stripped = strip_metadata(tagged)
+
+    assert markers(stripped).count(0xDA) == markers(tagged).count(0xDA) > 1
+    with Image.open(io.BytesIO(stripped)) as image:
+        assert image.info.get("progressive") or image.info.get("progression")
+        decoded = np.asarray(image.convert("RGB"))
+    with Image.open(io.BytesIO(tagged)) as image:
+        assert np.array_equal(decoded, np.asarray(image.convert("RGB")))
+
+
+def test_jpeg_keeps_icc_profile_and_drops_trailing_data():
+    icc = b"\x00" * 128  # only carried, never parsed by the stripper
+    clean = encode_jpeg(photo(), icc_profile=icc)
+    stripped = strip_metadata(with_jpeg_metadata(clean) + b"MPF preview bytes")
+
+    assert stripped == clean
+    with Image.open(io.BytesIO(stripped)) as image:
+        assert image.info["icc_profile"] == icc
+
+
+def test_jpeg_exif_rotation_is_applied_before_dropping_the_tag():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW to display
+    rotated = encode_jpeg(photo((96, 64)), exif=exif.tobytes())
+
+    stripped = strip_metadata(rotated)
+
+    assert 0xE1 not in markers(stripped)
+    with Image.open(io.BytesIO(stripped)) as image:
+        assert image.size == (64, 96)
+        assert image.getexif().get(0x0112) is None
+
+
+def test_png_text_and_exif_chunks_dropped():
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "taken at the fest booth")
+    info.add_itxt("XML:com.adobe.xmp", "<x:xmpmeta>Phone model</x:xmpmeta>")
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    buffer = io.BytesIO()
+    photo().save(buffer, format="PNG", pnginfo=info, exif=exif.tobytes())
+    tagged = buffer.getvalue()
+    # A gamma chunk affects rendering and must survive
+    tagged = tagged[:33] + png_chunk(b"gAMA", struct.pack(">I", 45455)) + tagged[33:]
+    assert {b"tEXt", b"iTXt", b"eXIf"} <= set(chunk_types(tagged))
+
+    stripped = strip_metadata(tagged)
+
+    assert stripped.startswith(PNG_SIGNATURE)
+    assert chunk_types(stripped) == [chunk_type for chunk_type in chunk_types(tagged)
+                                     if chunk_type not in (b"tEXt", b"iTXt", b"eXIf")]
+    idat = [data[start:end] for data in (tagged, stripped)
+            for chunk_type, start, end in _png_chunks(data) if chunk_type == b"IDAT"]
+    assert idat[:len(idat) // 2] == idat[len(idat) // 2:]
+    with Image.open(io.BytesIO(stripped)) as image:
+        assert np.array_equal(np.asarray(image), np.asarray(photo()))
+
+
+def test_image_format_from_signature():
+    assert image_format(JPEG_SOI + b"\xff\xe0") == "JPEG"
+    assert image_format(PNG_SIGNATURE) == "PNG"
+    assert image_format(b"GIF89a") is None
+
+
+def test_truncated_jpeg_is_rejected():
+    data = encode_jpeg(photo())
+    with pytest.raises(ValueError):
+        strip_metadata(data[:data.index(b"\xff\xda") + 2])
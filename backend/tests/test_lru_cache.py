@@ -0,0 +1,48 @@
+"""
+LRU Cache Tests
+Size and entry bounds, LRU order, invalidation and loading
+"""
+
+import pytest
+
+from app.cache import LRUCache
+
+pytestmark = pytest.mark.backlog(request_id="user-001")
+
+
+def test_least_recently_used_evicted_by_size():
+    cache = LRUCache(max_bytes=30, sizeof=len)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+    cache.get("a")
+    cache.put("d", b"d" * 10)
+
+    assert "b" not in cache and all(key in cache for key in "acd")
+    assert cache.evictions == 1 and cache.current_bytes == 30
+
+
+def test_entry_limit_and_oversized_values():
+    cache = LRUCache(max_bytes=100, max_entries=2, sizeof=len)
+    for key in "abc":
+        cache.put(key, b"x")
+    assert [key for key in "abc" if key in cache] == ["b", "c"]
+
+    cache.put("huge", b"x" * 101)
+    assert "huge" not in cache and len(cache) == 2
+
+
+def test_invalidate_and_get_or_load():
+    cache = LRUCache(max_bytes=100, sizeof=len)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return b"value"
+
+    assert cache.get_or_load("k", loader) == b"value"
+    assert cache.get_or_load("k", loader) == b"value"
+    assert len(loads) == 1
+
+    assert cache.invalidate("k") and not cache.invalidate("k")
+    assert cache.current_bytes == 0
@@ -0,0 +1,123 @@
+"""
+Quality Tier Tests
+Tier selection from queue depth and latency, and reading the depth from render threads
+"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import quality as quality_module
+from app.quality import QualityController
+from app.render_queue import RenderQueue
+
+pytestmark = pytest.mark.backlog(request_id="user-011")
+
+TIERS = ["high", "balanced", "fast"]
+
+
+def controller(max_tier: str = "high", **kwargs) -> QualityController:
+    options = dict(degrade_queue_depth=8, restore_queue_depth=2, degrade_p95_ms=4000,
+                   restore_p95_ms=1500, min_samples=5, min_switch_seconds=0)
+    options.update(kwargs)
+    return QualityController(TIERS, max_tier, **options)
+
+
+def record(quality: QualityController, latency_ms: float, count: int = 5):
+    for _ in range(count):
+        quality.record(latency_ms)
+
+
+def test_deep_queue_steps_down_one_tier_at_a_time():
+    quality = controller()
+    assert quality.select(0) == "high"
+    assert quality.select(8) == "balanced"
+    assert quality.select(8) == "fast"
+    assert quality.select(50) == "fast"
+    assert quality.stats()["switches"] == 2
+
+
+def test_slow_renders_step_down():
+    quality = controller()
+    record(quality, 6000, count=4)
+    assert quality.select(0) == "high"  # too few samples for a p95
+    record(quality, 6000, count=1)
+    assert quality.select(0) == "balanced"
+    assert quality.stats()["samples"] == 0  # samples of the old tier are dropped
+
+
+def test_restores_only_when_queue_and_latency_have_cleared():
+    quality = controller()
+    quality.select(8)
+    assert quality.select(0) == "balanced"  # no samples at the new tier yet
+
+    record(quality, 1000)
+    assert quality.select(3) == "balanced"  # queue still above restore depth
+    assert quality.select(2) == "high"
+
+
+def test_never_above_the_configured_tier():
+    quality = controller(max_tier="balanced")
+    record(quality, 100)
+    assert quality.select(0) == "balanced"
+    assert quality.select(8) == "fast"
+    record(quality, 100)
+    assert quality.select(0) == "balanced"
+    record(quality, 100)
+    assert quality.select(0) == "balanced"
+
+
+def test_minimum_time_between_switches(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(quality_module, "time", SimpleNamespace(monotonic=lambda: now.value))
+    quality = controller(min_switch_seconds=10)
+
+    assert quality.select(8) == "balanced"
+    now.value += 9
+    assert quality.select(8) == "balanced"
+    now.value += 1
+    assert quality.select(8) == "fast"
+
+
+def test_fixed_tier_when_not_adaptive():
+    quality = controller(adaptive=False)
+    record(quality, 10000)
+    assert quality.select(100) == "high"
+
+
+def test_unknown_tier_rejected():
+    with pytest.raises(ValueError):
+        QualityController(TIERS, "ultra")
+
+
+def test_depth_readable_from_render_threads_while_jobs_come_and_go():
+    """Render jobs pick their tier from depth on a worker thread while the loop adds and prunes jobs"""
+    queue = RenderQueue(concurrency=4, max_pending=100000, retention_minutes=0)
+    errors = []
+    stop = threading.Event()
+
+    def read_depth():
+        while not stop.is_set():
+            try:
+                queue.depth
+                queue.background_depth
+            except RuntimeError as e:
+                errors.append(e)
+                return
+
+    async def churn():
+        for _ in range(300):
+            jobs = [queue.submit(lambda: {}, user_id=1) for _ in range(20)]
+            await asyncio.gather(*(job.task for job in jobs))
+
+    reader = threading.Thread(target=read_depth)
+    reader.start()
+    try:
+        asyncio.run(churn())
+    finally:
+        stop.set()
+        reader.join()
+        queue.shutdown()
+    assert errors == []
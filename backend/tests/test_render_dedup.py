@@ -0,0 +1,231 @@
+"""
+Render Deduplication Tests
+render_and_store on the in-memory backend with a stubbed render pool: identical renders
+(retries, double taps running at the same time) share one stored image
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, GeneratedImage
+from app.object_refs import MemoryObjectRefs
+from app.routes import tryon
+from app.storage import StorageManager
+from app.storage_backends import MemoryBackend
+
+pytestmark = pytest.mark.backlog(request_id="user-020")
+
+WAIT = 10  # seconds a test waits for another thread before failing
+
+
+class StubRenderPool:
+    """render_pool.run stand-in; designs listed in gates block until released, in failures raise once"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = {}
+        self.gates = {}
+        self.failures = set()
+
+    def hold(self, key: str):
+        self.started[key] = threading.Event()
+        self.gates[key] = threading.Event()
+
+    def run(self, func, upload_bytes, merch_refs, people, detection_side, tier):
+        keys = [merch_ref['key'] for merch_ref in merch_refs]
+        self.calls.append(keys)
+        for key in keys:
+            if key in self.gates:
+                self.started[key].set()
+                assert self.gates[key].wait(WAIT)
+            if key in self.failures:
+                self.failures.discard(key)
+                raise RuntimeError(f"render of {key} failed")
+        return [(b"\xff\xd8render " + key.encode() + b"\xff\xd9", 5, {"total": 5.0}) for key in keys], None
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+@pytest.fixture
+def refs():
+    return MemoryObjectRefs()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    stub = StubRenderPool()
+    monkeypatch.setattr(tryon, "render_pool", stub)
+    return stub
+
+
+@pytest.fixture
+def followers(monkeypatch):
+    """Set whenever a job finds one of its renders already in flight in another job"""
+    event = threading.Event()
+    claim_renders = tryon.claim_renders
+
+    def observed(render_keys):
+        claims = claim_renders(render_keys)
+        if any(not owner for _, owner in claims):
+            event.set()
+        return claims
+
+    monkeypatch.setattr(tryon, "claim_renders", observed)
+    return event
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path, backend, refs, pool):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tryon.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(tryon, "SessionLocal", sessionmaker(bind=engine))
+
+    # uuid layout: anything shared below is shared by deduplication, not by content addressing
+    manager = StorageManager(backend, refs=refs, content_addressed=False)
+    monkeypatch.setattr(tryon, "storage_manager", manager)
+    tryon.render_cache.clear()
+    yield manager
+    tryon.render_cache.clear()
+    manager.close()
+    engine.dispose()
+
+
+def design(key: str) -> dict:
+    return {'key': key, 'version': "v1", 'storage_path': None, 'asset_path': None}
+
+
+def render_job(storage: StorageManager, keys):
+    """Callable running one render_and_store job for the designs on the same stored photo"""
+    photo = storage.upload_bytes(b"\xff\xd8photo\xff\xd9", folder="uploads", strip_metadata=False)['path']
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    return lambda: tryon.render_and_store(1, photo, expires_at, [design(key) for key in keys])
+
+
+def generated_objects(backend: MemoryBackend) -> list:
+    return [path for path in backend.objects if path.startswith("generated/")]
+
+
+def stored_paths(storage: StorageManager) -> list:
+    db = tryon.SessionLocal()
+    try:
+        return [row.image_path for row in db.query(GeneratedImage).order_by(GeneratedImage.id)]
+    finally:
+        db.close()
+
+
+def test_sequential_retry_links_to_the_stored_render(storage, backend, refs, pool):
+    job = render_job(storage, ["tee"])
+    first = job()[0]
+    second = job()[0]
+
+    assert pool.calls == [["tee"]]
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    paths = stored_paths(storage)
+    assert paths[0] == paths[1] and refs.get(paths[0]) == 2
+
+
+def test_concurrent_identical_jobs_render_and_upload_once(storage, backend, refs, pool, followers):
+    pool.hold("tee")
+    job = render_job(storage, ["tee"])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(job)
+        assert pool.started["tee"].wait(WAIT)
+        follower = executor.submit(job)
+        assert followers.wait(WAIT)  # the second job is waiting on the first one's render
+        pool.gates["tee"].set()
+        results = [owner.result(WAIT)[0], follower.result(WAIT)[0]]
+
+    assert pool.calls == [["tee"]]
+    assert [result["deduplicated"] for result in results] == [False, True]
+    assert len(generated_objects(backend)) == 1
+    path = generated_objects(backend)[0]
+    assert stored_paths(storage) == [path, path]
+    assert refs.get(path) == 2
+    assert tryon.inflight_renders == {}
+
+
+def test_owner_publishes_its_renders_before_waiting_on_others(storage, backend, refs, pool, followers):
+    """A job waiting on someone else's render has already handed out its own ones"""
+    pool.hold("tee")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        first = executor.submit(render_job(storage, ["tee"]))
+        assert pool.started["tee"].wait(WAIT)
+
+        # Owns "hoodie", then waits for the first job's "tee"
+        second = executor.submit(render_job(storage, ["hoodie", "tee"]))
+        assert followers.wait(WAIT)
+
+        # Needs only "hoodie": linked to the second job's render while "tee" is still rendering
+        third = executor.submit(render_job(storage, ["hoodie"])).result(WAIT)[0]
+        assert third["deduplicated"] and not first.done() and not second.done()
+
+        pool.gates["tee"].set()
+        first_results, second_results = first.result(WAIT), second.result(WAIT)
+
+    assert pool.calls == [["tee"], ["hoodie"]]
+    assert [result["deduplicated"] for result in second_results] == [False, True]
+    assert not first_results[0]["deduplicated"]
+    assert sorted(refs.get(path) for path in generated_objects(backend)) == [2, 2]
+
+
+def test_waiter_renders_itself_when_the_owner_fails(storage, backend, refs, pool, followers):
+    pool.hold("tee")
+    pool.failures.add("tee")
+    job = render_job(storage, ["tee"])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(job)
+        assert pool.started["tee"].wait(WAIT)
+        follower = executor.submit(job)
+        assert followers.wait(WAIT)
+
+        pool.gates.pop("tee").set()  # the retry in the waiting job neither blocks nor fails
+        with pytest.raises(RuntimeError, match="render of tee failed"):
+            owner.result(WAIT)
+        result = follower.result(WAIT)[0]
+
+    assert pool.calls == [["tee"], ["tee"]]
+    assert not result["deduplicated"]
+    assert len(generated_objects(backend)) == 1
+    assert refs.get(generated_objects(backend)[0]) == 1
+    assert tryon.inflight_renders == {}
+
+
+def test_cached_render_whose_object_was_released_is_rendered_again(storage, backend, refs, pool):
+    job = render_job(storage, ["tee"])
+    job()
+    released = stored_paths(storage)[0]
+    storage.delete_file(released)  # e.g. the scheduler expired the row that owned it
+    assert released not in backend.objects
+
+    result = job()[0]
+
+    assert pool.calls == [["tee"], ["tee"]]
+    assert not result["deduplicated"]
+    fresh = stored_paths(storage)[1]
+    assert fresh != released and refs.get(fresh) == 1
+    assert generated_objects(backend) == [fresh]
+
+
+def test_failed_job_releases_the_references_it_took(storage, backend, refs, pool, monkeypatch):
+    render_job(storage, ["tee"])()
+    shared = stored_paths(storage)[0]
+
+    def failing_record(*args, **kwargs):
+        raise RuntimeError("metrics unavailable")
+    # Fails after linking "tee" and uploading "hoodie", before the rows are committed
+    monkeypatch.setattr(tryon.render_metrics, "record", failing_record)
+    with pytest.raises(RuntimeError, match="metrics unavailable"):
+        render_job(storage, ["tee", "hoodie"])()
+
+    assert refs.get(shared) == 1
+    assert generated_objects(backend) == [shared]
+    assert stored_paths(storage) == [shared]
+    assert tryon.inflight_renders == {}
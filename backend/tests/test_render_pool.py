@@ -0,0 +1,92 @@
+"""
+Render Pool Tests
+Health checks and respawning on real worker processes (without loading the pose models)
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app.render_pool import RenderPool
+
+pytestmark = pytest.mark.backlog(request_id="user-003")
+
+
+class BareRenderPool(RenderPool):
+    """Same pool management; workers skip building the engine, tasks are plain functions"""
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.size, mp_context=multiprocessing.get_context("spawn"))
+
+
+@pytest.fixture
+def pool():
+    render_pool = BareRenderPool(size=1, task_timeout=30)
+    yield render_pool
+    render_pool.shutdown()
+
+
+def worker_pids(render_pool: RenderPool) -> list:
+    return [process.pid for process in render_pool._executor._processes.values()]
+
+
+def kill_workers(render_pool: RenderPool):
+    for process in list(render_pool._executor._processes.values()):
+        process.kill()
+        process.join(10)
+
+
+def test_healthy_pool_is_left_alone(pool):
+    health = pool.check_health(timeout=30)
+
+    assert health['healthy'] and health['busy'] == 0 and pool.restarts == 0
+    assert [worker['pid'] for worker in health['workers']] == worker_pids(pool)
+
+
+def test_dead_worker_respawned_by_health_check(pool):
+    pool.check_health(timeout=30)
+    old_pids = worker_pids(pool)
+    kill_workers(pool)
+
+    health = pool.check_health(timeout=30)
+
+    assert not health['healthy'] and pool.restarts == health['restarts'] == 1
+    recovered = pool.check_health(timeout=30)
+    assert recovered['healthy'] and pool.restarts == 1
+    assert not set(worker['pid'] for worker in recovered['workers']) & set(old_pids)
+
+
+def test_busy_worker_reported_not_respawned(pool):
+    pool.start()
+    render = pool._executor.submit(time.sleep, 3)
+
+    health = pool.check_health(timeout=0.5)
+
+    assert health['healthy'] and health['busy'] == 1
+    assert pool.restarts == 0
+    render.result(timeout=30)  # the long render was not interrupted
+
+
+def test_render_retried_once_after_a_worker_died(pool):
+    pool.start()
+    old_pid = pool.run(os.getpid)
+    kill_workers(pool)
+
+    new_pid = pool.run(os.getpid)
+
+    assert new_pid != old_pid and pool.restarts == 1
+
+
+def test_hung_render_times_out_and_pool_is_replaced(pool):
+    hung = pool.run(os.getpid)
+    pool.task_timeout = 0.5
+
+    with pytest.raises(TimeoutError):
+        pool.run(time.sleep, 30)
+
+    assert pool.restarts == 1
+    pool.task_timeout = 30
+    assert pool.run(os.getpid) != hung
@@ -0,0 +1,177 @@
+"""
+Render Queue Tests
+Admission limits, shedding optional background work when renders fill the queue,
+and cancellation of queued and running jobs
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.render_queue import JobStatus, QueueFullError, RenderQueue
+
+pytestmark = pytest.mark.backlog(request_id="user-005")
+
+WAIT = 10  # seconds a job blocks on its gate before giving up
+
+
+def blocked(gate: threading.Event) -> dict:
+    """Job body that holds its worker thread until the test opens the gate"""
+    gate.wait(WAIT)
+    return {"done": True}
+
+
+def failing() -> dict:
+    raise RuntimeError("render exploded")
+
+
+def run(scenario, max_pending: int = 3, max_background: int = 2):
+    """Run a scenario against a fresh one-worker queue on a fresh event loop, releasing blocked jobs after"""
+    gate = threading.Event()
+    queue = RenderQueue(concurrency=1, max_pending=max_pending, background_kinds=("analysis",),
+                        max_background=max_background)
+
+    async def main():
+        try:
+            return await scenario(queue, gate)
+        finally:
+            gate.set()
+            await asyncio.gather(*list(queue._tasks), return_exceptions=True)
+            queue.shutdown()
+
+    return asyncio.run(main())
+
+
+async def settle():
+    """Let submitted tasks start (or react to cancellation)"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_job_result_and_failure_are_recorded():
+    async def scenario(queue, gate):
+        gate.set()
+        ok = queue.submit(blocked, gate, user_id=1)
+        bad = queue.submit(failing, user_id=1)
+        await queue.wait(ok, timeout=WAIT)
+        await queue.wait(bad, timeout=WAIT)
+        return ok, bad
+
+    ok, bad = run(scenario)
+    assert (ok.status, ok.result) == (JobStatus.COMPLETED, {"done": True})
+    assert (bad.status, bad.error) == (JobStatus.FAILED, "render exploded")
+    assert ok.finished.is_set() and bad.finished.is_set()
+
+
+def test_renders_refused_once_max_pending_are_waiting():
+    async def scenario(queue, gate):
+        for _ in range(3):
+            queue.submit(blocked, gate, user_id=1)
+        with pytest.raises(QueueFullError):
+            queue.submit(blocked, gate, user_id=1)
+        return queue.depth
+
+    assert run(scenario) == 3
+
+
+def test_background_jobs_limited_separately_and_left_out_of_depth():
+    async def scenario(queue, gate):
+        for _ in range(2):
+            queue.submit(blocked, gate, user_id=1, kind="analysis")
+        with pytest.raises(QueueFullError, match="background job skipped"):
+            queue.submit(blocked, gate, user_id=1, kind="analysis")
+        return queue.depth, queue.background_depth
+
+    assert run(scenario) == (0, 2)
+
+
+def test_background_job_skipped_when_renders_fill_the_queue():
+    async def scenario(queue, gate):
+        for _ in range(3):
+            queue.submit(blocked, gate, user_id=1)
+        with pytest.raises(QueueFullError):
+            queue.submit(blocked, gate, user_id=1, kind="analysis")
+        return queue.background_depth
+
+    assert run(scenario) == 0
+
+
+def test_renders_shed_queued_background_jobs_newest_first():
+    async def scenario(queue, gate):
+        running = queue.submit(blocked, gate, user_id=1, kind="analysis")
+        await settle()
+        older = queue.submit(blocked, gate, user_id=1, kind="analysis")
+        newer = queue.submit(blocked, gate, user_id=1, kind="analysis")
+        renders = [queue.submit(blocked, gate, user_id=1)]
+        await settle()
+        assert newer.status == JobStatus.QUEUED
+
+        # 1 render + 3 background jobs fill the queue: the next render takes the newest waiting slot
+        renders.append(queue.submit(blocked, gate, user_id=1))
+        await settle()
+        statuses = [running.status, older.status, newer.status]
+
+        gate.set()
+        for job in [running, older] + renders:
+            await queue.wait(job, timeout=WAIT)
+        return statuses, [job.status for job in [running, older] + renders], newer
+
+    statuses, finished, newer = run(scenario, max_pending=4, max_background=3)
+    assert statuses == [JobStatus.RUNNING, JobStatus.QUEUED, JobStatus.CANCELLED]
+    assert finished == [JobStatus.COMPLETED] * 4
+    assert newer.result is None and newer.finished.is_set()
+
+
+def test_cancel_before_the_job_started():
+    """The task is cancelled before its first step, so only _settle can mark the job"""
+    async def scenario(queue, gate):
+        job = queue.submit(blocked, gate, user_id=1)
+        assert queue.cancel(job.id)
+        await settle()
+        return job, queue.depth
+
+    job, depth = run(scenario)
+    assert job.status == JobStatus.CANCELLED and job.started_at is None
+    assert job.finished_at is not None
+    assert job.done.is_set() and job.finished.is_set()
+    assert depth == 0
+
+
+def test_cancel_queued_and_running_jobs():
+    async def scenario(queue, gate):
+        running = queue.submit(blocked, gate, user_id=1)
+        queued = queue.submit(blocked, gate, user_id=1)
+        await settle()
+        assert queue.cancel(queued.id) and queue.cancel(running.id)
+        await settle()
+        return running, queued
+
+    running, queued = run(scenario)
+    assert running.status == queued.status == JobStatus.CANCELLED
+    assert running.started_at is not None and queued.started_at is None
+    assert running.result is None  # the worker thread finished, but its result was dropped
+
+
+def test_cancel_refuses_finished_and_unknown_jobs():
+    async def scenario(queue, gate):
+        gate.set()
+        job = queue.submit(blocked, gate, user_id=1)
+        await queue.wait(job, timeout=WAIT)
+        return queue.cancel(job.id), queue.cancel("missing"), job.status
+
+    assert run(scenario) == (False, False, JobStatus.COMPLETED)
+
+
+def test_finished_jobs_forgotten_after_retention():
+    async def scenario(queue, gate):
+        gate.set()
+        queue.retention = queue.retention * 0
+        job = queue.submit(blocked, gate, user_id=1)
+        await queue.wait(job, timeout=WAIT)
+        kept = queue.get(job.id)
+        queue.submit(blocked, gate, user_id=1)
+        return kept, queue.get(job.id)
+
+    kept, pruned = run(scenario)
+    assert kept is not None and pruned is None
@@ -0,0 +1,81 @@
+"""
+Signed URL Tests
+Batch signing and the signed URL cache (reuse, refresh before expiry)
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import cache as cache_module
+from app import storage as storage_module
+from app.config import settings
+from app.object_refs import MemoryObjectRefs
+from app.storage import StorageManager
+from app.storage_backends import MemoryBackend
+
+pytestmark = pytest.mark.backlog(request_id="user-022")
+
+PATHS = [f"generated/{i}.jpg" for i in range(5)]
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+@pytest.fixture
+def storage(backend):
+    manager = StorageManager(backend, refs=MemoryObjectRefs())
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    fake_time = SimpleNamespace(time=lambda: now.value)
+    monkeypatch.setattr(storage_module, "time", fake_time)
+    monkeypatch.setattr(cache_module, "time", fake_time)
+    return now
+
+
+def test_many_paths_signed_in_one_call(storage, backend):
+    urls = storage.get_signed_urls(PATHS + [PATHS[0], None, ""], expires_in=600)
+    assert set(urls) == set(PATHS)
+    assert backend.sign_calls == 1
+
+
+def test_cached_urls_reused_and_only_new_paths_signed(storage, backend):
+    first = storage.get_signed_urls(PATHS[:3], expires_in=600)
+    both = storage.get_signed_urls(PATHS, expires_in=600)
+
+    assert backend.sign_calls == 2
+    assert {path: both[path] for path in PATHS[:3]} == first
+    assert storage.get_signed_url(PATHS[4], expires_in=600) == both[PATHS[4]]
+    assert backend.sign_calls == 2
+
+
+def test_url_re_signed_once_too_little_lifetime_is_left(storage, backend, clock):
+    storage.get_signed_urls(PATHS[:1], expires_in=600)
+
+    clock.value += 600 * settings.SIGNED_URL_REFRESH_FRACTION - 1
+    storage.get_signed_urls(PATHS[:1], expires_in=600)
+    assert backend.sign_calls == 1
+
+    clock.value += 2
+    storage.get_signed_urls(PATHS[:1], expires_in=600)
+    assert backend.sign_calls == 2
+
+
+def test_longer_lifetime_request_is_not_served_a_short_url(storage, backend):
+    storage.get_signed_urls(PATHS[:1], expires_in=60)
+    storage.get_signed_urls(PATHS[:1], expires_in=3600)
+    assert backend.sign_calls == 2
+
+
+def test_async_routes_share_the_cache(storage, backend):
+    url = storage.get_signed_url(PATHS[0], expires_in=600)
+    assert asyncio.run(storage.get_signed_url_async(PATHS[0], expires_in=600)) == url
+    assert backend.sign_calls == 1
@@ -0,0 +1,122 @@
+"""
+Storage Backend Tests
+Backend selection, the local directory backend, URL signing and the Supabase REST calls
+(against an httpx mock transport, so nothing leaves the process)
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import storage_backends
+from app.storage_backends import (LocalBackend, LocalURLSigner, MemoryBackend, SupabaseBackend,
+                                  create_backend)
+
+pytestmark = pytest.mark.backlog(request_id="user-023")
+
+
+@pytest.fixture
+def supabase_configured(monkeypatch):
+    monkeypatch.setattr(storage_backends.settings, "SUPABASE_URL", "https://project.supabase.co")
+    monkeypatch.setattr(storage_backends.settings, "SUPABASE_KEY", "anon-key")
+
+
+@pytest.mark.parametrize("kind", ["local", "auto", "LOCAL"])
+def test_local_unless_supabase_is_selected(kind, supabase_configured):
+    assert isinstance(create_backend(kind), LocalBackend)
+
+
+def test_supabase_only_when_selected(supabase_configured):
+    backend = create_backend("supabase")
+    assert isinstance(backend, SupabaseBackend)
+    assert backend.base_url == "https://project.supabase.co/storage/v1"
+
+
+def test_memory_and_unknown_backends():
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("s3")
+
+
+def test_local_backend_round_trip(tmp_path):
+    backend = LocalBackend(str(tmp_path), secret="secret")
+
+    async def scenario():
+        await backend.put_many([("uploads/a.jpg", b"a", "image/jpeg"), ("generated/b.jpg", b"b", "image/jpeg")])
+        data = await backend.get("uploads/a.jpg")
+        await backend.delete_many(["uploads/a.jpg", "uploads/missing.jpg"])
+        with pytest.raises(FileNotFoundError):
+            await backend.get("uploads/a.jpg")
+        return data
+
+    assert asyncio.run(scenario()) == b"a"
+    assert (tmp_path / "generated" / "b.jpg").read_bytes() == b"b"
+
+
+def test_local_url_signature_round_trip():
+    signer = LocalURLSigner("secret")
+    url = signer.sign(["generated/a.jpg"], expires_in=60)["generated/a.jpg"]
+    expires = int(url.split("expires=")[1].split("&")[0])
+    signature = url.split("signature=")[1]
+
+    assert url.startswith("/storage/generated/a.jpg?")
+    assert signer.verify("generated/a.jpg", expires, signature)
+    assert not signer.verify("generated/b.jpg", expires, signature)
+    assert not LocalURLSigner("other").verify("generated/a.jpg", expires, signature)
+    assert not signer.verify("generated/a.jpg", expires - 3600, signer.signature("generated/a.jpg", expires - 3600))
+
+
+def supabase_backend(handler) -> SupabaseBackend:
+    backend = SupabaseBackend("https://project.supabase.co/", "anon-key", "virtual-tryon")
+    backend._client = httpx.AsyncClient(base_url=backend.base_url, headers=backend.headers,
+                                        transport=httpx.MockTransport(handler))
+    return backend
+
+
+def test_supabase_signs_a_batch_in_one_request():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        body = json.loads(request.content)
+        return httpx.Response(200, json=[{"path": path, "signedURL": f"/object/sign/virtual-tryon/{path}?token=t"}
+                                         for path in body["paths"]])
+
+    backend = supabase_backend(handler)
+    urls = asyncio.run(backend.sign_urls(["a.jpg", "b.jpg"], expires_in=600))
+
+    assert len(requests) == 1 and backend.sign_calls == 1
+    assert requests[0].url.path == "/storage/v1/object/sign/virtual-tryon"
+    assert requests[0].headers["authorization"] == "Bearer anon-key"
+    assert json.loads(requests[0].content) == {"expiresIn": 600, "paths": ["a.jpg", "b.jpg"]}
+    assert urls["a.jpg"] == "https://project.supabase.co/storage/v1/object/sign/virtual-tryon/a.jpg?token=t"
+
+
+def test_supabase_deletes_in_batches(monkeypatch):
+    batches = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.method == "DELETE"
+        batches.append(json.loads(request.content)["prefixes"])
+        return httpx.Response(200, json=[])
+
+    backend = supabase_backend(handler)
+    monkeypatch.setattr(SupabaseBackend, "DELETE_BATCH", 2)
+    asyncio.run(backend.delete_many(["a", "b", "c"]))
+
+    assert sorted(batches) == [["a", "b"], ["c"]]
+
+
+def test_supabase_errors_surface():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(400, json={"error": "not_found", "message": "Object not found"})
+        return httpx.Response(500, text="bucket unavailable")
+
+    backend = supabase_backend(handler)
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(backend.get("missing.jpg"))
+    with pytest.raises(Exception, match="Upload failed \\(500\\)"):
+        asyncio.run(backend.put("a.jpg", b"a", "image/jpeg"))
@@ -0,0 +1,158 @@
+"""
+Storage Reference Counting Tests
+StorageManager on the in-memory backend: shared objects live until their last reference
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base
+from app.object_refs import DatabaseObjectRefs, MemoryObjectRefs
+from app.storage import StorageManager
+from app.storage_backends import MemoryBackend
+
+PHOTO = b"\xff\xd8" + b"photo bytes" * 100 + b"\xff\xd9"
+OTHER = b"\xff\xd8" + b"other bytes" * 100 + b"\xff\xd9"
+
+pytestmark = pytest.mark.backlog(request_id="user-025")
+
+
+class FailingBackend(MemoryBackend):
+    """Writes fail after reaching the store (e.g. a dropped connection mid-upload)"""
+
+    async def put(self, path: str, data: bytes, content_type: str):
+        await super().put(path, data[:10], content_type)
+        raise ConnectionError("connection reset")
+
+
+def database_refs() -> DatabaseObjectRefs:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return DatabaseObjectRefs(sessionmaker(bind=engine))
+
+
+@pytest.fixture(params=["memory", "database"])
+def refs(request):
+    return MemoryObjectRefs() if request.param == "memory" else database_refs()
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+@pytest.fixture
+def storage(backend, refs):
+    manager = StorageManager(backend, refs=refs, content_addressed=True)
+    yield manager
+    manager.close()
+
+
+def upload(storage: StorageManager, data: bytes = PHOTO) -> dict:
+    return storage.upload_bytes(data, folder="generated", strip_metadata=False)
+
+
+def test_upload_duplicate_release_release(storage, backend, refs):
+    first = upload(storage)
+    assert not first["deduplicated"]
+    assert refs.get(first["path"]) == 1
+    assert backend.objects[first["path"]][0] == PHOTO
+
+    second = upload(storage)
+    assert second["path"] == first["path"] and second["deduplicated"]
+    assert refs.get(first["path"]) == 2
+    assert len(backend.objects) == 1
+
+    storage.delete_file(first["path"])
+    assert refs.get(first["path"]) == 1
+    assert first["path"] in backend.objects
+
+    storage.delete_file(second["path"])
+    assert refs.get(first["path"]) is None
+    assert backend.objects == {}
+
+
+def test_content_addressed_path_layout(storage):
+    path = upload(storage)["path"]
+    folder, prefix, subprefix, name = path.split("/")
+    assert folder == "generated" and name.endswith(".jpg")
+    assert name.startswith(prefix + subprefix) and len(name) == 64 + len(".jpg")
+
+
+def test_batch_upload_counts_each_occurrence(storage, backend, refs):
+    results = storage.upload_many([PHOTO, OTHER, PHOTO], folder="generated", strip_metadata=False)
+    assert results[0]["path"] == results[2]["path"] != results[1]["path"]
+    assert [result["deduplicated"] for result in results] == [False, False, False]
+    assert refs.get(results[0]["path"]) == 2 and refs.get(results[1]["path"]) == 1
+
+    storage.delete_files_batch([result["path"] for result in results])
+    assert backend.objects == {}
+
+
+def test_uuid_layout_stores_duplicates_separately(backend, refs):
+    storage = StorageManager(backend, refs=refs, content_addressed=False)
+    try:
+        paths = [upload(storage)["path"] for _ in range(2)]
+        assert paths[0] != paths[1] and len(backend.objects) == 2
+        storage.delete_file(paths[0])
+        assert list(backend.objects) == [paths[1]]
+    finally:
+        storage.close()
+
+
+def test_retain_only_live_objects(storage, backend, refs):
+    path = upload(storage)["path"]
+    assert storage.retain([path]) == {path}
+    assert refs.get(path) == 2
+
+    storage.delete_files_batch([path, path])
+    assert storage.retain([path]) == set()
+    assert refs.get(path) is None and backend.objects == {}
+
+
+def test_failed_write_releases_the_new_reference(refs):
+    backend = FailingBackend()
+    storage = StorageManager(backend, refs=refs, content_addressed=True)
+    try:
+        with pytest.raises(Exception, match="Upload failed"):
+            upload(storage)
+        path = storage._prepare_upload(PHOTO, "generated", ".jpg", False)[0]
+        assert refs.get(path) is None
+        assert backend.objects == {}  # the half-written object is cleaned up
+    finally:
+        storage.close()
+
+
+def test_failed_write_keeps_existing_references(storage, backend, refs):
+    stored = upload(storage)["path"]
+
+    async def failing_put(path, data, content_type):
+        raise ConnectionError("connection reset")
+    backend.put = failing_put
+
+    with pytest.raises(Exception, match="Upload failed"):
+        storage.upload_many([PHOTO, OTHER], folder="generated", strip_metadata=False)
+
+    assert refs.get(stored) == 1
+    assert backend.objects[stored][0] == PHOTO
+    assert len(backend.objects) == 1
+
+
+def test_release_of_untracked_path_deletes_it(storage, backend, refs):
+    backend.objects["uploads/legacy.jpg"] = (PHOTO, "image/jpeg")  # stored before reference counting
+    storage.delete_file("uploads/legacy.jpg")
+    assert backend.objects == {}
+
+
+def test_signed_url_dropped_with_the_last_reference(storage):
+    path = upload(storage)["path"]
+    upload(storage)
+    storage.get_signed_urls([path], expires_in=600)
+
+    storage.delete_file(path)
+    assert path in storage.signed_url_cache
+
+    storage.delete_file(path)
+    assert path not in storage.signed_url_cache
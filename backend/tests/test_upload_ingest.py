@@ -0,0 +1,172 @@
+"""
+Upload Ingestion Tests
+Streaming multipart parsing and the incremental size / type / dimension checks
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from starlette.requests import Request
+
+from app import storage as storage_module
+from app.object_refs import MemoryObjectRefs
+from app.storage import StorageManager
+from app.storage_backends import MemoryBackend
+from app.upload_ingest import UploadIngestor, UploadRejected, read_multipart_upload
+
+pytestmark = pytest.mark.backlog(request_id="user-024")
+
+BOUNDARY = "testboundary"
+MAX_BYTES = 1024 * 1024
+MAX_PIXELS = 4 * 1000 * 1000
+
+
+def encode(size, format="JPEG", **save_args) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format=format, **save_args)
+    return buffer.getvalue()
+
+
+def ingestor() -> UploadIngestor:
+    return UploadIngestor(MAX_BYTES, MAX_PIXELS, ["jpg", "jpeg", "png"])
+
+
+def feed_in_chunks(upload: UploadIngestor, data: bytes, chunk_size: int = 1000):
+    """Feed data the way the body arrives, a chunk at a time"""
+    for start in range(0, len(data), chunk_size):
+        upload.feed(data[start:start + chunk_size])
+
+
+def multipart_body(parts) -> bytes:
+    """parts: (name, filename or None, bytes)"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, chunk_size: int = 4096) -> Request:
+    position = 0
+
+    async def receive():
+        nonlocal position
+        chunk = body[position:position + chunk_size]
+        position += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": position < len(body)}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"",
+             "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]}
+    return Request(scope, receive)
+
+
+def test_valid_jpeg_is_stripped_and_hashed():
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    data = encode((640, 480), exif=exif.tobytes())
+    upload = ingestor()
+    upload.start("me.JPG")
+    feed_in_chunks(upload, data)
+
+    result = upload.finish()
+
+    assert (result["width"], result["height"], result["file_ext"]) == (640, 480, ".jpg")
+    assert b"Phone maker" in data and b"Phone maker" not in result["data"]
+    assert result["sha256"] == hashlib.sha256(result["data"]).hexdigest()
+
+
+def test_ingested_digest_reused_when_storing(monkeypatch):
+    upload = ingestor()
+    upload.start("me.jpg")
+    feed_in_chunks(upload, encode((640, 480)))
+    result = upload.finish()
+
+    def no_rehash(data):
+        raise AssertionError("stored bytes hashed again")
+    monkeypatch.setattr(storage_module, "hashlib", SimpleNamespace(sha256=no_rehash))
+    storage = StorageManager(MemoryBackend(), refs=MemoryObjectRefs(), content_addressed=True)
+    try:
+        stored = asyncio.run(storage.upload_bytes_async(result["data"], folder="uploads", file_ext=result["file_ext"],
+                                                        strip_metadata=False, sha256=result["sha256"]))
+    finally:
+        storage.close()
+
+    digest = result["sha256"]
+    assert stored["path"] == f"uploads/{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+    assert storage.backend.objects[stored["path"]] == (result["data"], "image/jpeg")
+
+
+def test_png_dimensions_known_from_the_header():
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (300, 200), os.urandom(300 * 200 * 3)).save(buffer, format="PNG")
+    upload = ingestor()
+    upload.start("me.png")
+    feed_in_chunks(upload, buffer.getvalue()[:4096])
+    assert (upload.format, upload.width, upload.height) == ("PNG", 300, 200)
+
+
+def test_disallowed_extension_rejected_before_any_data():
+    with pytest.raises(UploadRejected, match="File type not allowed"):
+        ingestor().start("me.gif")
+
+
+def test_content_must_match_the_extension():
+    upload = ingestor()
+    upload.start("me.jpg")
+    with pytest.raises(UploadRejected, match="not a readable image"):
+        upload.feed(encode((10, 10), format="PNG"))
+
+
+def test_oversized_upload_rejected_at_the_limit():
+    upload = ingestor()
+    upload.start("me.jpg")
+    data = encode((64, 64)) + b"\x00" * (2 * MAX_BYTES)
+    with pytest.raises(UploadRejected, match="File too large"):
+        feed_in_chunks(upload, data, chunk_size=64 * 1024)
+    assert len(upload.buffer) <= MAX_BYTES
+
+
+def test_too_many_pixels_rejected_from_the_header():
+    data = encode((4000, 3000), quality=20)
+    upload = ingestor()
+    upload.start("me.jpg")
+    with pytest.raises(UploadRejected, match="Image too large"):
+        feed_in_chunks(upload, data)
+    assert len(upload.buffer) < len(data)
+
+
+def test_truncated_image_rejected_on_finish():
+    upload = ingestor()
+    upload.start("me.jpg")
+    upload.feed(b"\xff\xd8\xff\xe0" + b"\x00" * 10)
+    with pytest.raises(UploadRejected, match="not a readable image"):
+        upload.finish()
+
+
+def test_multipart_stream_returns_fields_and_feeds_the_file():
+    data = encode((320, 240))
+    body = multipart_body([("admin_id", None, b"7"), ("file", "me.jpg", data), ("location_id", None, b"3")])
+    upload = ingestor()
+
+    fields = asyncio.run(read_multipart_upload(make_request(body), upload))
+
+    assert fields == {"admin_id": "7", "location_id": "3"}
+    assert upload.finish()["width"] == 320
+
+
+def test_multipart_second_file_rejected():
+    data = encode((32, 32))
+    body = multipart_body([("file", "a.jpg", data), ("file", "b.jpg", data)])
+    with pytest.raises(UploadRejected, match="Only one file"):
+        asyncio.run(read_multipart_upload(make_request(body), ingestor()))
+
+
+def test_multipart_without_file_rejected():
+    body = multipart_body([("admin_id", None, b"7")])
+    with pytest.raises(UploadRejected, match="No file uploaded"):
+        asyncio.run(read_multipart_upload(make_request(body), ingestor()))
@@ -1,4 +1,5 @@
 from app.database import engine
+from app.models import StoredObject
 from sqlalchemy import text
 
 def add_columns():
@@ -8,6 +9,7 @@ def add_columns():
             conn.commit()
             print("Added admin_id column successfully")
         except Exception as e:
+            conn.rollback()
             print(f"Did not add admin_id (might exist): {e}")
             
         try:
@@ -15,7 +17,55 @@ def add_columns():
             conn.commit()
             print("Added location_id column successfully")
         except Exception as e:
+            conn.rollback()
             print(f"Did not add location_id (might exist): {e}")
+        
+        try:
+            conn.execute(text("ALTER TABLE generated_images ADD COLUMN quality_tier VARCHAR(16);"))
+            conn.commit()
+            print("Added quality_tier column successfully")
+        except Exception as e:
+            conn.rollback()
+            print(f"Did not add quality_tier (might exist): {e}")
+        
+        try:
+            conn.execute(text("ALTER TABLE generated_images ADD COLUMN stage_timings JSON;"))
+            conn.commit()
+            print("Added stage_timings column successfully")
+        except Exception as e:
+            conn.rollback()
+            print(f"Did not add stage_timings (might exist): {e}")
+        
+        # Paths become NULL once the scheduler has deleted the file
+        for table, column in (("try_on_sessions", "uploaded_image_path"), ("generated_images", "image_path")):
+            try:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL;"))
+                conn.commit()
+                print(f"Made {table}.{column} nullable successfully")
+            except Exception as e:
+                conn.rollback()
+                print(f"Did not change {table}.{column} (might be nullable already): {e}")
+        
+        # Storage reference counts, backfilled with one reference per row pointing at a file
+        try:
+            StoredObject.__table__.create(bind=conn, checkfirst=True)
+            conn.execute(text("""
+                INSERT INTO stored_objects (path, ref_count, created_at)
+                SELECT path, COUNT(*), CURRENT_TIMESTAMP FROM (
+                    SELECT uploaded_image_path AS path FROM try_on_sessions WHERE uploaded_image_path IS NOT NULL
+                    UNION ALL
+                    SELECT image_path FROM generated_images WHERE image_path IS NOT NULL
+                    UNION ALL
+                    SELECT image_path FROM merchandise WHERE image_path IS NOT NULL
+                ) AS refs
+                GROUP BY path
+                ON CONFLICT (path) DO NOTHING;
+            """))
+            conn.commit()
+            print("Created and backfilled stored_objects successfully")
+        except Exception as e:
+            conn.rollback()
+            print(f"Did not create stored_objects: {e}")
 
 if __name__ == "__main__":
     add_columns()